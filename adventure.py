@@ -0,0 +1,27 @@
+"""
+Plays the game in any of its modes (see modes/).
+
+    python adventure.py                 # the full game, same as python main.py
+    python adventure.py --mode school   # the original school project's rules
+    python adventure.py --list
+"""
+import argparse
+
+import modes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play the Text-based RPG.")
+    parser.add_argument("--mode", default=modes.DEFAULT_MODE, choices=modes.names())
+    parser.add_argument("--list", action="store_true", help="list the game modes and exit")
+    args = parser.parse_args()
+
+    if args.list:
+        for name, (_, description) in modes.MODES.items():
+            print(f"{name:10} {description}")
+        return
+    modes.load(args.mode).run()
+
+
+if __name__ == "__main__":
+    main()
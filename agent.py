@@ -0,0 +1,346 @@
+"""
+Battle advisor and autoplay agent.
+
+At each turn of main.battle() the agent picks Attack, Use Tool or Run by
+searching the battle's chance tree with expectimax: the player's damage
+roll and critical hits, the weapon's special effects landing, scaling hits
+and ticking (as in solver.py), a Health Potion's heal, run_away()
+succeeding dexterity * 2 percent of the time and the enemy's damage roll.
+A battle state is the tuple (health, enemy health, weapon durability,
+potions, the enemy's statuses). For each battle context (weapon, enemy
+strength, escape chance) a transposition table maps states to the depth
+they were searched to, their value and best action, so positions reached
+by different rolls are searched once and later turns of a battle start
+from the earlier turns' work. Search deepens one turn at a time until the
+time budget runs out, and the deepest finished search gives the answer.
+Past the horizon a position is scored by how many turns each side needs
+to finish the other.
+
+A win is worth 1, a defeat 0 and an escape ESCAPE_VALUE.
+
+The agent is also an advisor for main.py: set main.advisor to an Agent and
+battles and the inventory menu show its suggestion. autoplay() runs a flow
+answering those prompts with the suggestions.
+
+    agent = Agent(budget=0.002)
+    agent.battle_action(character, enemy_health=55, enemy_strength=5)     # "1"
+    agent.weapon_choice(character)                                          # "2"
+"""
+import argparse
+import math
+import random
+import time
+from collections import OrderedDict
+
+import main as game
+import metrics
+
+from main import (
+    MAX_HEALTH,
+    POTION_HEAL,
+    Weapon,
+    advisor,
+    battle_flow,
+    enemy_damage_cap,
+    enemy_max_health,
+    escape_chance,
+    output,
+)
+from renderer import NullRenderer
+from solver import (
+    damage_distribution,
+    enemy_statuses,
+    hit_distribution,
+    landed_distribution,
+    tick_statuses,
+    uniform,
+    weapon_effects,
+    weapon_key,
+)
+
+ATTACK, USE_TOOL, RUN = "1", "2", "3"
+ACTION_NAMES = {ATTACK: "Attack", USE_TOOL: "Use Tool", RUN: "Run"}
+KEEP = "Q"
+
+BUDGET = 0.002          # seconds per suggestion
+MAX_DEPTH = 20          # turns
+ESCAPE_VALUE = 0.5
+# Turns of difference between the two sides' time to kill that make a fight about 73% one-sided
+RACE_SCALE = 1.0
+TABLE_SIZE = 1 << 17    # entries per context before its table is cleared
+MAX_CONTEXTS = 32
+EXACT = 1 << 30         # depth stored for values that needed no estimates
+POTION = "Health Potion"
+
+
+class Timeout(Exception):
+    pass
+
+
+class Search:
+    """Expectimax over one battle context, with its transposition table."""
+
+    def __init__(self, key, enemy_strength, escape_percent, escape_value=ESCAPE_VALUE):
+        self.key = key
+        self.fists = key is None
+        self.effects = weapon_effects(key)
+        self.hits = damage_distribution(key)
+        self.enemy_hits = uniform(1, enemy_damage_cap(enemy_strength))
+        self.heals = uniform(*POTION_HEAL)
+        self.escape = min(max(escape_percent, 0), 100) / 100
+        self.escape_value = escape_value
+        self.table = {}     # (health, enemy health, durability, potions, statuses) -> (depth, value, action)
+        self.deadline = None
+        self.nodes = 0
+        self.estimated = 0
+
+        self.mean_hit = sum(damage * p for damage, p in self.hits)
+        self.mean_enemy_hit = sum(damage * p for damage, p in self.enemy_hits)
+        self.mean_heal = sum(heal * p for heal, p in self.heals)
+
+    # Leaves
+    def estimate(self, health, enemy_health, durability, potions, statuses):
+        """A quick guess at a position's value: a race between the two sides' time to kill."""
+        self.estimated += 1
+        turns_to_die = (health + potions * self.mean_heal) / self.mean_enemy_hit
+        flee = self.escape_value * (1 - (1 - self.escape) ** max(1.0, turns_to_die))
+        if not self.fists and durability * self.mean_hit * 1.5 < enemy_health:
+            return flee     # the weapon breaks long before the enemy falls
+        turns_to_kill = enemy_health / self.mean_hit + potions
+        race = 1 / (1 + math.exp((turns_to_kill - turns_to_die - 0.5) / RACE_SCALE))
+        return max(race, flee)
+
+    # Search
+    def player(self, health, enemy_health, durability, potions, statuses, depth):
+        state = (health, enemy_health, durability, potions, statuses)
+        entry = self.table.get(state)
+        if entry is not None and entry[0] >= depth:
+            if entry[0] != EXACT:
+                self.estimated += 1
+            return entry[1]
+        if depth == 0:
+            return self.estimate(*state)
+
+        self.nodes += 1
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise Timeout
+
+        estimated = self.estimated
+        enemy = self.enemy
+        rolls = ((statuses, 1.0),)
+        if self.fists:
+            hits, left = self.hits, durability
+        elif durability > 0:
+            hits, left = hit_distribution(self.key, statuses), durability - 1
+            rolls = landed_distribution(self.effects, statuses)
+        else:
+            hits, left = ((0, 1.0),), 0     # a broken weapon deals no damage
+        best = 0.0
+        for damage, p in hits:
+            if damage >= enemy_health:
+                best += p
+                continue
+            for after, q in rolls:
+                best += p * q * enemy(health, enemy_health - damage, left, potions, after, depth)
+        action = ATTACK
+
+        if potions:
+            value = 0.0
+            for heal, p in self.heals:
+                value += p * enemy(min(health + heal, MAX_HEALTH), enemy_health, durability, potions - 1, statuses, depth)
+            if value > best:
+                best, action = value, USE_TOOL
+
+        if self.escape:
+            value = self.escape * self.escape_value
+            if self.escape < 1:
+                value += (1 - self.escape) * enemy(health, enemy_health, durability, potions, statuses, depth)
+            if value > best:
+                best, action = value, RUN
+
+        self.table[state] = (depth if self.estimated != estimated else EXACT, best, action)
+        return best
+
+    def enemy(self, health, enemy_health, durability, potions, statuses, depth):
+        # The enemy attacks, then the effects on it tick
+        tick, after = tick_statuses(self.effects, statuses)
+        if enemy_health <= tick:
+            return sum(p for damage, p in self.enemy_hits if damage < health)
+        value = 0.0
+        player = self.player
+        for damage, p in self.enemy_hits:
+            if damage < health:
+                value += p * player(health - damage, enemy_health - tick, durability, potions, after, depth - 1)
+        return value
+
+    def best(self, state, budget, max_depth=MAX_DEPTH):
+        """
+        Deepens the search from `state` until `budget` seconds have passed;
+        returns (action, value, depth) from the deepest finished search.
+        The first turn is always searched in full.
+        """
+        if len(self.table) > TABLE_SIZE:
+            self.table.clear()
+        started = time.perf_counter()
+        entry = self.table.get(state)
+        result = None if entry is None else (entry[2], entry[1], min(entry[0], max_depth))
+        for depth in range(1 if entry is None else entry[0] + 1, max_depth + 1):
+            self.deadline = None if result is None else started + budget
+            try:
+                value = self.player(*state, depth)
+            except Timeout:
+                break
+            stored, _, action = self.table[state]
+            result = (action, value, depth)
+            if stored == EXACT or time.perf_counter() - started > budget:
+                break
+        self.deadline = None
+        return result
+
+
+class Agent:
+    def __init__(self, budget=BUDGET, escape_value=ESCAPE_VALUE, max_depth=MAX_DEPTH):
+        self.budget = budget
+        self.escape_value = escape_value
+        self.max_depth = max_depth
+        self.searches = OrderedDict()   # battle context -> Search, least recently used first
+        self.suggestion = None          # the answer to the prompt being advised on
+        self.depth = 0                  # depth of the last battle search
+
+    def search(self, weapon, enemy_strength, dexterity):
+        context = (weapon_key(weapon), enemy_strength, escape_chance(dexterity))
+        found = self.searches.get(context)
+        if found is not None:
+            self.searches.move_to_end(context)
+            return found
+        found = self.searches[context] = Search(*context, self.escape_value)
+        if len(self.searches) > MAX_CONTEXTS:
+            self.searches.popitem(last=False)
+        return found
+
+    def state(self, character, weapon, enemy_health, statuses=()):
+        durability = weapon.durability if weapon else 0
+        potions = character["inventory"].count(POTION)
+        return (character["health"], enemy_health, durability, potions, enemy_statuses(weapon_key(weapon), statuses))
+
+    @metrics.timed("advisor_battle_seconds")
+    def battle_action(self, character, enemy_health, enemy_strength, statuses=()):
+        """
+        "1" (Attack), "2" (Use Tool) or "3" (Run) for this turn of a battle.
+        `statuses` are the enemy's effects, as EffectEngine.statuses() returns them.
+        """
+        weapon = character["current_weapon"]
+        search = self.search(weapon, enemy_strength, character["dexterity"])
+        state = self.state(character, weapon, enemy_health, statuses)
+        action, _, self.depth = search.best(state, self.budget, self.max_depth)
+        return action
+
+    def battle_value(self, character, weapon, enemy_strength, budget):
+        """The value of starting a battle against `enemy_strength` with `weapon` equipped."""
+        search = self.search(weapon, enemy_strength, character["dexterity"])
+        state = self.state(character, weapon, enemy_max_health(enemy_strength))
+        return search.best(state, budget, self.max_depth)[1]
+
+    @metrics.timed("advisor_equip_seconds")
+    def weapon_choice(self, character, enemy_strengths=None):
+        """
+        The inventory number of the weapon to equip for the coming battles
+        (against `enemy_strengths`, by default the range explore_area() draws
+        from), or "Q" to keep the current one.
+        """
+        if enemy_strengths is None:
+            low, high = game.EXPLORE_STRENGTH   # read per call, a content pack can replace it
+            enemy_strengths = (low, (low + high) // 2, high)
+        current = character["current_weapon"]
+        candidates = [(None, current)] + [
+            (str(number), item)
+            for number, item in enumerate(character["inventory"], 1)
+            if isinstance(item, Weapon) and item is not current and item.durability > 0
+        ]
+        budget = self.budget / (len(candidates) * len(enemy_strengths))
+        best, best_value = KEEP, None
+        for number, weapon in candidates:
+            value = sum(self.battle_value(character, weapon, strength, budget) for strength in enemy_strengths)
+            if best_value is None or value > best_value:
+                best, best_value = number or KEEP, value
+        return best
+
+    # Advising main.py's prompts
+    def advise_battle(self, character, enemy_health, enemy_strength, statuses=()):
+        self.suggestion = self.battle_action(character, enemy_health, enemy_strength, statuses)
+        return ACTION_NAMES[self.suggestion]
+
+    def advise_equip(self, character):
+        self.suggestion = self.weapon_choice(character)
+        if self.suggestion == KEEP:
+            return "keep your current weapon"
+        return f"equip {character['inventory'][int(self.suggestion) - 1].name}"
+
+    def take(self):
+        """The pending suggestion, once."""
+        suggestion, self.suggestion = self.suggestion, None
+        return suggestion
+
+
+def autoplay(flow, agent, answer=lambda prompt: "1"):
+    """
+    Runs a flow to the end with `agent` as main.advisor, answering each
+    advised prompt with its suggestion and any other with answer(prompt).
+    Returns the flow's result.
+    """
+    token = advisor.set(agent)
+    try:
+        prompt = next(flow)
+        while True:
+            reply = agent.take()
+            prompt = flow.send(answer(prompt) if reply is None else reply)
+    except StopIteration as stop:
+        return stop.value
+    finally:
+        advisor.reset(token)
+
+
+def auto_battle(character, enemy_strength, agent, rng=random):
+    """Fights one battle with the agent choosing every action; returns True if it was won."""
+    return autoplay(battle_flow(character, enemy_strength, rng), agent)
+
+
+def main():
+    from content import load_default_content
+    from inventory import Inventory
+    from main import weapon_specs
+
+    parser = argparse.ArgumentParser(description="Let the agent fight battles and report how it does.")
+    parser.add_argument("--battles", type=int, default=1000)
+    parser.add_argument("--strength", type=int, default=None, help="enemy strength (default: the strongest explore_area() draws)")
+    parser.add_argument("--weapon", default="iron_sword", help="weapon id, or 'none' for fists")
+    parser.add_argument("--health", type=int, default=MAX_HEALTH)
+    parser.add_argument("--dexterity", type=int, default=10)
+    parser.add_argument("--potions", type=int, default=0)
+    parser.add_argument("--budget", type=float, default=BUDGET * 1000, help="milliseconds per suggestion")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    load_default_content()
+    if args.strength is None:
+        args.strength = game.EXPLORE_STRENGTH[1]
+    agent = Agent(args.budget / 1000)
+    rng = random.Random(args.seed)
+    output.set(NullRenderer())
+    metrics.enable()
+    wins = 0
+    for _ in range(args.battles):
+        weapon = None if args.weapon == "none" else Weapon.from_spec(weapon_specs[args.weapon])
+        character = {
+            "name": "Bot", "health": args.health, "strength": 10, "intelligence": 10, "dexterity": args.dexterity,
+            "level": 1, "exp": 0, "bonus_points": 0, "current_weapon": weapon,
+            "inventory": Inventory([POTION] * args.potions), "effects": [], "world": None,
+        }
+        wins += auto_battle(character, args.strength, agent, rng)
+
+    print(f"{args.battles} battles against strength {args.strength}: won {wins / args.battles:.1%}")
+    print(metrics.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,470 @@
+"""
+Fleet-wide statistics over many saved characters.
+
+Scans a directory of saves (binary, or legacy JSON) or a CharacterStore
+database on a process pool and reports level and stat distributions, the
+most common weapons, a leaderboard by level and experience and the most
+bloated inventories.
+
+Nothing is loaded as a character. Each query only reads what it needs: the
+stats, leaderboard and inventory sizes come from a binary save's fixed-size
+header, "weapons" adds its meta section and "arsenal" (weapons carried in
+inventories, off by default) walks the entry tags of its inventory section
+without building any Weapon. Every chunk of saves is folded into a
+Summary: counters plus top-k heaps that never hold more than --top
+entries, so memory stays flat however many saves there are. The names of
+the few characters that make the leaderboards are read at the end.
+
+    python analytics.py saves/ --top 20 --jobs 8
+    python analytics.py characters.db --queries leaderboard,bloat --json
+"""
+import argparse
+import heapq
+import itertools
+import json
+import os
+import sqlite3
+import sys
+import time
+import zlib
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from urllib.request import pathname2url
+
+from main import weapon_specs
+from savefile import COUNT, DURABILITY, HEAD, HEADER_SIZE, ITEM, LONG, MAGIC, SHORT, STACK, STATS, VERSION, load, parse_header
+
+QUERIES = ("levels", "stats", "weapons", "arsenal", "leaderboard", "bloat")
+DEFAULT_QUERIES = ("levels", "stats", "weapons", "leaderboard", "bloat")
+SAVE_SUFFIXES = (".sav", ".json", ".txt")
+TOP = 10
+# One read usually covers a save's header and meta section
+READ_AHEAD = 4096
+# Damaged saves listed in a report
+MAX_DAMAGED = 10
+
+LEVEL = STATS.index("level")
+EXP = STATS.index("exp")
+
+
+def weapon_name(data):
+    """The name of a weapon saved as item_to_json() data, without building it."""
+    if not data:
+        return None
+    if "damage_range" in data:
+        return data["name"]
+    spec = weapon_specs.get(data["id"])
+    return spec.name if spec else data["id"]
+
+
+def section_weapons(data):
+    """Names of the weapons in a binary save's inventory section."""
+    offset = 0
+    end = len(data)
+    while offset < end:
+        tag = data[offset]
+        if tag == ITEM:
+            _, length = LONG.unpack_from(data, offset)
+            offset += LONG.size
+            entry = data[offset:offset + length]
+            offset += length
+            if b'"durability"' in entry:
+                yield weapon_name(json.loads(entry))
+            continue
+
+        _, length = SHORT.unpack_from(data, offset)
+        offset += SHORT.size
+        text = data[offset:offset + length].decode()
+        offset += length
+        if tag == STACK:
+            offset += COUNT.size
+        else:
+            offset += DURABILITY.size
+            yield weapon_name({"id": text})
+
+
+class Summary:
+    """
+    Partial results of a scan. Summaries of disjoint sets of saves merge()
+    into the summary of all of them.
+    """
+
+    def __init__(self, top=TOP):
+        self.top = top
+        self.characters = 0
+        self.damaged = 0
+        self.damaged_examples = []      # (who, error), at most MAX_DAMAGED
+        self.stats = {stat: Counter() for stat in STATS}    # stat -> {value: characters}
+        self.weapons = Counter()        # equipped weapon (or None) -> characters
+        self.arsenal = Counter()        # weapon -> copies carried
+        self.sizes = Counter()          # inventory entries -> characters
+        self.leaders = []               # min-heap of (level, exp, who)
+        self.bloated = []               # min-heap of (entries, bytes, who)
+
+    def push(self, heap, entry):
+        if len(heap) < self.top:
+            heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+
+    def add(self, who, stats, weapon=None, entries=0, size=0, owned=()):
+        """Counts one character; `stats` are in savefile.STATS order."""
+        self.characters += 1
+        for counter, value in zip(self.stats.values(), stats):
+            counter[value] += 1
+        self.weapons[weapon] += 1
+        self.arsenal.update(owned)
+        self.sizes[entries] += 1
+        self.push(self.leaders, (stats[LEVEL], stats[EXP], who))
+        self.push(self.bloated, (entries, size, who))
+
+    def fail(self, who, error):
+        self.damaged += 1
+        if len(self.damaged_examples) < MAX_DAMAGED:
+            self.damaged_examples.append((who, str(error)))
+
+    def merge(self, other):
+        self.characters += other.characters
+        self.damaged += other.damaged
+        self.damaged_examples.extend(other.damaged_examples[:MAX_DAMAGED - len(self.damaged_examples)])
+        for stat, counter in other.stats.items():
+            self.stats[stat].update(counter)
+        self.weapons.update(other.weapons)
+        self.arsenal.update(other.arsenal)
+        self.sizes.update(other.sizes)
+        for entry in other.leaders:
+            self.push(self.leaders, entry)
+        for entry in other.bloated:
+            self.push(self.bloated, entry)
+        return self
+
+    def leaderboard(self):
+        return sorted(self.leaders, reverse=True)
+
+    def most_bloated(self):
+        return sorted(self.bloated, reverse=True)
+
+    def rename(self, names):
+        """Replaces `who` in the leaderboards through the mapping `names`."""
+        self.leaders = [(level, exp, names.get(who, who)) for level, exp, who in self.leaders]
+        self.bloated = [(entries, size, names.get(who, who)) for entries, size, who in self.bloated]
+
+
+# Distributions
+def quantile(counter, q):
+    """The value below which a fraction `q` of the counted values fall."""
+    total = sum(counter.values())
+    rank = max(1, -(-q * total // 1))
+    seen = 0
+    for value in sorted(counter):
+        seen += counter[value]
+        if seen >= rank:
+            return value
+    return None
+
+
+def describe(counter):
+    """(min, median, p90, p99, max, mean) of counted values."""
+    total = sum(counter.values())
+    if not total:
+        return None
+    mean = sum(value * count for value, count in counter.items()) / total
+    return (min(counter), quantile(counter, 0.5), quantile(counter, 0.9), quantile(counter, 0.99), max(counter), mean)
+
+
+# Reading saves
+def read_legacy(data, size, queries):
+    stats = tuple(data.get(stat, 0) for stat in STATS)
+    inventory = data.get("inventory") or []
+    weapon = weapon_name(data.get("current_weapon")) if "weapons" in queries else None
+    owned = ()
+    if "arsenal" in queries:
+        owned = [
+            weapon_name(item)
+            for item in inventory
+            if isinstance(item, dict) and ("id" in item or "damage_range" in item)
+        ]
+    return stats, weapon, len(inventory), size, owned
+
+
+def read_save(path, queries):
+    """(stats, weapon, inventory entries, inventory bytes, carried weapons) of one save."""
+    with open(path, "rb") as file:
+        data = file.read(READ_AHEAD)
+        if not data.startswith(MAGIC):
+            data += file.read()
+            return read_legacy(json.loads(data), len(data), queries)
+        if len(data) < HEADER_SIZE:
+            raise ValueError("the save is damaged")
+        _, version, *values = HEAD.unpack_from(data)
+        if version > VERSION:
+            raise ValueError(f"saved by a newer version of the game (format {version})")
+        stats = tuple(values[:len(STATS)])
+        meta_length, entries, length, body_crc = values[len(STATS):]
+        meta_end = HEADER_SIZE + meta_length
+
+        weapon = None
+        if "weapons" in queries:
+            if len(data) < meta_end:
+                data += file.read(meta_end - len(data))
+            _, meta, _, _, _ = parse_header(data[:HEADER_SIZE], data[HEADER_SIZE:meta_end], "the save")
+            weapon = weapon_name(meta.get("current_weapon"))
+
+        owned = ()
+        if "arsenal" in queries:
+            file.seek(meta_end)
+            body = file.read(length)
+            if len(body) != length or zlib.crc32(body) != body_crc:
+                raise ValueError("the save's inventory is damaged")
+            owned = list(section_weapons(body))
+    return stats, weapon, entries, length, owned
+
+
+def scan_files(paths, queries, top):
+    """Worker: summarises the saves at `paths`. Leaderboard entries are keyed by path."""
+    summary = Summary(top)
+    for path in paths:
+        try:
+            summary.add(path, *read_save(path, queries))
+        except (OSError, ValueError, KeyError, TypeError, UnicodeDecodeError) as error:
+            summary.fail(path, error)
+    return summary
+
+
+def find_saves(directory):
+    """Paths of every save under `directory`, in a stable order."""
+    paths = []
+    for root, directories, files in os.walk(directory):
+        directories.sort()
+        paths.extend(os.path.join(root, name) for name in sorted(files) if name.endswith(SAVE_SUFFIXES))
+    return paths
+
+
+def save_names(paths):
+    names = {}
+    for path in paths:
+        try:
+            names[path] = load(path)["name"]
+        except (OSError, ValueError, KeyError):
+            pass
+    return names
+
+
+# Reading a CharacterStore
+def connect(path):
+    return sqlite3.connect(f"file:{pathname2url(os.path.abspath(path))}?mode=ro", uri=True)
+
+
+def scan_store(path, first, last, queries, top):
+    """Worker: summarises the characters named `first` to `last` in a CharacterStore."""
+    summary = Summary(top)
+    connection = connect(path)
+    try:
+        wanted = STATS + ("current_weapon",) if "weapons" in queries else STATS
+        between = (first, last)
+        sizes = {}
+        if "bloat" in queries:
+            sizes = {
+                name: (entries, size)
+                for name, entries, size in connection.execute(
+                    "SELECT name, COUNT(*), SUM(LENGTH(item)) FROM inventory WHERE name BETWEEN ? AND ? GROUP BY name",
+                    between,
+                )
+            }
+        owned = {}
+        if "arsenal" in queries:
+            for name, item in connection.execute(
+                "SELECT name, item FROM inventory WHERE name BETWEEN ? AND ? AND instr(item, '\"durability\"')", between
+            ):
+                owned.setdefault(name, []).append(weapon_name(json.loads(item)))
+
+        rows = connection.execute(
+            f"SELECT name, field, value FROM fields WHERE name BETWEEN ? AND ? "
+            f"AND field IN ({', '.join('?' * len(wanted))}) ORDER BY name",
+            between + wanted,
+        )
+        for name, fields in itertools.groupby(rows, lambda row: row[0]):
+            try:
+                values = {field: json.loads(value) for _, field, value in fields}
+                stats = tuple(values.get(stat, 0) for stat in STATS)
+                summary.add(name, stats, weapon_name(values.get("current_weapon")), *sizes.get(name, (0, 0)),
+                            owned.get(name, ()))
+            except (ValueError, KeyError, TypeError) as error:
+                summary.fail(name, error)
+    finally:
+        connection.close()
+    return summary
+
+
+def store_ranges(path, chunk_size):
+    """Splits the store's characters into (first name, last name) ranges of chunk_size."""
+    connection = connect(path)
+    try:
+        names = [name for (name,) in connection.execute("SELECT name FROM characters ORDER BY name")]
+    finally:
+        connection.close()
+    return [(names[i], names[min(i + chunk_size, len(names)) - 1]) for i in range(0, len(names), chunk_size)], len(names)
+
+
+# Scanning
+def scan(source, queries=DEFAULT_QUERIES, top=TOP, jobs=None, chunk_size=None, progress=None):
+    """
+    Summarises every save in `source`, a directory of saves or a
+    CharacterStore database. `progress(done, total)` is called as chunks
+    finish.
+    """
+    queries = frozenset(queries)
+    jobs = jobs or os.cpu_count() or 1
+    if os.path.isdir(source):
+        paths = find_saves(source)
+        total = len(paths)
+        chunk_size = chunk_size or max(1, min(2000, total // (jobs * 8)))
+        tasks = [(scan_files, paths[i:i + chunk_size], queries, top) for i in range(0, total, chunk_size)]
+    else:
+        chunk_size = chunk_size or 2000
+        ranges, total = store_ranges(source, chunk_size)
+        tasks = [(scan_store, source, first, last, queries, top) for first, last in ranges]
+
+    summary = Summary(top)
+    done = 0
+
+    def finish(partial):
+        nonlocal done
+        summary.merge(partial)
+        done += partial.characters + partial.damaged
+        if progress:
+            progress(done, total)
+
+    if jobs == 1 or len(tasks) <= 1:
+        for function, *arguments in tasks:
+            finish(function(*arguments))
+    else:
+        with ProcessPoolExecutor(min(jobs, len(tasks))) as pool:
+            task_iter = iter(tasks)
+            running = set()
+            try:
+                # A bounded number of chunks in flight, merged as they complete
+                while True:
+                    for function, *arguments in itertools.islice(task_iter, jobs * 2 - len(running)):
+                        running.add(pool.submit(function, *arguments))
+                    if not running:
+                        break
+                    completed, running = wait(running, return_when=FIRST_COMPLETED)
+                    for future in completed:
+                        finish(future.result())
+            except BaseException:
+                for future in running:
+                    future.cancel()
+                raise
+
+    if os.path.isdir(source):
+        summary.rename(save_names({who for *_, who in summary.leaders + summary.bloated}))
+    return summary
+
+
+# Reporting
+def bar(count, most, width=40):
+    return "#" * max(1, round(width * count / most)) if count else ""
+
+
+def report(summary, queries=DEFAULT_QUERIES):
+    lines = [f"{summary.characters} characters" + (f", {summary.damaged} damaged saves skipped" if summary.damaged else "")]
+    for who, error in summary.damaged_examples:
+        lines.append(f"  {who}: {error}")
+
+    if "levels" in queries and summary.characters:
+        levels = summary.stats["level"]
+        most = max(levels.values())
+        lines += ["", "Levels"]
+        lines += [f"{level:>6} {count:>9} {bar(count, most)}" for level, count in sorted(levels.items())]
+
+    if "stats" in queries and summary.characters:
+        lines += ["", f"{'Stat':<14}{'Min':>8}{'Median':>8}{'p90':>8}{'p99':>8}{'Max':>8}{'Mean':>10}"]
+        for stat, counter in summary.stats.items():
+            low, median, p90, p99, high, mean = describe(counter)
+            lines.append(f"{stat:<14}{low:>8}{median:>8}{p90:>8}{p99:>8}{high:>8}{mean:>10.2f}")
+
+    if "weapons" in queries:
+        lines += ["", "Most common weapons"]
+        lines += [f"{count:>9}  {weapon or '(none)'}" for weapon, count in summary.weapons.most_common(summary.top)]
+
+    if "arsenal" in queries:
+        lines += ["", "Most carried weapons"]
+        lines += [f"{count:>9}  {weapon}" for weapon, count in summary.arsenal.most_common(summary.top)]
+
+    if "leaderboard" in queries:
+        lines += ["", f"{'#':>4}  {'Level':>6}{'Exp':>6}  Name"]
+        for rank, (level, exp, name) in enumerate(summary.leaderboard(), 1):
+            lines.append(f"{rank:>4}  {level:>6}{exp:>6}  {name}")
+
+    if "bloat" in queries and summary.characters:
+        _, median, _, p99, _, mean = describe(summary.sizes)
+        lines += ["", f"Inventory entries: median {median}, p99 {p99}, mean {mean:.1f}",
+                  f"{'Entries':>10}{'Bytes':>12}{'x median':>10}  Name"]
+        for entries, size, name in summary.most_bloated():
+            lines.append(f"{entries:>10}{size:>12}{entries / max(median, 1):>10.1f}  {name}")
+    return "\n".join(lines)
+
+
+def to_json(summary, queries=DEFAULT_QUERIES):
+    result = {"characters": summary.characters, "damaged": summary.damaged}
+    if "levels" in queries:
+        result["levels"] = {str(level): count for level, count in sorted(summary.stats["level"].items())}
+    if "stats" in queries:
+        result["stats"] = {
+            stat: dict(zip(("min", "median", "p90", "p99", "max", "mean"), describe(counter) or ()))
+            for stat, counter in summary.stats.items()
+        }
+    if "weapons" in queries:
+        result["weapons"] = [[weapon, count] for weapon, count in summary.weapons.most_common(summary.top)]
+    if "arsenal" in queries:
+        result["arsenal"] = [[weapon, count] for weapon, count in summary.arsenal.most_common(summary.top)]
+    if "leaderboard" in queries:
+        result["leaderboard"] = [{"name": name, "level": level, "exp": exp} for level, exp, name in summary.leaderboard()]
+    if "bloat" in queries:
+        result["bloat"] = [{"name": name, "entries": entries, "bytes": size} for entries, size, name in summary.most_bloated()]
+    return result
+
+
+def query_list(text):
+    queries = tuple(text.split(","))
+    unknown = set(queries) - set(QUERIES)
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown queries: {', '.join(sorted(unknown))} (choose from {', '.join(QUERIES)})")
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Level, stat, weapon and inventory statistics over many saved characters.")
+    parser.add_argument("source", help="a directory of saves or a CharacterStore database")
+    parser.add_argument("--queries", type=query_list, default=DEFAULT_QUERIES,
+                        help=f"comma-separated, from {', '.join(QUERIES)} (default: all but arsenal)")
+    parser.add_argument("--top", type=int, default=TOP, help="entries in each leaderboard")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--chunk-size", type=int, default=None, help="saves per task")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    parser.add_argument("--quiet", action="store_true", help="do not report progress")
+    args = parser.parse_args()
+    if not os.path.exists(args.source):
+        parser.error(f"{args.source} does not exist")
+
+    def progress(done, total):
+        if not args.quiet:
+            print(f"[{done}/{total}]", file=sys.stderr)
+
+    start = time.perf_counter()
+    try:
+        summary = scan(args.source, args.queries, args.top, args.jobs, args.chunk_size, progress)
+    except KeyboardInterrupt:
+        sys.exit(130)
+    elapsed = time.perf_counter() - start
+
+    if args.json:
+        print(json.dumps(to_json(summary, args.queries), indent=2))
+    else:
+        print(report(summary, args.queries))
+    print(f"\nScanned {summary.characters + summary.damaged} saves in {elapsed:.2f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
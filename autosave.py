@@ -0,0 +1,170 @@
+"""
+Background autosave.
+
+AutoSaver.save() takes a snapshot of the character on the calling thread
+and hands it to a writer thread, so the game never waits on disk. Saves
+that arrive while the writer is busy are coalesced: only the most recent
+snapshot is written. Files are replaced atomically, so a crash leaves
+either the old save or the new one, never a torn file, and the new file
+keeps the old one's permissions.
+
+    saver = AutoSaver("character_data.sav", savefile.dumps)
+    saver.save(character)   # returns immediately
+    saver.flush()           # waits until the latest save is on disk
+    saver.close()
+"""
+import json
+import os
+import stat
+import threading
+
+import metrics
+
+FSYNC_POLICIES = ("none", "file", "full")
+
+# Read once at import, before any writer thread starts: os.umask() can only
+# be read by setting it, which would race with files opened on other threads
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+
+def replacement_mode(path):
+    """The permissions for a file replacing `path`: its own, or a new file's under the umask."""
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        return 0o666 & ~UMASK
+
+
+def write_json_atomic(path, data, fsync="file", indent=None):
+    """Writes `data` as JSON with write_atomic()."""
+    write_atomic(path, json.dumps(data, indent=indent).encode(), fsync)
+
+
+def write_atomic(path, data, fsync="file"):
+    """
+    Writes the bytes `data` to a temporary file next to `path` and renames
+    it over `path`. The temporary file is created private (mode 0600) and
+    given `path`'s permissions before the rename.
+
+    fsync is "none" (rename only), "file" (also fsync the data before the
+    rename) or "full" (also fsync the directory so the rename is durable).
+    """
+    if fsync not in FSYNC_POLICIES:
+        raise ValueError(f"fsync must be one of {FSYNC_POLICIES}, not {fsync!r}")
+
+    import tempfile
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".save-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            os.fchmod(file.fileno(), replacement_mode(path))
+            file.write(data)
+            if fsync != "none":
+                file.flush()
+                os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+    if fsync == "full" and hasattr(os, "O_DIRECTORY"):
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+class AutoSaver:
+    def __init__(self, path, snapshot, fsync="file", indent=None):
+        """
+        `snapshot` turns the live character into bytes (written as they
+        are) or JSON-ready data. It runs on the game thread, so the writer
+        never sees a half-updated character.
+        """
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}, not {fsync!r}")
+        self.path = path
+        self.snapshot = snapshot
+        self.fsync = fsync
+        self.indent = indent
+
+        self.condition = threading.Condition()
+        self.pending = None
+        self.writing = False
+        self.closed = False
+        self.error = None
+        self.saves_requested = 0
+        self.saves_written = 0
+
+        self.thread = threading.Thread(target=self.run, name="autosave", daemon=True)
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def save(self, character):
+        """Queues a save of `character`, replacing any save still waiting to be written."""
+        with metrics.timer("autosave_snapshot_seconds"):
+            data = self.snapshot(character)
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("AutoSaver is closed")
+            self.pending = data
+            self.saves_requested += 1
+            metrics.count("autosaves_requested_total")
+            self.condition.notify_all()
+
+    def flush(self, timeout=None):
+        """
+        Blocks until every queued save is on disk. Re-raises the last write
+        error, if any. Returns False if `timeout` ran out first.
+        """
+        with self.condition:
+            done = self.condition.wait_for(lambda: self.pending is None and not self.writing, timeout)
+            error, self.error = self.error, None
+        if error is not None:
+            raise error
+        return done
+
+    def close(self, timeout=None):
+        try:
+            self.flush(timeout)
+        finally:
+            with self.condition:
+                self.closed = True
+                self.condition.notify_all()
+            self.thread.join(timeout)
+
+    def run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending is not None or self.closed)
+                if self.pending is None:
+                    return
+                data, self.pending = self.pending, None
+                self.writing = True
+
+            try:
+                with metrics.timer("autosave_write_seconds"):
+                    if isinstance(data, bytes):
+                        write_atomic(self.path, data, self.fsync)
+                    else:
+                        write_json_atomic(self.path, data, self.fsync, self.indent)
+                error = None
+            except Exception as e:
+                error = e
+
+            with self.condition:
+                self.writing = False
+                if error is None:
+                    self.saves_written += 1
+                    metrics.count("autosaves_written_total")
+                else:
+                    self.error = error
+                self.condition.notify_all()
@@ -0,0 +1,281 @@
+"""
+Balance sweeps for weapon stats and enemy strength bands.
+
+Every combination of damage range, durability, critical hit chance and
+explore strength band from the grid (or --random N of them) is simulated
+against each strength in its band with simulator.simulate_fight(). The
+configurations are split into chunks that run on a process pool; workers
+write their numbers straight into a shared-memory table, and each finished
+chunk is printed and appended to a checkpoint file so an interrupted sweep
+can be resumed with --resume.
+
+    python balance.py --damage-low 5,8,10 --damage-high 12,15,20 --durability 10,20 --jobs 8
+    python balance.py --random 500 --target-win-rate 0.8 --max-turns 6 --checkpoint sweep.jsonl --resume
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from array import array
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+
+import main as game
+from main import MAX_HEALTH, WeaponSpec, weapon_specs
+from simulator import simulate_fight
+from streams import StreamFactory
+
+PARAMETERS = ("damage_low", "damage_high", "durability", "critical_hit_chance", "strength_low", "strength_high")
+# Columns of the shared result table, one row per configuration
+RESULTS = ("win_rate", "mean_turns", "mean_kill_turns", "mean_hp_remaining")
+ROW_SIZE = len(RESULTS)
+
+
+def grid(damage_low, damage_high, durability, critical_hit_chance, strength_low, strength_high):
+    """Every valid configuration, as tuples in PARAMETERS order."""
+    return [
+        config
+        for config in itertools.product(damage_low, damage_high, durability, critical_hit_chance, strength_low, strength_high)
+        if config[0] <= config[1] and config[4] <= config[5]
+    ]
+
+
+def evaluate(config, fights, streams, health=MAX_HEALTH, potions=0, heal_below=0):
+    """Simulates `fights` fights per strength in the config's band; returns a RESULTS tuple."""
+    damage_low, damage_high, durability, critical_hit_chance, strength_low, strength_high = config
+    weapon = WeaponSpec("sweep", "Sweep", (damage_low, damage_high), durability, critical_hit_chance, ())
+    total = wins = turns = kill_turns = hp_remaining = 0
+    for strength in range(strength_low, strength_high + 1):
+        rng = streams.stream(config, strength)
+        for _ in range(fights):
+            won, fight_turns, health_left, _ = simulate_fight(health, weapon, strength, rng, potions, heal_below)
+            total += 1
+            turns += fight_turns
+            hp_remaining += health_left
+            if won:
+                wins += 1
+                kill_turns += fight_turns
+    return wins / total, turns / total, kill_turns / wins if wins else float("inf"), hp_remaining / total
+
+
+def evaluate_chunk(memory_name, start, configs, fights, seed, health, potions, heal_below):
+    """Worker: evaluates configs[i] into row start + i of the shared table."""
+    memory = shared_memory.SharedMemory(memory_name)
+    try:
+        table = memory.buf.cast("d")
+        streams = StreamFactory(seed)
+        for i, config in enumerate(configs):
+            row = (start + i) * ROW_SIZE
+            table[row:row + ROW_SIZE] = array("d", evaluate(config, fights, streams, health, potions, heal_below))
+        table.release()
+    finally:
+        memory.close()
+    return start, len(configs)
+
+
+# Checkpoints
+def load_checkpoint(path, configs):
+    """Returns {index: results} for rows of an earlier run that match `configs`."""
+    done = {}
+    try:
+        with open(path) as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # A line cut short by the interruption
+                index = entry["index"]
+                if index < len(configs) and tuple(entry["config"]) == configs[index]:
+                    done[index] = tuple(entry[name] for name in RESULTS)
+    except FileNotFoundError:
+        pass
+    return done
+
+
+def row_entry(index, config, results):
+    entry = {"index": index, "config": list(config)}
+    entry.update(zip(RESULTS, results))
+    return entry
+
+
+# Sweeping
+def sweep(configs, fights=2000, seed=0, jobs=None, chunk_size=None, checkpoint=None, resume=False,
+          health=MAX_HEALTH, potions=0, heal_below=0, progress=None):
+    """
+    Evaluates every configuration and returns a list of RESULTS tuples in
+    the same order. `progress(done, total, entries)` is called as chunks
+    finish. Results only depend on the seed, never on jobs or chunk_size.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    done = load_checkpoint(checkpoint, configs) if checkpoint and resume else {}
+    if checkpoint and not resume:
+        open(checkpoint, "w").close()
+    pending = [i for i in range(len(configs)) if i not in done]
+    if chunk_size is None:
+        chunk_size = max(1, min(64, len(pending) // (jobs * 8)))
+
+    memory = shared_memory.SharedMemory(create=True, size=max(1, len(configs)) * ROW_SIZE * 8)
+    table = memory.buf.cast("d")
+    try:
+        for index, results in done.items():
+            table[index * ROW_SIZE:(index + 1) * ROW_SIZE] = array("d", results)
+
+        # Chunks are runs of consecutive pending indices
+        chunks = []
+        for _, run in itertools.groupby(enumerate(pending), lambda pair: pair[1] - pair[0]):
+            run = [index for _, index in run]
+            chunks.extend(run[i:i + chunk_size] for i in range(0, len(run), chunk_size))
+
+        finished = len(done)
+        file = open(checkpoint, "a+") if checkpoint else None
+        if file and file.tell():
+            file.seek(file.tell() - 1)
+            if file.read(1) != "\n":
+                file.write("\n")  # Finish a line cut short by the interruption
+
+        def finish(start, count):
+            nonlocal finished
+            entries = [
+                row_entry(index, configs[index], tuple(table[index * ROW_SIZE:(index + 1) * ROW_SIZE]))
+                for index in range(start, start + count)
+            ]
+            if file:
+                file.write("".join(json.dumps(entry) + "\n" for entry in entries))
+                file.flush()
+            finished += count
+            if progress:
+                progress(finished, len(configs), entries)
+
+        arguments = (fights, seed, health, potions, heal_below)
+        try:
+            if jobs == 1:
+                for chunk in chunks:
+                    finish(*evaluate_chunk(memory.name, chunk[0], [configs[i] for i in chunk], *arguments))
+            else:
+                with ProcessPoolExecutor(jobs) as pool:
+                    chunk_iter = iter(chunks)
+                    running = set()
+                    try:
+                        # A bounded number of chunks in flight; results stream out as they complete
+                        while True:
+                            for chunk in itertools.islice(chunk_iter, jobs * 2 - len(running)):
+                                running.add(pool.submit(
+                                    evaluate_chunk, memory.name, chunk[0], [configs[i] for i in chunk], *arguments
+                                ))
+                            if not running:
+                                break
+                            completed, running = wait(running, return_when=FIRST_COMPLETED)
+                            for future in completed:
+                                finish(*future.result())
+                    except BaseException:
+                        for future in running:
+                            future.cancel()
+                        raise
+        finally:
+            if file:
+                file.close()
+
+        rows = [tuple(table[i * ROW_SIZE:(i + 1) * ROW_SIZE]) for i in range(len(configs))]
+    finally:
+        table.release()
+        memory.close()
+        memory.unlink()
+    return rows
+
+
+def hits(configs, rows, target_win_rate, tolerance=0.05, max_turns=None):
+    """Configurations within `tolerance` of the target win rate (and killing fast enough), best first."""
+    matches = [
+        (config, row)
+        for config, row in zip(configs, rows)
+        if abs(row[0] - target_win_rate) <= tolerance and (max_turns is None or row[2] <= max_turns)
+    ]
+    matches.sort(key=lambda match: (abs(match[1][0] - target_win_rate), match[1][2]))
+    return matches
+
+
+def format_row(config, row):
+    damage_low, damage_high, durability, chance, strength_low, strength_high = config
+    win_rate, mean_turns, kill_turns, hp_left = row
+    return (
+        f"{f'{damage_low}-{damage_high}':>9}{durability:>6}{chance:>7.2f}{f'{strength_low}-{strength_high}':>9}"
+        f"{win_rate * 100:>8.1f}{mean_turns:>8.2f}{kill_turns:>8.2f}{hp_left:>9.1f}"
+    )
+
+
+HEADER = f"{'Damage':>9}{'Dur':>6}{'Crit':>7}{'Enemy':>9}{'Win %':>8}{'Turns':>8}{'TTK':>8}{'HP left':>9}"
+
+
+def values(text, kind=int):
+    return [kind(value) for value in text.split(",")]
+
+
+def main():
+    from content import load_default_content
+
+    load_default_content()
+    base = weapon_specs["iron_sword"]
+    parser = argparse.ArgumentParser(description="Sweep weapon stats and enemy strength bands for target win rates.")
+    parser.add_argument("--damage-low", type=values, default=[base.damage_range[0]], help="comma-separated values")
+    parser.add_argument("--damage-high", type=values, default=[base.damage_range[1]])
+    parser.add_argument("--durability", type=values, default=[base.durability])
+    parser.add_argument("--crit", type=lambda text: values(text, float), default=[base.critical_hit_chance])
+    parser.add_argument("--strength-low", type=values, default=[game.EXPLORE_STRENGTH[0]])
+    parser.add_argument("--strength-high", type=values, default=[game.EXPLORE_STRENGTH[1]])
+    parser.add_argument("--random", type=int, default=None, help="evaluate this many random configurations from the grid")
+    parser.add_argument("--fights", type=int, default=2000, help="fights per configuration and enemy strength")
+    parser.add_argument("--health", type=int, default=MAX_HEALTH)
+    parser.add_argument("--potions", type=int, default=0)
+    parser.add_argument("--heal-below", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--chunk-size", type=int, default=None)
+    parser.add_argument("--checkpoint", help="append finished results here (JSON lines)")
+    parser.add_argument("--resume", action="store_true", help="skip configurations already in the checkpoint")
+    parser.add_argument("--target-win-rate", type=float, default=0.75)
+    parser.add_argument("--tolerance", type=float, default=0.05)
+    parser.add_argument("--max-turns", type=float, default=None, help="only report configurations that kill this fast")
+    parser.add_argument("--quiet", action="store_true", help="do not stream partial results")
+    args = parser.parse_args()
+
+    configs = grid(args.damage_low, args.damage_high, args.durability, args.crit, args.strength_low, args.strength_high)
+    if args.random is not None and args.random < len(configs):
+        configs = sorted(random.Random(args.seed).sample(configs, args.random))
+    if not configs:
+        parser.error("the grid has no valid configurations (damage/strength low must not exceed high)")
+
+    def progress(done, total, entries):
+        if not args.quiet:
+            for entry in entries:
+                print(format_row(entry["config"], [entry[name] for name in RESULTS]))
+        print(f"[{done}/{total}]", file=sys.stderr)
+
+    if not args.quiet:
+        print(HEADER)
+    start = time.perf_counter()
+    try:
+        rows = sweep(
+            configs, args.fights, args.seed, args.jobs, args.chunk_size, args.checkpoint, args.resume,
+            args.health, args.potions, args.heal_below, progress,
+        )
+    except KeyboardInterrupt:
+        if args.checkpoint:
+            print(f"\nInterrupted; rerun with --resume to continue from {args.checkpoint}", file=sys.stderr)
+        sys.exit(130)
+    elapsed = time.perf_counter() - start
+
+    matches = hits(configs, rows, args.target_win_rate, args.tolerance, args.max_turns)
+    print(f"\n{len(configs)} configurations in {elapsed:.1f}s; {len(matches)} within "
+          f"{args.tolerance:.0%} of a {args.target_win_rate:.0%} win rate"
+          + (f" killing in <= {args.max_turns} turns" if args.max_turns is not None else ""))
+    if matches:
+        print(HEADER)
+        for config, row in matches[:20]:
+            print(format_row(config, row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""
+Benchmarks for the game's hot paths.
+
+Each benchmark drives the real functions from main.py with scripted input()
+answers and output silenced, and reports operations per second plus the
+peak memory allocated by one operation (tracemalloc). Results can be saved
+as a baseline, and later runs are compared against it so regressions show
+up before they ship.
+
+    python bench.py                      # run everything
+    python bench.py -k battle            # only benchmarks whose name contains "battle"
+    python bench.py --save-baseline      # store results in bench_baseline.json
+    python bench.py --check              # exit 1 if anything regressed against the baseline
+"""
+import argparse
+import builtins
+import contextlib
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import main
+from inventory import Inventory
+from renderer import Renderer
+
+BASELINE_FILE = "bench_baseline.json"
+INVENTORY_SIZES = (10, 1000, 100000)
+ENEMY_STRENGTHS = tuple(range(main.EXPLORE_STRENGTH[0], main.EXPLORE_STRENGTH[1] + 1)) + (main.BOSS_STRENGTH,)
+
+# name -> function returning the operation to time
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+@contextlib.contextmanager
+def scripted(answers):
+    """Answers every input() with the given answers (cycled) and silences game output."""
+    answers = itertools.cycle(answers)
+    original_input = builtins.input
+    builtins.input = lambda prompt="": next(answers)
+    # Output is still formatted, then thrown away
+    token = main.output.set(Renderer(lambda text: None))
+    try:
+        yield
+    finally:
+        builtins.input = original_input
+        main.output.reset(token)
+
+
+def new_character(inventory_size=0, rng=None):
+    rng = rng or random.Random(0)
+    character = {
+        "name": "Bench",
+        "health": 100,
+        "strength": 10,
+        "intelligence": 10,
+        "dexterity": 10,
+        "level": 1,
+        "exp": 0,
+        "bonus_points": 0,
+        "current_weapon": main.unique_weapons[0].create(),
+        "inventory": Inventory(),
+    }
+    # A realistic mix: many stacks and weapons, as built up by real loot
+    for item in main.generate_loot_batch(inventory_size, rng):
+        if isinstance(item, main.WeaponSpec):
+            item = item.create()
+        main.add_to_inventory(character, item, rng)
+    while len(character["inventory"]) < inventory_size:
+        character["inventory"].add(main.unique_weapons[len(character["inventory"]) % len(main.unique_weapons)].create())
+    return character
+
+
+# Benchmarks
+for strength in ENEMY_STRENGTHS:
+    def battle_setup(strength=strength):
+        rng = random.Random(strength)
+
+        def op():
+            character = new_character(rng=rng)
+            main.battle(character, strength, rng)
+        return op
+    benchmark(f"battle[strength={strength}]")(battle_setup)
+
+
+@benchmark("generate_loot")
+def generate_loot_setup():
+    rng = random.Random(1)
+    return lambda: main.generate_loot(rng)
+
+
+@benchmark("generate_loot_batch[1000]")
+def generate_loot_batch_setup():
+    rng = random.Random(1)
+    return lambda: main.generate_loot_batch(1000, rng)
+
+
+for size in INVENTORY_SIZES:
+    def add_setup(size=size):
+        rng = random.Random(2)
+        character = new_character(size)
+        loot = main.unique_weapons[2]
+
+        def op():
+            main.add_to_inventory(character, "Gold", rng)
+            main.add_to_inventory(character, loot.create(), rng)
+        return op
+
+    def save_setup(size=size):
+        character = new_character(size)
+        return lambda: main.save_character(character)
+
+    def load_setup(size=size):
+        main.save_character(new_character(size))
+        return main.load_character
+
+    def load_inventory_setup(size=size):
+        main.save_character(new_character(size))
+        return lambda: main.load_character()["inventory"].load()
+
+    def print_setup(size=size):
+        character = new_character(size)
+
+        def op():
+            main.print_character_info(character)
+            main.output.get().flush()
+        return op
+
+    benchmark(f"add_to_inventory[{size}]")(add_setup)
+    benchmark(f"save_character[{size}]")(save_setup)
+    benchmark(f"load_character[{size}]")(load_setup)
+    benchmark(f"load_character+inventory[{size}]")(load_inventory_setup)
+    benchmark(f"print_character_info[{size}]")(print_setup)
+
+
+# Runner
+def measure(op, min_time=0.2, repeat=3):
+    """Returns the best ops/second over `repeat` runs of at least `min_time` seconds."""
+    op()  # warm up
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            op()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / 10 or number >= 1 << 20:
+            break
+        number *= 10
+    number = max(1, int(number * min_time / max(elapsed, 1e-9)))
+
+    best = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            op()
+        best = max(best, number / (time.perf_counter() - start))
+    return best
+
+
+def measure_allocations(op):
+    """Peak bytes allocated while running `op` once."""
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        op()
+        return tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+
+
+def run(names, min_time=0.2, repeat=3):
+    results = {}
+    with tempfile.TemporaryDirectory() as directory, scripted(["1"]):
+        cwd = os.getcwd()
+        os.chdir(directory)  # save/load benchmarks write character_data.json here
+        try:
+            for name in names:
+                op = BENCHMARKS[name]()
+                results[name] = {
+                    "ops_per_sec": measure(op, min_time, repeat),
+                    "alloc_bytes": measure_allocations(op),
+                }
+                print(format_result(name, results[name]), file=sys.stderr)
+        finally:
+            os.chdir(cwd)
+    return results
+
+
+def format_result(name, result, baseline=None, tolerance=0.25):
+    line = f"{name:<34}{result['ops_per_sec']:>14,.1f} ops/s{result['alloc_bytes'] / 1024:>12,.1f} KiB"
+    if baseline:
+        speed = result["ops_per_sec"] / baseline["ops_per_sec"] - 1
+        line += f"{speed:>+9.1%}"
+        if is_regression(result, baseline, tolerance):
+            line += "  REGRESSION"
+    return line
+
+
+def is_regression(result, baseline, tolerance):
+    slower = result["ops_per_sec"] < baseline["ops_per_sec"] * (1 - tolerance)
+    # Small absolute changes in allocations are noise, not regressions
+    bigger = result["alloc_bytes"] > max(baseline["alloc_bytes"] * (1 + tolerance), baseline["alloc_bytes"] + 4096)
+    return slower or bigger
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Benchmark combat, loot, inventory and save/load.")
+    parser.add_argument("-k", dest="pattern", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--check", action="store_true", help="exit with status 1 on any regression")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown/extra allocation (0.25 = 25%%)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per timing run")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    names = [name for name in BENCHMARKS if args.pattern in name]
+    results = run(names, args.min_time, args.repeat)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+
+    print(f"{'benchmark':<34}{'speed':>20}{'alloc/op':>16}{'vs base':>9}")
+    regressions = []
+    for name, result in results.items():
+        print(format_result(name, result, baseline.get(name), args.tolerance))
+        if name in baseline and is_regression(result, baseline[name], args.tolerance):
+            regressions.append(name)
+
+    if args.save_baseline:
+        baseline.update(results)
+        with open(args.baseline, "w") as file:
+            json.dump(baseline, file, indent=4, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+
+    if regressions:
+        print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+        if args.check:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,62 @@
+"""
+Compact character storage.
+
+Character is a __slots__ object that also behaves like the character dicts
+used throughout main.py, so it can be passed straight to level_up(),
+run_away(), battle() and friends.
+"""
+from collections.abc import MutableMapping
+
+from inventory import Inventory
+
+STATS = ("health", "strength", "intelligence", "dexterity", "level", "exp", "bonus_points")
+FIELDS = ("name",) + STATS + ("current_weapon", "inventory", "effects", "world")
+
+
+class Character(MutableMapping):
+    __slots__ = FIELDS
+
+    def __init__(self, name, health=100, strength=10, intelligence=10, dexterity=10,
+                 level=1, exp=0, bonus_points=0, current_weapon=None, inventory=None, effects=None, world=None):
+        self.name = name
+        self.health = health
+        self.strength = strength
+        self.intelligence = intelligence
+        self.dexterity = dexterity
+        self.level = level
+        self.exp = exp
+        self.bonus_points = bonus_points
+        self.current_weapon = current_weapon
+        self.inventory = Inventory() if inventory is None else inventory
+        self.effects = [] if effects is None else effects
+        self.world = world
+
+    @classmethod
+    def from_dict(cls, data):
+        """Builds a Character from a character dict. Unknown keys are ignored."""
+        return cls(**{field: data[field] for field in FIELDS if field in data})
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in FIELDS}
+
+    def __getitem__(self, key):
+        if key not in FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in FIELDS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __delitem__(self, key):
+        raise TypeError("Character fields cannot be deleted")
+
+    def __iter__(self):
+        return iter(FIELDS)
+
+    def __len__(self):
+        return len(FIELDS)
+
+    def __repr__(self):
+        return f"Character({self.to_dict()!r})"
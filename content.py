@@ -0,0 +1,305 @@
+"""
+Data-driven content packs.
+
+Weapons, the loot table, enemy strengths and level-up gains can be defined
+in a JSON or TOML file (see content/default.json). A pack is validated and
+compiled once (weapon specs registered, loot table turned into an alias
+table) and the compiled result is pickled into a cache keyed by the file's
+SHA-256, so later startups skip parsing and validation when the file has
+not changed.
+
+Applying a pack swaps the tables main.py reads at call time, so a pack can
+be hot-reloaded in a running process without restarting sessions:
+
+    pack = ContentPack("content/default.json")
+    pack.apply()
+    ...
+    pack.reload_if_changed()
+
+The game, server.py and prefork.py's workers load content/default.json at
+startup and keep checking it for edits while they run (poll()).
+"""
+import hashlib
+import json
+import os
+import pickle
+import sys
+
+import main
+from effects import EFFECTS
+from loot import LootTable
+from main import WeaponSpec
+
+DEFAULT_CONTENT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "content", "default.json")
+
+# Bump when the compiled format changes so stale caches are ignored
+CACHE_VERSION = 1
+
+# Seconds between checks of a served pack's file
+RELOAD_INTERVAL = 2.0
+
+WEAPON_PREFIX = "weapon:"
+STATS = ("health", "strength", "intelligence", "dexterity")
+
+
+class ContentError(ValueError):
+    """Raised when a content pack fails validation."""
+
+
+class CompiledContent:
+    """A validated pack, ready to apply. Sections missing from the file are None."""
+
+    def __init__(self, weapons=None, loot_table=None, loot=None, enemies=None, level_up=None):
+        self.weapons = weapons
+        self.loot_table = loot_table
+        self.loot = loot
+        self.enemies = enemies
+        self.level_up = level_up
+
+
+# Validation
+def check(condition, where, message):
+    if not condition:
+        raise ContentError(f"{where}: {message}")
+
+
+def check_range(value, where, minimum=0):
+    check(
+        isinstance(value, list) and len(value) == 2 and all(isinstance(v, int) for v in value),
+        where, "must be a [low, high] pair of integers",
+    )
+    check(minimum <= value[0] <= value[1], where, f"must satisfy {minimum} <= low <= high")
+
+
+def validate(data):
+    check(isinstance(data, dict), "content", "must be a table/object")
+    unknown = set(data) - {"weapons", "loot", "enemies", "level_up"}
+    check(not unknown, "content", f"unknown sections {sorted(unknown)}")
+
+    weapon_ids = set(main.weapon_specs)
+    for i, weapon in enumerate(data.get("weapons", [])):
+        where = f"weapons[{i}]"
+        check(isinstance(weapon, dict), where, "must be a table/object")
+        check(isinstance(weapon.get("id"), str) and weapon["id"], where, "needs a string id")
+        check(isinstance(weapon.get("name"), str) and weapon["name"], where, "needs a string name")
+        check_range(weapon.get("damage_range"), f"{where}.damage_range", minimum=1)
+        check(isinstance(weapon.get("durability"), int) and weapon["durability"] > 0, where, "durability must be a positive integer")
+        chance = weapon.get("critical_hit_chance", 0.1)
+        check(isinstance(chance, (int, float)) and 0 <= chance <= 1, where, "critical_hit_chance must be between 0 and 1")
+        effects = weapon.get("special_effects", [])
+        check(isinstance(effects, list) and all(isinstance(e, str) for e in effects), where, "special_effects must be a list of strings")
+        unknown = [effect for effect in effects if effect not in EFFECTS]
+        check(not unknown, where, f"unknown special_effects {unknown}, expected some of {sorted(EFFECTS)}")
+        weapon_ids.add(weapon["id"])
+
+    if "loot" in data:
+        loot = data["loot"]
+        check(isinstance(loot, dict), "loot", "must be a table/object")
+        chance = loot.get("no_loot_chance")
+        check(isinstance(chance, (int, float)) and 0 <= chance < 1, "loot.no_loot_chance", "must be in [0, 1)")
+        weights = loot.get("rarity_weights")
+        check(isinstance(weights, dict) and weights, "loot.rarity_weights", "must be a non-empty table")
+        for rarity, weight in weights.items():
+            check(isinstance(weight, (int, float)) and weight > 0, f"loot.rarity_weights.{rarity}", "must be positive")
+        items = loot.get("items")
+        check(isinstance(items, dict) and items, "loot.items", "must be a non-empty table")
+        for rarity, entries in items.items():
+            where = f"loot.items.{rarity}"
+            check(rarity in weights, where, "has no rarity weight")
+            check(isinstance(entries, list) and entries, where, "must be a non-empty list")
+            for entry in entries:
+                check(isinstance(entry, str) and entry, where, "entries must be item names")
+                if entry.startswith(WEAPON_PREFIX):
+                    check(entry[len(WEAPON_PREFIX):] in weapon_ids, where, f"unknown weapon {entry!r}")
+
+    if "enemies" in data:
+        enemies = data["enemies"]
+        check(isinstance(enemies, dict), "enemies", "must be a table/object")
+        check_range(enemies.get("explore"), "enemies.explore")
+        check(isinstance(enemies.get("boss"), int) and enemies["boss"] >= 0, "enemies.boss", "must be a non-negative integer")
+        check_range(enemies.get("miniboss"), "enemies.miniboss")
+
+    if "level_up" in data:
+        gains = data["level_up"]
+        check(isinstance(gains, dict), "level_up", "must be a table/object")
+        check(set(gains) <= set(STATS), "level_up", f"stats must be among {STATS}")
+        for stat, gain in gains.items():
+            check_range(gain, f"level_up.{stat}")
+
+
+# Compilation
+def compile_content(data):
+    validate(data)
+
+    weapons = None
+    if "weapons" in data:
+        weapons = [
+            WeaponSpec(
+                weapon["id"], weapon["name"], tuple(weapon["damage_range"]), weapon["durability"],
+                weapon.get("critical_hit_chance", 0.1), tuple(weapon.get("special_effects", ())),
+            )
+            for weapon in data["weapons"]
+        ]
+
+    loot_table = loot = None
+    if "loot" in data:
+        specs = dict(main.weapon_specs)
+        specs.update((spec.id, spec) for spec in weapons or ())
+        loot = {
+            rarity: [specs[entry[len(WEAPON_PREFIX):]] if entry.startswith(WEAPON_PREFIX) else entry for entry in entries]
+            for rarity, entries in data["loot"]["items"].items()
+        }
+        loot_table = LootTable(loot, data["loot"]["rarity_weights"], data["loot"]["no_loot_chance"])
+
+    enemies = None
+    if "enemies" in data:
+        enemies = {
+            "explore": tuple(data["enemies"]["explore"]),
+            "boss": data["enemies"]["boss"],
+            "miniboss": tuple(data["enemies"]["miniboss"]),
+        }
+
+    level_up = None
+    if "level_up" in data:
+        level_up = {stat: tuple(gain) for stat, gain in data["level_up"].items()}
+
+    return CompiledContent(weapons, loot_table, loot, enemies, level_up)
+
+
+def parse(path, raw):
+    if path.endswith(".toml"):
+        # Imported on first use: tomllib costs more to import than the rest of this module
+        try:
+            import tomllib
+        except ImportError:  # Python < 3.11
+            raise ContentError(f"{path}: TOML content needs Python 3.11+ (tomllib)") from None
+        return tomllib.loads(raw.decode("utf-8"))
+    return json.loads(raw)
+
+
+def cache_path(path, digest, cache_dir=None):
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), ".cache")
+    return os.path.join(cache_dir, f"{os.path.basename(path)}-{digest[:32]}-v{CACHE_VERSION}.pickle")
+
+
+def load_content(path, cache_dir=None):
+    """Returns (compiled content, sha256 of the file), using the compiled cache when possible."""
+    with open(path, "rb") as file:
+        raw = file.read()
+    digest = hashlib.sha256(raw).hexdigest()
+    cached = cache_path(path, digest, cache_dir)
+
+    try:
+        with open(cached, "rb") as file:
+            return pickle.load(file), digest
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        pass
+
+    try:
+        content = compile_content(parse(path, raw))
+    except (json.JSONDecodeError, ValueError) as e:
+        if isinstance(e, ContentError):
+            raise
+        raise ContentError(f"{path}: {e}") from e
+
+    try:
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        temp_path = f"{cached}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as file:
+            pickle.dump(content, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cached)
+    except OSError:
+        pass  # A read-only install still works, it just compiles every time
+    return content, digest
+
+
+def canonical(item):
+    # Unpickled specs are copies; weapons must point at the registered spec to save by id
+    return main.add_weapon_spec(item) if isinstance(item, WeaponSpec) else item
+
+
+def apply_content(content):
+    """Makes main.py use the pack's tables from the next call on."""
+    if content.weapons is not None:
+        content.weapons = [canonical(spec) for spec in content.weapons]
+        main.unique_weapons[:] = content.weapons
+    if content.loot_table is not None:
+        table = content.loot_table
+        table.outcomes = [(rarity, canonical(item)) for rarity, item in table.outcomes]
+        table.items = [item for _, item in table.outcomes]
+        content.loot = {rarity: [canonical(item) for item in items] for rarity, items in content.loot.items()}
+        main.LOOT_TABLE = content.loot
+        main.loot_table = table
+    if content.enemies is not None:
+        main.EXPLORE_STRENGTH = content.enemies["explore"]
+        main.BOSS_STRENGTH = content.enemies["boss"]
+        main.MINIBOSS_STRENGTH = content.enemies["miniboss"]
+    if content.level_up is not None:
+        # Updated in place, other modules hold a reference to this dict
+        main.LEVEL_UP_GAINS.clear()
+        main.LEVEL_UP_GAINS.update(content.level_up)
+
+
+class ContentPack:
+    def __init__(self, path=DEFAULT_CONTENT, cache_dir=None):
+        self.path = path
+        self.cache_dir = cache_dir
+        self.content = None
+        self.digest = None
+        self.stat = None
+
+    def load(self):
+        self.stat = self.file_stat()
+        self.content, self.digest = load_content(self.path, self.cache_dir)
+        return self.content
+
+    def apply(self):
+        if self.content is None:
+            self.load()
+        apply_content(self.content)
+
+    def file_stat(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload_if_changed(self):
+        """
+        Reloads and applies the pack if the file changed since it was loaded.
+        Returns True if new content was applied. An invalid edit raises
+        ContentError and leaves the current content in place.
+        """
+        stat = self.file_stat()
+        if self.stat == stat:
+            return False
+        # Recorded first, so an invalid edit is reported once rather than on every check
+        self.stat = stat
+        content, new_digest = load_content(self.path, self.cache_dir)
+        if new_digest == self.digest:
+            return False
+        self.content, self.digest = content, new_digest
+        apply_content(content)
+        return True
+
+
+def load_default_content():
+    """Applies content/default.json if it exists and returns its ContentPack."""
+    if not os.path.exists(DEFAULT_CONTENT):
+        return None
+    pack = ContentPack(DEFAULT_CONTENT)
+    pack.apply()
+    return pack
+
+
+def poll(pack):
+    """
+    Hot-reloads `pack` (which may be None) if its file changed. A failed
+    reload is reported on stderr and the running content stays in place.
+    """
+    if pack is None:
+        return False
+    try:
+        return pack.reload_if_changed()
+    except (ContentError, OSError) as error:
+        print(f"Content pack not reloaded: {error}", file=sys.stderr)
+        return False
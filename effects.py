@@ -0,0 +1,132 @@
+"""
+Status effects.
+
+Weapons with special effects can afflict what they hit. Each effect lasts
+a number of turns, may deal damage every turn it is active and stacks up
+to a limit; applying it again adds a stack and restarts its duration.
+Enemies inflict no effects, so only the enemy is ever afflicted, and
+effects end with the battle.
+
+EffectEngine keeps the effects of every target in a battle. Upcoming
+ticks and expiries sit in a heap ordered by turn, so a turn only touches
+the effects that actually fire on it, however many are active. Entries
+made stale by a refresh are skipped when they come up.
+"""
+import heapq
+import random
+from collections import namedtuple
+
+# chance: per hit; damage: per stack per turn; damage_taken: multiplier on hits while active
+EffectSpec = namedtuple("EffectSpec", "name chance damage duration max_stacks damage_taken")
+
+EFFECTS = {
+    "Poison": EffectSpec("Poison", chance=0.35, damage=2, duration=4, max_stacks=3, damage_taken=1.0),
+    "Burn": EffectSpec("Burn", chance=0.3, damage=4, duration=2, max_stacks=1, damage_taken=1.0),
+    "Bleed": EffectSpec("Bleed", chance=0.3, damage=1, duration=3, max_stacks=5, damage_taken=1.0),
+    "Armor Pierce": EffectSpec("Armor Pierce", chance=0.5, damage=0, duration=2, max_stacks=1, damage_taken=1.25),
+}
+
+
+class Status:
+    __slots__ = ("spec", "stacks", "expires", "due")
+
+    def __init__(self, spec, stacks, expires):
+        self.spec = spec
+        self.stacks = stacks
+        self.expires = expires  # last turn the effect is active
+        self.due = None         # turn of this status's live heap entry
+
+
+class EffectEngine:
+    def __init__(self):
+        self.turn = 0
+        self.active = {}            # (target, effect name) -> Status
+        self.by_target = {}         # target -> {effect name: Status}
+        self.queue = []             # (turn, sequence, (target, effect name))
+        self.sequence = 0
+
+    def schedule(self, key, status, turn):
+        status.due = turn
+        self.sequence += 1
+        heapq.heappush(self.queue, (turn, self.sequence, key))
+
+    def apply(self, target, name, stacks=1, duration=None):
+        """Afflicts `target` with an effect, or adds stacks to it and restarts its duration."""
+        spec = EFFECTS[name]
+        duration = spec.duration if duration is None else duration
+        key = (target, name)
+        status = self.active.get(key)
+        if status is None:
+            status = Status(spec, min(stacks, spec.max_stacks), self.turn + duration)
+            self.active[key] = status
+            self.by_target.setdefault(target, {})[name] = status
+            self.schedule(key, status, self.turn + 1 if spec.damage else status.expires)
+        else:
+            status.stacks = min(status.stacks + stacks, spec.max_stacks)
+            status.expires = self.turn + duration
+            if not spec.damage:
+                self.schedule(key, status, status.expires)
+        return status
+
+    def roll(self, target, effects, rng=random):
+        """Rolls each effect's chance to land on a hit; returns the names that did."""
+        landed = []
+        for name in effects:
+            spec = EFFECTS.get(name)
+            if spec is not None and rng.random() < spec.chance:
+                self.apply(target, name)
+                landed.append(name)
+        return landed
+
+    def tick(self):
+        """
+        Advances one turn. Returns (fired, expired): lists of
+        (target, effect name, damage) for effects that dealt damage and
+        (target, effect name) for effects that wore off.
+        """
+        self.turn += 1
+        turn = self.turn
+        queue = self.queue
+        fired = []
+        expired = []
+        while queue and queue[0][0] <= turn:
+            due, _, key = heapq.heappop(queue)
+            status = self.active.get(key)
+            if status is None or status.due != due:
+                continue  # superseded by a refresh
+            if status.spec.damage:
+                fired.append((key[0], key[1], status.spec.damage * status.stacks))
+            if turn >= status.expires:
+                self.remove(key)
+                expired.append(key)
+            else:
+                self.schedule(key, status, turn + 1 if status.spec.damage else status.expires)
+        return fired, expired
+
+    def remove(self, key):
+        del self.active[key]
+        statuses = self.by_target[key[0]]
+        del statuses[key[1]]
+        if not statuses:
+            del self.by_target[key[0]]
+
+    def has(self, target, name):
+        return (target, name) in self.active
+
+    def damage_taken(self, target, damage):
+        """Scales a hit on `target` by its active effects."""
+        for status in self.by_target.get(target, {}).values():
+            if status.spec.damage_taken != 1.0:
+                damage = int(damage * status.spec.damage_taken)
+        return damage
+
+    def statuses(self, target):
+        """The target's effects as plain data, e.g. for the advisor."""
+        return [
+            {"name": name, "stacks": status.stacks, "turns": status.expires - self.turn}
+            for name, status in self.by_target.get(target, {}).items()
+        ]
+
+    def clear(self, target):
+        for name in list(self.by_target.get(target, ())):
+            self.remove((target, name))
@@ -0,0 +1,170 @@
+"""
+Enemy groups for multi-enemy encounters.
+
+An EnemyGroup stores its enemies as rows of parallel typed arrays (health,
+strength, damage cap, AI state, and stacks/expiry per status effect). A
+turn is resolved with one pass per column over the whole group (enemy
+attacks, effect ticks, AI updates) instead of a Python object per enemy,
+so a wave of hundreds costs little more than a single enemy.
+"""
+import random
+from array import array
+from itertools import compress, repeat
+from operator import le, mul, sub
+
+from effects import EFFECTS
+
+# AI states
+WAITING, ATTACKING, ENRAGED, DEAD = range(4)
+IN_FIGHT = frozenset((ATTACKING, ENRAGED))
+
+# Enraged enemies hit this much harder
+ENRAGE_DAMAGE = 1.5
+
+
+class EnemyGroup:
+    def __init__(self):
+        self.names = []
+        self.health = array("i")
+        self.max_health = array("i")
+        self.strength = array("i")
+        self.damage_cap = array("i")    # raised while enraged
+        self.state = array("b")
+        self.arrives = array("i")       # turn a WAITING enemy joins the fight
+        self.enrages = array("b")       # 1 if the enemy enrages below half health
+        self.stacks = {name: array("i") for name in EFFECTS}
+        self.expires = {name: array("i") for name in EFFECTS}
+        self.turn = 0
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name, strength, health, damage_cap, arrives=0, enrages=False):
+        """Adds an enemy and returns its row. Enemies arriving later start WAITING."""
+        self.names.append(name)
+        self.health.append(health)
+        self.max_health.append(health)
+        self.strength.append(strength)
+        self.damage_cap.append(damage_cap)
+        self.state.append(WAITING if arrives > self.turn else ATTACKING)
+        self.arrives.append(arrives)
+        self.enrages.append(enrages)
+        for name in EFFECTS:
+            self.stacks[name].append(0)
+            self.expires[name].append(0)
+        return len(self.names) - 1
+
+    def add_many(self, count, name, strength, health, damage_cap, arrives=0):
+        """Adds `count` identical enemies in one go."""
+        self.names.extend(f"{name} {i + 1}" for i in range(count))
+        self.health.extend(array("i", [health]) * count)
+        self.max_health.extend(array("i", [health]) * count)
+        self.strength.extend(array("i", [strength]) * count)
+        self.damage_cap.extend(array("i", [damage_cap]) * count)
+        self.state.extend(array("b", [WAITING if arrives > self.turn else ATTACKING]) * count)
+        self.arrives.extend(array("i", [arrives]) * count)
+        self.enrages.extend(bytes(count))
+        for effect in EFFECTS:
+            self.stacks[effect].extend(array("i", bytes(4 * count)))
+            self.expires[effect].extend(array("i", bytes(4 * count)))
+
+    # Queries
+    def fighting(self):
+        """Rows of enemies currently in the fight."""
+        return list(compress(range(len(self.state)), map(IN_FIGHT.__contains__, self.state)))
+
+    def remaining(self):
+        """Number of enemies not yet defeated, including those still to arrive."""
+        return len(self.state) - self.state.count(DEAD)
+
+    def defeated(self):
+        return self.state.count(DEAD) == len(self.state)
+
+    def damage_taken(self, row, damage):
+        for name, spec in EFFECTS.items():
+            if spec.damage_taken != 1.0 and self.stacks[name][row]:
+                damage = int(damage * spec.damage_taken)
+        return damage
+
+    # Changes
+    def hit(self, row, damage):
+        """Deals damage to one enemy; returns True if it died."""
+        self.health[row] -= damage
+        if self.health[row] <= 0 and self.state[row] != DEAD:
+            self.state[row] = DEAD
+            return True
+        return False
+
+    def apply_effect(self, row, name, stacks=1):
+        spec = EFFECTS[name]
+        self.stacks[name][row] = min(self.stacks[name][row] + stacks, spec.max_stacks)
+        self.expires[name][row] = self.turn + spec.duration
+
+    def roll_effects(self, row, effects, rng=random):
+        """Rolls each effect's chance to land on a hit on `row`; returns the names that did."""
+        landed = []
+        for name in effects:
+            spec = EFFECTS.get(name)
+            if spec is not None and rng.random() < spec.chance:
+                self.apply_effect(row, name)
+                landed.append(name)
+        return landed
+
+    # Turn passes
+    def attack(self, rng=random):
+        """Every fighting enemy rolls its attack. Returns (rows, damages)."""
+        rows = self.fighting()
+        draw = rng.random
+        damages = [int(draw() * cap) + 1 for cap in map(self.damage_cap.__getitem__, rows)]
+        return rows, damages
+
+    def tick(self):
+        """
+        Advances one turn: ticks damaging effects on every enemy, expires
+        effects and updates AI states. Returns (rows that died, rows that
+        joined the fight).
+        """
+        self.turn += 1
+        turn = self.turn
+        health = self.health
+        state = self.state
+        rows = range(len(state))
+        damaged = False
+        for name, spec in EFFECTS.items():
+            stacks = self.stacks[name]
+            if not any(stacks):
+                continue
+            if spec.damage:
+                health = array("i", map(sub, health, map(mul, stacks, repeat(spec.damage))))
+                damaged = True
+            # Clear effects whose last turn this was
+            expires = self.expires[name]
+            for i in compress(rows, stacks):
+                if expires[i] <= turn:
+                    stacks[i] = 0
+        self.health = health
+
+        # Only effect damage can kill here; hits mark their kills right away
+        died = []
+        if damaged:
+            died = [i for i in compress(rows, map(le, health, repeat(0))) if state[i] in IN_FIGHT]
+            for i in died:
+                state[i] = DEAD
+
+        # Arrivals and enrage
+        arrived = []
+        if WAITING in state:
+            arrived = [i for i in compress(rows, map(WAITING.__eq__, state)) if self.arrives[i] <= turn]
+            for i in arrived:
+                state[i] = ATTACKING
+        max_health = self.max_health
+        for i in compress(rows, self.enrages):
+            if state[i] == ATTACKING and health[i] * 2 <= max_health[i]:
+                state[i] = ENRAGED
+                self.damage_cap[i] = int(self.damage_cap[i] * ENRAGE_DAMAGE)
+        return died, arrived
+
+    def describe(self, row):
+        status = " (enraged)" if self.state[row] == ENRAGED else ""
+        effects = ", ".join(name for name in EFFECTS if self.stacks[name][row])
+        return f"{self.names[row]}: {max(0, self.health[row])}/{self.max_health[row]} health{status}" + (f" [{effects}]" if effects else "")
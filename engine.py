@@ -0,0 +1,364 @@
+"""
+The rules every game mode shares: output and the session journal, flows
+and play(), weapons and their specs, creating, saving and loading
+characters, levelling up and running away.
+
+Game modes (see modes/) are built on these. main.py re-exports all of
+them, so `from main import Weapon` and the like keep working.
+"""
+import json
+import random
+from collections import namedtuple
+from contextvars import ContextVar
+
+import metrics
+from inventory import Inventory, Stack
+from renderer import Renderer
+
+# Game output goes through say() to the current renderer, so a server can
+# capture it per session and headless runs can drop it
+output = ContextVar("output", default=Renderer())
+
+def say(*args, **kwargs):
+    output.get().say(*args, **kwargs)
+
+def speaking():
+    """False when output is discarded, so messages that cost something to build can be skipped."""
+    return output.get().enabled
+
+# State changes are reported to the session's journal (see journal.py), if any
+journal = ContextVar("journal", default=None)
+
+def record(event, *args):
+    log = journal.get()
+    if log is not None:
+        log.record(event, *args)
+
+# A battle advisor (see agent.py), if any, suggests answers in battles and the inventory
+advisor = ContextVar("advisor", default=None)
+
+def play(flow):
+    """
+    Runs a game flow on the console. Flows are generators that yield a
+    prompt and receive the player's answer, so they can also be resumed
+    one answer at a time by server.py. Each turn's output is written
+    together with the prompt that ends it.
+    """
+    renderer = output.get()
+    try:
+        prompt = next(flow)
+        while True:
+            renderer.flush(prompt)
+            prompt = flow.send(input())
+    except StopIteration as stop:
+        return stop.value
+    finally:
+        renderer.flush()
+
+# Weapon Specs
+class WeaponSpec(namedtuple("WeaponSpec", "id name damage_range durability critical_hit_chance special_effects")):
+    """
+    Immutable stats shared by every weapon of one kind. `durability` is the
+    durability a new weapon of this kind starts with.
+    """
+    __slots__ = ()
+
+    def roll_damage(self, rng=random):
+        """Rolls one hit and returns (damage, critical) without printing."""
+        base_damage = rng.randint(*self.damage_range)
+        if rng.random() < self.critical_hit_chance:
+            return base_damage * 2, True
+        return base_damage, False
+
+    def create(self):
+        """Returns a new weapon of this kind at full durability."""
+        return Weapon.from_spec(self)
+
+# id -> spec for every weapon kind saves can refer to by id alone
+weapon_specs = {}
+# (name, damage_range, critical_hit_chance, special_effects) -> spec, including unregistered ones
+interned_specs = {}
+
+def spec_key(name, damage_range, critical_hit_chance, special_effects):
+    return (name, tuple(damage_range), critical_hit_chance, tuple(special_effects or ()))
+
+def register_weapon_spec(spec_id, name, damage_range, durability, critical_hit_chance=0.1, special_effects=()):
+    spec = WeaponSpec(spec_id, name, tuple(damage_range), durability, critical_hit_chance, tuple(special_effects or ()))
+    return add_weapon_spec(spec)
+
+def add_weapon_spec(spec):
+    """Registers `spec` under its id and returns the registered spec (an equal one may already be)."""
+    registered = weapon_specs.get(spec.id)
+    if registered == spec:
+        return registered
+    weapon_specs[spec.id] = spec
+    interned_specs[spec_key(spec.name, spec.damage_range, spec.critical_hit_chance, spec.special_effects)] = spec
+    return spec
+
+def intern_weapon_spec(name, damage_range, durability, critical_hit_chance=0.1, special_effects=()):
+    """Returns the spec with these stats, creating an unregistered one if none exists yet."""
+    key = spec_key(name, damage_range, critical_hit_chance, special_effects)
+    spec = interned_specs.get(key)
+    if spec is None:
+        spec = WeaponSpec(f"custom-{len(interned_specs)}", *key[:2], durability, *key[2:])
+        interned_specs[key] = spec
+    return spec
+
+# Weapon Class
+class Weapon:
+    """One weapon in the game: a shared WeaponSpec plus its own durability."""
+    __slots__ = ("spec", "durability")
+
+    def __init__(self, name, damage_range, durability, critical_hit_chance=0.1, special_effects=None):
+        self.spec = intern_weapon_spec(name, damage_range, durability, critical_hit_chance, special_effects)
+        self.durability = durability
+
+    @classmethod
+    def from_spec(cls, spec, durability=None):
+        weapon = cls.__new__(cls)
+        weapon.spec = spec
+        weapon.durability = spec.durability if durability is None else durability
+        return weapon
+
+    @property
+    def name(self):
+        return self.spec.name
+
+    @property
+    def damage_range(self):
+        return self.spec.damage_range
+
+    @property
+    def critical_hit_chance(self):
+        return self.spec.critical_hit_chance
+
+    @property
+    def special_effects(self):
+        return self.spec.special_effects
+
+    def roll_damage(self, rng=random):
+        return self.spec.roll_damage(rng)
+
+    def calculate_damage(self, rng=random):
+        damage, critical = self.roll_damage(rng)
+        if critical and speaking():
+            say(f"Critical hit with {self.name}!")
+        return damage
+
+    def use_weapon(self):
+        """Decreases durability when the weapon is used."""
+        if self.durability > 0:
+            self.durability -= 1
+            if self.durability == 0:
+                metrics.count("weapon_breaks_total")
+                say(f"{self.name} broke!")
+            return True
+        else:
+            say(f"{self.name} is broken and cannot be used.")
+            return False
+
+    def to_json(self):
+        # Registered kinds are saved by id; anything else carries its full stats
+        if weapon_specs.get(self.spec.id) is self.spec:
+            return {"id": self.spec.id, "durability": self.durability}
+        return {
+            "name": self.name,
+            "damage_range": list(self.damage_range),
+            "durability": self.durability,
+            "critical_hit_chance": self.critical_hit_chance,
+            "special_effects": list(self.special_effects),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if "damage_range" not in data:
+            return cls.from_spec(weapon_specs[data["id"]], data["durability"])
+        return cls(
+            data["name"],
+            data["damage_range"],
+            data["durability"],
+            data.get("critical_hit_chance", 0.1),
+            data.get("special_effects", []),
+        )
+
+class WeaponEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, Weapon):
+            return obj.to_json()
+        return super().default(obj)
+
+# Character Functions
+def create_character():
+    return play(create_character_flow())
+
+def create_character_flow():
+    say("Welcome to the Text-based RPG!")
+    name = yield "Enter your character's name: "
+
+    character = {
+        "name": name,
+        "health": 100,
+        "strength": 10,
+        "intelligence": 10,
+        "dexterity": 10,
+        "level": 1,
+        "exp": 0,
+        "bonus_points": 0,
+        "current_weapon": None,
+        "inventory": Inventory(),
+        "effects": [],
+        "world": None,
+    }
+    return character
+
+# Save Data
+def item_to_json(item):
+    return item.to_json() if isinstance(item, (Weapon, Stack)) else item
+
+def item_from_json(data):
+    # Dictionaries with a weapon id or damage range are weapons, everything else is kept as-is
+    if isinstance(data, dict) and ('id' in data or 'damage_range' in data):
+        return Weapon.from_dict(data)
+    return data
+
+def equipped_position(character):
+    """The inventory position of the equipped weapon, or None if it is not in the inventory."""
+    weapon = character["current_weapon"]
+    if weapon is not None:
+        for position, item in enumerate(character["inventory"]):
+            if item is weapon:
+                return position
+    return None
+
+def character_to_json(character):
+    # The equipped weapon is also saved by position, so it loads as the inventory's own object
+    return {
+        **character,
+        "current_weapon": item_to_json(character["current_weapon"]) if character["current_weapon"] else None,
+        "equipped": equipped_position(character),
+        "inventory": [item_to_json(item) for item in character["inventory"]],
+    }
+
+def character_from_json(character_data):
+    # Handle the case where 'current_weapon' is not present (old character data)
+    character_data.setdefault('current_weapon', None)
+
+    # Handle the case where 'inventory' is not present (old character data)
+    character_data.setdefault('inventory', [])
+
+    # Handle the case where 'effects' is not present (saves from before status effects)
+    character_data.setdefault('effects', [])
+
+    # Handle the case where 'world' is not present (saves from before the world map)
+    character_data.setdefault('world', None)
+
+    # Old saves have one entry per pickup; Inventory folds them into stacks
+    character_data['inventory'] = Inventory(item_from_json(item) for item in character_data['inventory'])
+
+    # The equipped weapon is the one at its saved inventory position; saves from
+    # before 'equipped' only have a copy of it, converted to a Weapon object
+    position = character_data.pop('equipped', None)
+    if position is not None:
+        character_data['current_weapon'] = character_data['inventory'][position]
+    elif isinstance(character_data['current_weapon'], dict):
+        character_data['current_weapon'] = Weapon.from_dict(character_data['current_weapon'])
+
+    return character_data
+
+# Progression Rules
+LEVEL_UP_GAINS = {
+    "health": (5, 10),
+    "strength": (1, 3),
+    "intelligence": (1, 3),
+    "dexterity": (1, 3),
+}
+
+def escape_chance(dexterity):
+    """Percent chance that run_away() succeeds."""
+    return dexterity * 2
+
+def level_up(character, rng=random):
+    say(f"Congratulations, {character['name']}! You leveled up!")
+    character["level"] += 1
+    character["exp"] = 0
+    character["bonus_points"] += 1
+    for attribute, (low, high) in LEVEL_UP_GAINS.items():
+        character[attribute] += rng.randint(low, high)
+    record("stats", "level", "exp", "bonus_points", *LEVEL_UP_GAINS)
+    metrics.count("level_ups_total")
+
+def allocate_bonus_points(character):
+    play(allocate_bonus_points_flow(character))
+
+def allocate_bonus_points_flow(character):
+    while character["bonus_points"] > 0:
+        say(f"You have {character['bonus_points']} bonus points to allocate.")
+        say("1. Health")
+        say("2. Strength")
+        say("3. Intelligence")
+        say("4. Dexterity")
+
+        choice = yield "Choose an attribute to allocate a bonus point (1-4): "
+        if choice.isdigit() and 1 <= int(choice) <= 4:
+            attribute = ""
+            if choice == "1":
+                attribute = "health"
+            elif choice == "2":
+                attribute = "strength"
+            elif choice == "3":
+                attribute = "intelligence"
+            elif choice == "4":
+                attribute = "dexterity"
+
+            character[attribute] += 1
+            character["bonus_points"] -= 1
+            record("stats", attribute, "bonus_points")
+            say(f"You allocated a bonus point to {attribute}.")
+        else:
+            say("Invalid choice. Try again.")
+
+def run_away(character, rng=random):
+    success_rate = escape_chance(character["dexterity"])
+    metrics.count("flee_attempts_total")
+    if rng.randint(1, 100) <= success_rate:
+        metrics.count("flees_total")
+        return True
+    return False
+
+# Character Sheet
+@metrics.timed("character_info_seconds")
+def print_character_info(character):
+    output.get().frame("character", character_info_lines, character)
+
+def character_info_lines(character):
+    """The character sheet as (key, line) pairs; see renderer.Renderer.frame()."""
+    lines = [
+        (None, "\n----- Character Info -----"),
+        ("name", f"Name: {character['name']}"),
+        ("level", f"Level: {character['level']}"),
+        ("health", f"Health: {character['health']}"),
+        ("strength", f"Strength: {character['strength']}"),
+        ("intelligence", f"Intelligence: {character['intelligence']}"),
+        ("dexterity", f"Dexterity: {character['dexterity']}"),
+        ("exp", f"Experience: {character['exp']}"),
+        ("bonus_points", f"Bonus Points: {character['bonus_points']}"),
+    ]
+
+    weapon = character["current_weapon"]
+    if weapon:
+        lines.append(("weapon", f"Current Weapon: {weapon.name} ({weapon.damage_range[0]} - {weapon.damage_range[1]} damage)"))
+    else:
+        lines.append(("weapon", "Current Weapon: None"))
+
+    lines.append((None, "Inventory:"))
+    if not character["inventory"]:
+        lines.append(("empty", "Your inventory is empty."))
+    else:
+        for index, (slot, item) in enumerate(character["inventory"].items(), 1):
+            if isinstance(item, Weapon):
+                lines.append((slot, f"{index}. {item.name} ({item.damage_range[0]} - {item.damage_range[1]} damage)"))
+            else:
+                lines.append((slot, f"{index}. {item}"))
+
+    lines.append((None, "-------------------------"))
+    return lines
@@ -0,0 +1,215 @@
+"""
+Indexed, stackable inventory.
+
+Consumables, currency and other simple items stack by type into a single
+slot with a count. Weapons (and any other object) each keep their own slot.
+A type -> slot index makes has/count/consume constant time, and slots are
+kept in the order they were first added, which is the order the inventory
+is listed and numbered in.
+
+Every slot that is added, restacked or emptied gets a new version number,
+so changed_since() lists what changed after a given version without
+looking at the rest. Weapons wear down in place, so a weapon's durability
+is not tracked here.
+"""
+from itertools import islice
+
+# Stack types whose count is shown as an amount rather than a number of items
+CURRENCIES = {"Gold"}
+
+
+class Stack:
+    __slots__ = ("type", "count")
+
+    def __init__(self, type, count=1):
+        self.type = type
+        self.count = count
+
+    def __str__(self):
+        if self.type in CURRENCIES:
+            return f"{self.count} {self.type}"
+        return f"{self.type} x{self.count}"
+
+    def __repr__(self):
+        return f"Stack({self.type!r}, {self.count!r})"
+
+    def to_json(self):
+        return {"type": self.type, "count": self.count}
+
+
+def stack_type(item):
+    """Returns the type `item` stacks under, or None if it needs a slot of its own."""
+    if isinstance(item, Stack):
+        return item.type
+    if isinstance(item, str):
+        return item
+    if isinstance(item, dict) and "damage_range" not in item:
+        # {"type": ...} from main.py saves, {"name": ...} from school_project.py saves
+        return item.get("type", item.get("name"))
+    return None
+
+
+def stack_count(item):
+    if isinstance(item, Stack):
+        return item.count
+    if isinstance(item, dict):
+        # Gold used to be saved as one {"type": "Gold", "amount": n} entry per pickup
+        return item.get("count", item.get("amount", 1))
+    return 1
+
+
+class Inventory:
+    def __init__(self, items=()):
+        self.slots = {}     # slot id -> Stack or item, in insertion order
+        self.index = {}     # stack type -> slot id
+        self.next_slot = 0
+        self.changes = {}   # slot id -> version it last changed at, oldest first
+        self.version = 0
+        for item in items:
+            self.add(item)
+
+    @classmethod
+    def restore(cls, slots):
+        """Rebuilds an inventory from (slot id, item) pairs, keeping the slot ids."""
+        inventory = cls()
+        for slot, item in slots:
+            inventory.add(item, slot=slot)
+        return inventory
+
+    def add(self, item, count=None, slot=None):
+        """Adds an item (or `count` of a stackable one) and returns its slot id."""
+        if item is None:
+            return None
+        kind = stack_type(item)
+        if kind is None:
+            return self.new_slot(item, slot)
+        if count is None:
+            count = stack_count(item)
+
+        slot_id = self.index.get(kind)
+        if slot_id is None:
+            slot_id = self.new_slot(Stack(kind, count), slot)
+            self.index[kind] = slot_id
+        else:
+            self.slots[slot_id].count += count
+            self.touch(slot_id)
+        return slot_id
+
+    def new_slot(self, item, slot=None):
+        if slot is None:
+            slot = self.next_slot
+        self.next_slot = max(self.next_slot, slot + 1)
+        self.slots[slot] = item
+        self.touch(slot)
+        return slot
+
+    def touch(self, slot_id):
+        self.version += 1
+        self.changes.pop(slot_id, None)
+        self.changes[slot_id] = self.version
+
+    def changed_since(self, version):
+        """Slot ids added, changed or removed after `version`, most recent first."""
+        changes = self.changes
+        for slot_id in reversed(changes):
+            if changes[slot_id] <= version:
+                return
+            yield slot_id
+
+    def count(self, kind):
+        slot_id = self.index.get(kind)
+        return 0 if slot_id is None else self.slots[slot_id].count
+
+    def has(self, kind):
+        return kind in self.index
+
+    def consume(self, kind, count=1):
+        """Removes `count` of a stacked type. Returns False (and removes nothing) if there are not enough."""
+        slot_id = self.index.get(kind)
+        if slot_id is None:
+            return False
+        stack = self.slots[slot_id]
+        if stack.count < count:
+            return False
+        stack.count -= count
+        if stack.count == 0:
+            del self.slots[slot_id]
+            del self.index[kind]
+        self.touch(slot_id)
+        return True
+
+    def remove(self, item):
+        """Removes one non-stacking item such as a weapon."""
+        for slot_id, entry in self.slots.items():
+            if entry is item:
+                del self.slots[slot_id]
+                self.touch(slot_id)
+                return
+        raise ValueError(f"{item!r} is not in the inventory")
+
+    def items(self):
+        """(slot id, entry) pairs in inventory order."""
+        return self.slots.items()
+
+    def __iter__(self):
+        return iter(self.slots.values())
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __bool__(self):
+        return bool(self.slots)
+
+    def __getitem__(self, position):
+        """The entry at a 0-based position in the listed order."""
+        if position < 0:
+            position += len(self.slots)
+        try:
+            return next(islice(self.slots.values(), position, None))
+        except (StopIteration, ValueError):
+            raise IndexError("inventory position out of range") from None
+
+    def __repr__(self):
+        return f"Inventory({list(self.slots.values())!r})"
+
+
+class LazyInventory(Inventory):
+    """
+    An Inventory that is only built the first time it is used. Until then
+    len() comes from `length`, and `source` (whatever `decode` turns into
+    items, e.g. the inventory section of a save) is kept so it can be
+    written out again without decoding it.
+    """
+
+    def __init__(self, source, length, decode):
+        self.source = source
+        self.length = length
+        self.decode = decode
+
+    def __getattr__(self, name):
+        # Only called for attributes that do not exist yet, i.e. before loading
+        if name in ("slots", "index", "next_slot", "changes", "version"):
+            self.load()
+            return getattr(self, name)
+        raise AttributeError(name)
+
+    @property
+    def loaded(self):
+        return "decode" not in self.__dict__
+
+    def load(self):
+        decode = self.__dict__.pop("decode", None)
+        if decode is not None:
+            Inventory.__init__(self, decode(self.source))
+            self.source = None
+
+    def __len__(self):
+        return len(self.slots) if self.loaded else self.length
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __repr__(self):
+        if not self.loaded:
+            return f"LazyInventory(<{self.length} entries>)"
+        return super().__repr__()
@@ -0,0 +1,188 @@
+"""
+Event-sourced crash recovery.
+
+While a game runs, every state change main.py reports through record()
+(damage taken, exp gained, level ups, loot added, potions used, weapons
+equipped or worn down, travel) is appended to a binary log as a
+small record, a few bytes instead of a full save. The log starts with a snapshot of the
+character (a savefile binary save, so an inventory that was never touched
+is copied rather than decoded); once enough events pile up it is compacted
+into a fresh snapshot, so it stays small.
+
+If the process dies, the next start rebuilds the character from the
+snapshot and the events after it. A clean exit removes the log, since the
+binary save then holds everything.
+
+Record layout: body length (uint32), CRC-32 of kind + body (uint32),
+kind (uint8), body. A torn or corrupt record ends the log.
+"""
+import json
+import os
+import struct
+import zlib
+
+import main
+import metrics
+import savefile
+from autosave import FSYNC_POLICIES, write_atomic
+
+JOURNAL_FILE = "character_data.log"
+# Events between snapshots before the log is compacted
+COMPACT_EVERY = 1000
+
+STATS = ("health", "strength", "intelligence", "dexterity", "level", "exp", "bonus_points")
+STAT_INDEX = {stat: i for i, stat in enumerate(STATS)}
+
+RECORD = struct.Struct("<IIB")
+STAT = struct.Struct("<Bi")
+INT = struct.Struct("<i")
+
+SNAPSHOT = 1
+STATS_CHANGED = 2
+ADDED = 3
+CONSUMED = 4
+EQUIPPED = 5
+DURABILITY = 6
+EFFECTS = 7
+WORLD = 8
+
+
+def encode(kind, body):
+    return RECORD.pack(len(body), zlib.crc32(body, kind), kind) + body
+
+
+def read_records(data):
+    """Yields (kind, body) for every intact record; stops at the first damaged one."""
+    offset = 0
+    while offset + RECORD.size <= len(data):
+        length, crc, kind = RECORD.unpack_from(data, offset)
+        start = offset + RECORD.size
+        body = data[start:start + length]
+        if len(body) < length or zlib.crc32(body, kind) != crc:
+            return
+        yield kind, body
+        offset = start + length
+
+
+def apply_event(character, kind, body):
+    if kind == STATS_CHANGED:
+        for i, value in STAT.iter_unpack(body):
+            character[STATS[i]] = value
+    elif kind == ADDED:
+        (count,) = INT.unpack_from(body)
+        item = main.item_from_json(json.loads(body[INT.size:]))
+        character["inventory"].add(item, count or None)
+    elif kind == CONSUMED:
+        (count,) = INT.unpack_from(body)
+        character["inventory"].consume(body[INT.size:].decode(), count)
+    elif kind == EQUIPPED:
+        (position,) = INT.unpack(body)
+        character["current_weapon"] = None if position < 0 else character["inventory"][position]
+    elif kind == DURABILITY:
+        (character["current_weapon"].durability,) = INT.unpack(body)
+    elif kind == EFFECTS:
+        # Only written by logs from when effects on the player outlived battles
+        character["effects"] = json.loads(body)
+    elif kind == WORLD:
+        character["world"] = json.loads(body)
+
+
+def replay_log(data):
+    """Rebuilds the character from a log's latest snapshot and the events after it."""
+    character = None
+    for kind, body in read_records(data):
+        if kind == SNAPSHOT:
+            character = savefile.loads(body)
+        elif character is not None:
+            apply_event(character, kind, body)
+    return character
+
+
+class Journal:
+    def __init__(self, path=JOURNAL_FILE, fsync="file", compact_every=COMPACT_EVERY):
+        """
+        fsync is "none" (records reach the OS, which survives a crash of
+        the game but not of the machine), "file" (fsync on every commit())
+        or "full" (also fsync the directory after compaction).
+        """
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}, not {fsync!r}")
+        self.path = path
+        self.fsync = fsync
+        self.compact_every = compact_every
+        self.character = None
+        self.fd = None
+        self.events = 0     # events since the last snapshot
+        self.dirty = False  # written since the last fsync
+
+    def recover(self):
+        """Returns the character an interrupted session left in the log, or None."""
+        try:
+            with open(self.path, "rb") as file:
+                return replay_log(file.read())
+        except FileNotFoundError:
+            return None
+
+    def begin(self, character):
+        """Starts logging changes to `character`, from a fresh snapshot."""
+        self.character = character
+        self.compact()
+
+    def compact(self):
+        """Replaces the log with a single snapshot of the current character."""
+        write_atomic(self.path, encode(SNAPSHOT, savefile.dumps(self.character)), self.fsync)
+        if self.fd is not None:
+            os.close(self.fd)
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+        self.events = 0
+        self.dirty = False
+
+    def append(self, kind, body):
+        os.write(self.fd, encode(kind, body))
+        self.events += 1
+        self.dirty = True
+
+    def record(self, event, *args):
+        """Logs one state change reported by main.record()."""
+        if self.fd is None:
+            return
+        character = self.character
+        if event == "stats":
+            self.append(STATS_CHANGED, b"".join(STAT.pack(STAT_INDEX[stat], character[stat]) for stat in args))
+        elif event == "added":
+            item, count = args
+            self.append(ADDED, INT.pack(count or 0) + json.dumps(main.item_to_json(item)).encode())
+        elif event == "consumed":
+            kind, count = args
+            self.append(CONSUMED, INT.pack(count) + kind.encode())
+        elif event == "equipped":
+            (position,) = args
+            self.append(EQUIPPED, INT.pack(-1 if position is None else position))
+        elif event == "durability":
+            self.append(DURABILITY, INT.pack(character["current_weapon"].durability))
+        elif event == "world":
+            self.append(WORLD, json.dumps(character["world"], separators=(",", ":")).encode())
+        else:
+            raise ValueError(f"unknown journal event {event!r}")
+
+    def commit(self):
+        """Makes the logged events durable per the fsync policy; compacts a long log."""
+        if self.fd is None:
+            return
+        if self.events >= self.compact_every:
+            with metrics.timer("journal_compact_seconds"):
+                self.compact()
+        elif self.dirty and self.fsync != "none":
+            with metrics.timer("journal_fsync_seconds"):
+                os.fsync(self.fd)
+            self.dirty = False
+
+    def close(self, remove=False):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        if remove:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
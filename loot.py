@@ -0,0 +1,89 @@
+"""
+Precompiled loot tables.
+
+A LootTable flattens the "no loot" chance, the rarity weights and the item
+lists of every rarity into one alias table (Vose's alias method), so each
+drop costs a single rng.random() call and two list lookups no matter how
+many items the table holds.
+"""
+import random
+
+
+class AliasSampler:
+    """Draws index i with probability weights[i] / sum(weights) in constant time."""
+
+    def __init__(self, weights):
+        size = len(weights)
+        if not size:
+            raise ValueError("AliasSampler needs at least one weight")
+        total = float(sum(weights))
+        if total <= 0 or any(weight < 0 for weight in weights):
+            raise ValueError("weights must be non-negative and not all zero")
+
+        scaled = [weight * size / total for weight in weights]
+        probabilities = [1.0] * size
+        aliases = list(range(size))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            low, high = small.pop(), large.pop()
+            probabilities[low] = scaled[low]
+            aliases[low] = high
+            scaled[high] -= 1.0 - scaled[low]
+            (small if scaled[high] < 1.0 else large).append(high)
+        # Whatever is left over is 1.0 up to rounding error
+
+        self.size = size
+        # u = rng.random() * size lands in column i = int(u); keep i while u < i + probability
+        self.cutoffs = [i + p for i, p in enumerate(probabilities)]
+        self.aliases = aliases
+        # random() * size can round up to exactly size; send that to the last column
+        self.cutoffs.append(-1.0)
+        self.aliases.append(size - 1)
+
+    def sample(self, rng=random):
+        u = rng.random() * self.size
+        i = int(u)
+        return i if u < self.cutoffs[i] else self.aliases[i]
+
+    def sample_many(self, count, rng=random):
+        size = self.size
+        cutoffs = self.cutoffs
+        aliases = self.aliases
+        draw = rng.random
+        samples = []
+        append = samples.append
+        for _ in range(count):
+            u = draw() * size
+            i = int(u)
+            append(i if u < cutoffs[i] else aliases[i])
+        return samples
+
+
+class LootTable:
+    """
+    A compiled loot table. Each roll first has `no_loot_chance` of finding
+    nothing, otherwise picks a rarity by weight and then an item of that
+    rarity uniformly, exactly like the original nested rolls.
+    """
+
+    def __init__(self, items_by_rarity, rarity_weights, no_loot_chance):
+        total_weight = sum(rarity_weights[rarity] for rarity in items_by_rarity)
+        self.outcomes = [(None, None)]
+        weights = [no_loot_chance]
+        for rarity, items in items_by_rarity.items():
+            rarity_chance = (1 - no_loot_chance) * rarity_weights[rarity] / total_weight
+            for item in items:
+                self.outcomes.append((rarity, item))
+                weights.append(rarity_chance / len(items))
+        self.items = [item for _, item in self.outcomes]
+        self.sampler = AliasSampler(weights)
+
+    def roll(self, rng=random):
+        """Returns (rarity, item), or (None, None) when nothing is found."""
+        return self.outcomes[self.sampler.sample(rng)]
+
+    def roll_many(self, count, rng=random):
+        """Returns `count` items (None for no loot) without any other work."""
+        items = self.items
+        return [items[i] for i in self.sampler.sample_many(count, rng)]
@@ -1,354 +1,536 @@
 import json
+import os
 import random
-
-# Weapon Class
-class Weapon:
-    def __init__(self, name, damage_range, durability, critical_hit_chance=0.1, special_effects=None):
-        self.name = name
-        self.damage_range = damage_range
-        self.durability = durability
-        self.critical_hit_chance = critical_hit_chance
-        self.special_effects = special_effects or []
-
-    def calculate_damage(self):
-        base_damage = random.randint(*self.damage_range)
-        if random.random() < self.critical_hit_chance:
-            print(f"Critical hit with {self.name}!")
-            return base_damage * 2
-        return base_damage
-
-    def use_weapon(self):
-        self.durability -= 1
-        if self.durability <= 0:
-            print(f"Your {self.name} broke!")
-            return False
-        return True
-
-    def to_json(self):
-        return {
-            "name": self.name,
-            "damage_range": self.damage_range,
-            "durability": self.durability,
-            "critical_hit_chance": self.critical_hit_chance,
-            "special_effects": self.special_effects,
-        }
-
-    @classmethod
-    def from_dict(cls, data):
-        return cls(
-            data["name"],
-            data["damage_range"],
-            data["durability"],
-            data.get("critical_hit_chance", 0.1),
-            data.get("special_effects", []),
-        )
-
-    def calculate_damage(self):
-        damage = random.randint(*self.damage_range)
-        if random.random() < self.critical_chance:
-            damage *= 2 # Double damage for critical hit
-            print(f"Critical hit with {self.name}! Damage is doubled.")
-        return damage
-
-    def use_weapon(self):
-        """Decreases durability when the weapon is used."""
-        if self.durability > 0:
-            self.durability -= 1
-            if self.durability == 0:
-                print(f"{self.name} broke!")
-            return True
-        else:
-            print(f"{self.name} is broken and cannot be used.")
-            return False
-
-# Weapon Table       
+import time
+
+import metrics
+from autosave import AutoSaver, write_atomic
+from effects import EffectEngine
+from enemies import EnemyGroup
+from engine import (
+    LEVEL_UP_GAINS,
+    Weapon,
+    WeaponEncoder,
+    WeaponSpec,
+    add_weapon_spec,
+    advisor,
+    allocate_bonus_points,
+    allocate_bonus_points_flow,
+    character_from_json,
+    character_info_lines,
+    character_to_json,
+    create_character,
+    create_character_flow,
+    equipped_position,
+    escape_chance,
+    intern_weapon_spec,
+    interned_specs,
+    item_from_json,
+    item_to_json,
+    journal,
+    level_up,
+    output,
+    play,
+    print_character_info,
+    record,
+    register_weapon_spec,
+    run_away,
+    say,
+    spec_key,
+    speaking,
+    weapon_specs,
+)
+from inventory import Inventory, Stack  # re-exported like the engine names, for main.Inventory
+from loot import LootTable
+from world import WORLD_SEED_BITS, ChunkStore, World, step
+
+# Weapon Table
 unique_weapons = [
-    Weapon("Iron Sword", [8, 12], durability=15, critical_hit_chance=0.15),
-    Weapon("Battle Axe", [10, 20], durability=10, critical_hit_chance=0.1, special_effects=["Armor Pierce"]),
-    Weapon("Enchanted Bow", [6, 14], durability=20, critical_hit_chance=0.25, special_effects=["Poison"]),
-    Weapon("Legendary Blade", [15, 25], durability=25, critical_hit_chance=0.3, special_effects=["Burn"]),
-    Weapon("Dagger of Shadows", [4, 10], durability=30, critical_hit_chance=0.4, special_effects=["Bleed"]),
+    register_weapon_spec("iron_sword", "Iron Sword", [8, 12], durability=15, critical_hit_chance=0.15),
+    register_weapon_spec("battle_axe", "Battle Axe", [10, 20], durability=10, critical_hit_chance=0.1, special_effects=["Armor Pierce"]),
+    register_weapon_spec("enchanted_bow", "Enchanted Bow", [6, 14], durability=20, critical_hit_chance=0.25, special_effects=["Poison"]),
+    register_weapon_spec("legendary_blade", "Legendary Blade", [15, 25], durability=25, critical_hit_chance=0.3, special_effects=["Burn"]),
+    register_weapon_spec("dagger_of_shadows", "Dagger of Shadows", [4, 10], durability=30, critical_hit_chance=0.4, special_effects=["Bleed"]),
 ]
 
-class WeaponEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, Weapon):
-            return obj.to_json()
-        return super().default(obj)
-
-# Character Functions
-def create_character():
-    print("Welcome to the Text-based RPG!")
-    name = input("Enter your character's name: ")
-
-    character = {
-        "name": name,
-        "health": 100,
-        "strength": 10,
-        "intelligence": 10,
-        "dexterity": 10,
-        "level": 1,
-        "exp": 0,
-        "bonus_points": 0,
-        "current_weapon": None,
-        "inventory": [],
-    }
-    return character
-
-
-def save_character(character):
-    with open("character_data.json", "w") as file:
-        character_data = {
-            **character,
-            "current_weapon": character["current_weapon"].to_json() if character["current_weapon"] else None,
-            "inventory": [
-                item.to_json() if isinstance(item, Weapon) else item
-                for item in character["inventory"]
-            ],
-        }
-        json.dump(character_data, file, indent=4)
-
-
-def load_character():
-    try:
-        with open("character_data.txt", "r") as file:
-            character_data = json.load(file)
-        
-        # Handle the case where 'current_weapon' is not present (old character data)
-        character_data.setdefault('current_weapon', None)
-
-        # Handle the case where 'inventory' is not present (old character data)
-        character_data.setdefault('inventory', [])
-
-        # If 'inventory' contains dictionaries, assume they are Weapon objects and convert them
-        character_data['inventory'] = [
-            Weapon.from_dict(item) if isinstance(item, dict) and 'damage_range' in item else item
-            for item in character_data['inventory']
-        ]
-
-        # Convert 'current_weapon' dictionary to Weapon object
-        if 'current_weapon' in character_data and isinstance(character_data['current_weapon'], dict):
-            character_data['current_weapon'] = Weapon.from_dict(character_data['current_weapon'])
-
-        return character_data
-    except FileNotFoundError:
-        return None
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON: {e}")
-        return None
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
-        return None
-
-def level_up(character):
-    print(f"Congratulations, {character['name']}! You leveled up!")
-    character["level"] += 1
-    character["exp"] = 0
-    character["bonus_points"] += 1
-    character["health"] += random.randint(5, 10)
-    character["strength"] += random.randint(1, 3)
-    character["intelligence"] += random.randint(1, 3)
-    character["dexterity"] += random.randint(1, 3)
-
-def allocate_bonus_points(character):
-    while character["bonus_points"] > 0:
-        print(f"You have {character['bonus_points']} bonus points to allocate.")
-        print("1. Health")
-        print("2. Strength")
-        print("3. Intelligence")
-        print("4. Dexterity")
-
-        choice = input("Choose an attribute to allocate a bonus point (1-4): ")
-        if choice.isdigit() and 1 <= int(choice) <= 4:
-            attribute = ""
-            if choice == "1":
-                attribute = "health"
-            elif choice == "2":
-                attribute = "strength"
-            elif choice == "3":
-                attribute = "intelligence"
-            elif choice == "4":
-                attribute = "dexterity"
-
-            character[attribute] += 1
-            character["bonus_points"] -= 1
-            print(f"You allocated a bonus point to {attribute}.")
-        else:
-            print("Invalid choice. Try again.")
-
-def run_away(character):
-    success_rate = character["dexterity"] * 2
-    return random.randint(1, 100) <= success_rate
-
-def battle(character, enemy_strength):
+# Save Data
+SAVE_FILE = "character_data.sav"
+# Saves from before the binary format, tried in order when there is no SAVE_FILE
+LEGACY_SAVE_FILES = ("character_data.json", "character_data.txt")
+WORLD_FILE = "world_data.db"
+# Set to a file path to turn on instrumentation and write metrics there
+METRICS_ENV = "ADVENTURE_METRICS"
+METRICS_INTERVAL = 10   # seconds between metrics file updates
+# Set to anything to have the advisor suggest battle actions and weapons
+ADVISOR_ENV = "ADVENTURE_ADVISOR"
+
+@metrics.timed("save_character_seconds")
+def save_character(character, path=None):
+    from savefile import dumps
+    write_atomic(path or SAVE_FILE, dumps(character))
+
+
+@metrics.timed("load_character_seconds")
+def load_character(path=None):
+    # Old JSON saves are migrated; the next save writes SAVE_FILE and leaves them alone
+    from savefile import load
+    for path in (path,) if path else (SAVE_FILE,) + LEGACY_SAVE_FILES:
+        try:
+            return load(path)
+        except FileNotFoundError:
+            continue
+        except json.JSONDecodeError as e:
+            say(f"Error decoding JSON: {e}")
+            return None
+        except Exception as e:
+            say(f"An unexpected error occurred: {e}")
+            return None
+    return None
+
+# Battle Rules
+EXPLORE_STRENGTH = (5, 15)
+BOSS_STRENGTH = 20
+MINIBOSS_STRENGTH = (15, 25)
+ENEMY_BASE_HEALTH = 50
+MAX_HEALTH = 100
+UNARMED_DAMAGE = (5, 10)
+POTION_HEAL = (15, 30)
+# Share of encounters that are a group of enemies or a boss with adds
+GROUP_CHANCE = 0.15
+GROUP_SIZE = (2, 4)
+BOSS_CHANCE = 0.03
+BOSS_ADDS = 3           # one joins every BOSS_ADD_EVERY turns
+BOSS_ADD_EVERY = 2
+# Enemies listed per turn in a group fight
+ENEMIES_SHOWN = 5
+
+def enemy_max_health(enemy_strength):
+    return ENEMY_BASE_HEALTH + enemy_strength
+
+def enemy_damage_cap(enemy_strength):
+    return max(5, enemy_strength // 2)
+
+def roll_enemy_damage(enemy_strength, rng=random):
+    return rng.randint(1, enemy_damage_cap(enemy_strength))
+
+def roll_unarmed_damage(rng=random):
+    return rng.randint(*UNARMED_DAMAGE)
+
+def roll_potion_heal(rng=random):
+    return rng.randint(*POTION_HEAL)
+
+def battle(character, enemy_strength, rng=random):
+    play(battle_flow(character, enemy_strength, rng))
+
+def battle_flow(character, enemy_strength, rng=random):
     """
-    Handles a turn-based battle between the player and an enemy.
+    Handles a turn-based battle between the player and an enemy. Returns
+    True if the enemy was defeated.
     """
-    enemy_health = 50 + enemy_strength
-    print(f"\nAn enemy with strength {enemy_strength} has appeared!")
-    print(f"The enemy has {enemy_health} health points.")
+    enemy_health = enemy_max_health(enemy_strength)
+    if speaking():
+        say(f"\nAn enemy with strength {enemy_strength} has appeared!")
+        say(f"The enemy has {enemy_health} health points.")
 
-    while enemy_health > 0 and character["health"] > 0:
-        print("\n----- Your Turn -----")
-        print("Choose your action:")
-        print("1. Attack")
-        print("2. Use Tool")
-        print("3. Run")
+    effects = EffectEngine()    # the weapon's effects on the enemy
+    metrics.count("battles_total")
 
-        choice = input("Enter your choice (1-3): ")
+    turn = None     # when the current turn started, while instrumented
+    while enemy_health > 0 and character["health"] > 0:
+        if speaking():
+            say("\n----- Your Turn -----")
+            say("Choose your action:")
+            say("1. Attack")
+            say("2. Use Tool")
+            say("3. Run")
+        pilot = advisor.get()
+        if pilot is not None:
+            say(f"Advisor: {pilot.advise_battle(character, enemy_health, enemy_strength, effects.statuses('enemy'))}")
+
+        metrics.observe_since("battle_turn_seconds", turn)
+        choice = yield "Enter your choice (1-3): "
+        turn = metrics.start()
         if choice == "1":
             # Player attacks
-            weapon = character["current_weapon"]
+            damage, weapon = player_attack_damage(character, lambda damage: effects.damage_taken("enemy", damage), rng)
             if weapon:
-                if weapon.use_weapon():
-                    damage = weapon.calculate_damage()
-                    print(f"You attack with {weapon.name}, dealing {damage} damage!")
-                else:
-                    damage = 0  # No damage if weapon breaks
-            else:
-                damage = random.randint(5, 10)  # Default damage
-                print(f"You punch the enemy, dealing {damage} damage!")
+                for name in effects.roll("enemy", weapon.special_effects, rng):
+                    say(f"The enemy is afflicted with {name}!")
 
             enemy_health -= damage
-            print(f"The enemy now has {max(0, enemy_health)} health.")
+            if speaking():
+                say(f"The enemy now has {max(0, enemy_health)} health.")
 
             # If enemy is defeated
             if enemy_health <= 0:
-                print("You defeated the enemy!")
-                character['exp'] += random.randint(10, 20)
-
-                if character['exp'] >= 50:
-                    level_up(character)
-                    allocate_bonus_points(character)
-
-                loot = generate_loot()
-                add_to_inventory(character, loot)
-
-                # Generate loot
-                loot = generate_loot()
-                add_to_inventory(character, loot)
+                say("You defeated the enemy!")
                 break
 
         elif choice == "2":
             # Use a tool
-            if any(item == "Health Potion" for item in character["inventory"]):
-                character["inventory"].remove("Health Potion")
-                heal_amount = random.randint(15, 30)
-                character["health"] = min(character["health"] + heal_amount, 100)
-                print(f"You used a Health Potion and restored {heal_amount} health.")
-                print(f"Your health is now {character['health']}.")
-            else:
-                print("You don't have any tools to use!")
+            use_tool(character, rng)
         elif choice == "3":
             # Run option
-            if run_away(character):
-                print("You successfully escaped!")
-                return
+            if run_away(character, rng):
+                say("You successfully escaped!")
+                metrics.observe_since("battle_turn_seconds", turn)
+                return False
             else:
-                print("You failed to escape! The enemy blocks your way.")
+                say("You failed to escape! The enemy blocks your way.")
         else:
-            print("Invalid choice! You lose your turn.")
+            say("Invalid choice! You lose your turn.")
 
         # Enemy's attack
         if enemy_health > 0:
-            print("\nEnemy's turn!")
-            enemy_damage = random.randint(1, max(5, enemy_strength // 2))
+            say("\nEnemy's turn!")
+            enemy_damage = roll_enemy_damage(enemy_strength, rng)
             character['health'] -= enemy_damage
-            print(f"The enemy deals {enemy_damage} damage to you. Your health is now {max(0, character['health'])}.")
+            record("stats", "health")
+            if speaking():
+                say(f"The enemy deals {enemy_damage} damage to you. Your health is now {max(0, character['health'])}.")
 
             # Check if the player is defeated
             if character['health'] <= 0:
-                print("You were defeated. Game Over.")
+                say("You were defeated. Game Over.")
                 break
 
-    print("\nThe battle has ended.")
+        # Status effects
+        enemy_health = apply_effects_turn(effects, enemy_health)
+        if enemy_health <= 0:
+            say("The enemy succumbed to its wounds!")
+            break
+
+    metrics.observe_since("battle_turn_seconds", turn)
+    won = enemy_health <= 0 and character["health"] > 0
+    if won:
+        metrics.count("battles_won_total")
+        yield from battle_won_flow(character, rng)
+    say("\nThe battle has ended.")
+    return won
+
+def use_tool(character, rng=random):
+    if character["inventory"].consume("Health Potion"):
+        record("consumed", "Health Potion", 1)
+        heal_amount = roll_potion_heal(rng)
+        character["health"] = min(character["health"] + heal_amount, MAX_HEALTH)
+        record("stats", "health")
+        if speaking():
+            say(f"You used a Health Potion and restored {heal_amount} health.")
+            say(f"Your health is now {character['health']}.")
+    else:
+        say("You don't have any tools to use!")
+
+def player_attack_damage(character, damage_taken, rng=random):
+    """Rolls the player's attack; returns (damage, weapon used or None)."""
+    weapon = character["current_weapon"]
+    if weapon:
+        if weapon.use_weapon():
+            record("durability")
+            damage = damage_taken(weapon.calculate_damage(rng))
+            if speaking():
+                say(f"You attack with {weapon.name}, dealing {damage} damage!")
+            return damage, weapon
+        return 0, None  # No damage if weapon breaks
+    damage = damage_taken(roll_unarmed_damage(rng))  # Default damage
+    if speaking():
+        say(f"You punch the enemy, dealing {damage} damage!")
+    return damage, None
+
+def apply_effects_turn(effects, enemy_health):
+    """Ticks the status effects on the enemy. Returns its health."""
+    fired, expired = effects.tick()
+    loud = speaking()
+    for _, name, damage in fired:
+        enemy_health -= damage
+        if loud:
+            say(f"{name} deals {damage} damage to the enemy. It now has {max(0, enemy_health)} health.")
+    if loud:
+        for _, name in expired:
+            say(f"{name} wore off the enemy.")
+    return enemy_health
+
+def battle_won_flow(character, rng=random):
+    character['exp'] += rng.randint(10, 20)
+    record("stats", "exp")
+
+    if character['exp'] >= 50:
+        level_up(character, rng)
+        yield from allocate_bonus_points_flow(character)
+
+    loot = generate_loot(rng)
+    add_to_inventory(character, loot, rng)
+
+    # Generate loot
+    loot = generate_loot(rng)
+    add_to_inventory(character, loot, rng)
+
+def enemy_group(strengths):
+    """An EnemyGroup with one enemy per strength."""
+    enemies = EnemyGroup()
+    for i, strength in enumerate(strengths, 1):
+        enemies.add(f"Enemy {i} (strength {strength})", strength, enemy_max_health(strength),
+                    enemy_damage_cap(strength))
+    return enemies
+
+def boss_group(boss_strength, add_strengths, add_every=BOSS_ADD_EVERY):
+    """A boss that enrages at half health, with adds joining every `add_every` turns."""
+    enemies = EnemyGroup()
+    enemies.add(f"Boss (strength {boss_strength})", boss_strength, enemy_max_health(boss_strength),
+                enemy_damage_cap(boss_strength), enrages=True)
+    for i, strength in enumerate(add_strengths, 1):
+        enemies.add(f"Add {i} (strength {strength})", strength, enemy_max_health(strength),
+                    enemy_damage_cap(strength), arrives=i * add_every)
+    return enemies
+
+def group_battle(character, enemies, rng=random):
+    play(group_battle_flow(character, enemies, rng))
+
+def group_battle_flow(character, enemies, rng=random):
+    """
+    A battle against every enemy in an EnemyGroup. The player attacks the
+    first enemy in the fight; all of them attack back each turn. Returns
+    True if every enemy was defeated.
+    """
+    if speaking():
+        say(f"\n{enemies.remaining()} enemies have appeared!")
+
+    metrics.count("battles_total")
+
+    turn = None
+    while not enemies.defeated() and character["health"] > 0:
+        fighting = enemies.fighting()
+        if speaking():
+            say("\n----- Your Turn -----")
+            for row in fighting[:ENEMIES_SHOWN]:
+                say(enemies.describe(row))
+            if len(fighting) > ENEMIES_SHOWN:
+                say(f"...and {len(fighting) - ENEMIES_SHOWN} more.")
+            say("Choose your action:")
+            say("1. Attack")
+            say("2. Use Tool")
+            say("3. Run")
+
+        metrics.observe_since("group_battle_turn_seconds", turn)
+        choice = yield "Enter your choice (1-3): "
+        turn = metrics.start()
+        if choice == "1":
+            if fighting:
+                target = fighting[0]
+                damage, weapon = player_attack_damage(character, lambda damage: enemies.damage_taken(target, damage), rng)
+                if weapon:
+                    for name in enemies.roll_effects(target, weapon.special_effects, rng):
+                        say(f"{enemies.names[target]} is afflicted with {name}!")
+                if enemies.hit(target, damage):
+                    say(f"{enemies.names[target]} is defeated!")
+            else:
+                say("No enemy is within reach.")
+        elif choice == "2":
+            use_tool(character, rng)
+        elif choice == "3":
+            if run_away(character, rng):
+                say("You successfully escaped!")
+                metrics.observe_since("group_battle_turn_seconds", turn)
+                return False
+            else:
+                say("You failed to escape! The enemies block your way.")
+        else:
+            say("Invalid choice! You lose your turn.")
 
-def generate_loot():
-    loot_table = {
-        "Common": ["Gold", "Health Potion", "Wooden Shield"],
-        "Rare": ["Steel Helmet", unique_weapons[0], unique_weapons[1]],
-        "Epic": ["Enchanted Ring", unique_weapons[2]],
-        "Legendary": [unique_weapons[3], unique_weapons[4]],
-    }
+        # Enemies' attacks
+        rows, damages = enemies.attack(rng)
+        if rows:
+            enemy_damage = sum(damages)
+            character['health'] -= enemy_damage
+            record("stats", "health")
+            if speaking():
+                say(f"\n{len(rows)} {'enemy deals' if len(rows) == 1 else 'enemies deal'} {enemy_damage} damage to you. "
+                    f"Your health is now {max(0, character['health'])}.")
+            if character['health'] <= 0:
+                say("You were defeated. Game Over.")
+                break
 
-    loot_chance = random.random()
-    if loot_chance < 0.2:  # 20% chance of not getting loot
-        print("You didn't find any loot this time.")
+        # Status effects and enemy AI
+        died, arrived = enemies.tick()
+        for row in died:
+            say(f"{enemies.names[row]} succumbed to its wounds!")
+        for row in arrived:
+            say(f"{enemies.names[row]} joins the fight!")
+
+    metrics.observe_since("group_battle_turn_seconds", turn)
+    if enemies.defeated():
+        say("You defeated all the enemies!")
+        metrics.count("battles_won_total")
+        yield from battle_won_flow(character, rng)
+    say("\nThe battle has ended.")
+    return enemies.defeated()
+
+# Loot Table
+LOOT_TABLE = {
+    "Common": ["Gold", "Health Potion", "Wooden Shield"],
+    "Rare": ["Steel Helmet", unique_weapons[0], unique_weapons[1]],
+    "Epic": ["Enchanted Ring", unique_weapons[2]],
+    "Legendary": [unique_weapons[3], unique_weapons[4]],
+}
+RARITY_WEIGHTS = {"Common": 60, "Rare": 25, "Epic": 10, "Legendary": 5}  # Probability distribution of Items
+NO_LOOT_CHANCE = 0.2  # 20% chance of not getting loot
+
+# Compiled once into an alias table so a drop is a single random() call
+loot_table = LootTable(LOOT_TABLE, RARITY_WEIGHTS, NO_LOOT_CHANCE)
+
+@metrics.timed("generate_loot_seconds")
+def generate_loot(rng=random):
+    rarity, item = loot_table.roll(rng)
+    if item is None:
+        say("You didn't find any loot this time.")
         return None
+    metrics.count("loot_drops_total")
 
-    rarity = random.choices(
-        ["Common", "Rare", "Epic", "Legendary"],
-        weights=[60, 25, 10, 5],  # Probability distribution of Items
-        k=1
-    )[0]
-
-    item = random.choice(loot_table[rarity])
-    print(f"You found a {rarity} item: {item.name if isinstance(item, Weapon) else item}!")
+    if isinstance(item, WeaponSpec):
+        item = item.create()  # every drop is its own weapon with its own durability
+    if speaking():
+        say(f"You found a {rarity} item: {item.name if isinstance(item, Weapon) else item}!")
     return item
 
+def generate_loot_batch(n, rng=random):
+    """
+    Rolls `n` drops without printing. Weapons come back as their WeaponSpec
+    and empty rolls as None; call spec.create() for a weapon to keep.
+    """
+    return loot_table.roll_many(n, rng)
 
-
-
-def add_to_inventory(character, loot):
+def add_to_inventory(character, loot, rng=random):
+    if loot is None:
+        return
+    count = None
+    loud = speaking()
     if isinstance(loot, Weapon):
-        character['inventory'].append(loot)
-        print(f"The {loot.name} has been added to your inventory.")
+        character['inventory'].add(loot)
+        if loud:
+            say(f"The {loot.name} has been added to your inventory.")
     elif isinstance(loot, str):
-        print(f"You found some {loot}! Added to your inventory.")
+        if loud:
+            say(f"You found some {loot}! Added to your inventory.")
         if loot == "Gold":
-            character['inventory'].append({"type": "Gold", "amount": random.randint(10, 50)})
-        elif loot == "Health Potion":
-            character['inventory'].append({"type": "Health Potion", "effect": "Restore 20 HP"})
-        else:
-            character['inventory'].append({"type": loot})
+            count = rng.randint(10, 50)
+        character['inventory'].add(loot, count)
     else:
-        print(f"You found a {loot}! Added to your inventory.")
-        character['inventory'].append(loot)
+        if loud:
+            say(f"You found a {loot}! Added to your inventory.")
+        character['inventory'].add(loot)
+    record("added", loot, count)
 
-def explore_area(character):
-    if random.choice([True, False]):
-        enemy_strength = random.randint(5, 15)
-        battle(character, enemy_strength)
-    else:
-        print("The area seems peaceful. You found nothing.")
-
-def print_character_info(character):
-    print("\n----- Character Info -----")
-    print(f"Name: {character['name']}")
-    print(f"Level: {character['level']}")
-    print(f"Health: {character['health']}")
-    print(f"Strength: {character['strength']}")
-    print(f"Intelligence: {character['intelligence']}")
-    print(f"Dexterity: {character['dexterity']}")
-    print(f"Experience: {character['exp']}")
-    print(f"Bonus Points: {character['bonus_points']}")
-
-    print("Current Weapon:", end=" ")
-    if character["current_weapon"]:
-        print(
-            f"{character['current_weapon'].name} ({character['current_weapon'].damage_range[0]} - {character['current_weapon'].damage_range[1]} damage)"
-        )
-    else:
-        print("None")
+def explore_area(character, rng=random):
+    play(explore_area_flow(character, rng))
 
-    print("Inventory:")
-    if not character["inventory"]:
-        print("Your inventory is empty.")
+def explore_area_flow(character, rng=random, world=None):
+    """
+    Searches the current room. A room's own encounter or cache is found
+    first; once it is cleared, wandering enemies may still turn up.
+    """
+    if world is not None:
+        x, y = character["world"]["position"]
+        if world.feature(x, y):
+            yield from room_feature_flow(character, world, rng)
+            return
+
+    if rng.choice([True, False]):
+        encounter = rng.random()
+        if encounter < BOSS_CHANCE:
+            yield from encounter_flow(character, "boss", rng)
+        elif encounter < BOSS_CHANCE + GROUP_CHANCE:
+            yield from encounter_flow(character, "group", rng)
+        else:
+            yield from encounter_flow(character, "enemy", rng)
     else:
-        for index, item in enumerate(character["inventory"], 1):
-            if isinstance(item, Weapon):
-                print(f"{index}. {item.name} ({item.damage_range[0]} - {item.damage_range[1]} damage)")
-            else:
-                print(f"{index}. {item}")
-
-    print("-------------------------")
+        say("The area seems peaceful. You found nothing.")
+
+def encounter_flow(character, kind, rng=random):
+    """Fights an "enemy", "group" or "boss" encounter. Returns True if it was defeated."""
+    if kind == "boss":
+        adds = [rng.randint(*EXPLORE_STRENGTH) for _ in range(BOSS_ADDS)]
+        say("\nA fearsome boss blocks your path!")
+        return (yield from group_battle_flow(character, boss_group(BOSS_STRENGTH, adds), rng))
+    if kind == "group":
+        strengths = [rng.randint(*EXPLORE_STRENGTH) for _ in range(rng.randint(*GROUP_SIZE))]
+        return (yield from group_battle_flow(character, enemy_group(strengths), rng))
+    enemy_strength = rng.randint(*EXPLORE_STRENGTH)
+    return (yield from battle_flow(character, enemy_strength, rng))
+
+# World Map
+NEARBY_RADIUS = 6
+NEARBY_SHOWN = 3
+OPEN_TERRAINS = ("Road", "Plains", "Hills")   # you are "on" these and "in" the rest
+FEATURE_NAMES = {"enemy": "an enemy", "group": "a group of enemies", "boss": "a boss", "cache": "a loot cache"}
+
+def new_world(rng=random):
+    return {"seed": rng.getrandbits(WORLD_SEED_BITS), "position": [0, 0]}
+
+def ensure_world(character, rng=random):
+    """Gives characters from before the world map a world of their own."""
+    if not character.get("world"):
+        character["world"] = new_world(rng)
+        record("world")
+
+def room_feature_flow(character, world, rng=random):
+    """Resolves the encounter or cache in the player's room; it is gone once beaten or looted."""
+    x, y = character["world"]["position"]
+    kind = world.feature(x, y)
+    if kind == "cache":
+        say("You find a hidden cache!")
+        loot = generate_loot(rng)
+        add_to_inventory(character, loot, rng)
+        world.clear(x, y)
+    elif kind:
+        if (yield from encounter_flow(character, kind, rng)):
+            world.clear(x, y)
+
+def describe_location(character, world):
+    x, y = character["world"]["position"]
+    terrain = world.terrain(x, y)
+    where = "on" if terrain in OPEN_TERRAINS else "in"
+    return f"\nYou are {where} the {terrain} at ({x}, {y}). Exits: {', '.join(world.exits(x, y))}."
+
+def travel_flow(character, world, rng=random):
+    x, y = character["world"]["position"]
+    exits = world.exits(x, y)
+    nearby = [found for found in world.nearby(x, y, NEARBY_RADIUS) if found[0]]
+    if nearby:
+        say("Nearby: " + ", ".join(
+            f"{FEATURE_NAMES[kind]} at ({fx}, {fy})" for _, fx, fy, kind in nearby[:NEARBY_SHOWN]
+        ) + ".")
+    say("Where do you want to go?")
+    for index, direction in enumerate(exits, 1):
+        say(f"{index}. {direction.capitalize()} ({world.terrain(*step(x, y, direction))})")
+
+    choice = yield f"Enter the number of a direction (1-{len(exits)}) or 'Q' to stay: "
+    if choice.isdigit() and 1 <= int(choice) <= len(exits):
+        direction = exits[int(choice) - 1]
+        x, y = step(x, y, direction)
+        character["world"]["position"] = [x, y]
+        record("world")
+        say(f"You travel {direction} to the {world.terrain(x, y)} at ({x}, {y}).")
+        kind = world.feature(x, y)
+        if kind == "cache":
+            say("Something glints nearby. Explore to search the area.")
+        elif kind:
+            say(f"You run into {FEATURE_NAMES[kind]}!")
+            yield from room_feature_flow(character, world, rng)
+    elif choice.lower() != "q":
+        say(f"Invalid choice. Please enter 1-{len(exits)} or 'Q'.")
 
 def select_item_from_inventory(character):
-    print("Select an item from your inventory by number.")
+    return play(select_item_from_inventory_flow(character))
+
+def select_item_from_inventory_flow(character):
+    say("Select an item from your inventory by number.")
     for index, item in enumerate(character["inventory"], 1):
-        print(f"{index}. {item.name if isinstance(item, Weapon) else item}")
+        say(f"{index}. {item.name if isinstance(item, Weapon) else item}")
+    pilot = advisor.get()
+    if pilot is not None:
+        say(f"Advisor: {pilot.advise_equip(character)}")
 
-    choice = input("Enter the number of the item to equip or 'Q' to quit: ").capitalize()
+    choice = yield "Enter the number of the item to equip or 'Q' to quit: "
+    choice = choice.capitalize()
 
     if choice == 'Q':
         return None
@@ -359,35 +541,110 @@ def select_item_from_inventory(character):
             item = character["inventory"][choice - 1]
             if isinstance(item, Weapon):
                 character["current_weapon"] = item
-                print(f"You equipped {item.name}.")
+                record("equipped", choice - 1)
+                say(f"You equipped {item.name}.")
             else:
-                print(f"{item} is not a weapon and can't be equipped.")
+                say(f"{item} is not a weapon and can't be equipped.")
         else:
-            print("Invalid choice. Please select a valid number.")
-    else:
-        print("Invalid input. Please enter a valid number or 'Q' to quit.")
-
-def main():
-    character = load_character()
-    if character is None:
-        print("No character found. Let's create a new one.")
-        character = create_character()
-        save_character(character)
+            say("Invalid choice. Please select a valid number.")
     else:
-        print(f"Welcome back, {character['name']}!")
+        say("Invalid input. Please enter a valid number or 'Q' to quit.")
+
+def main(fsync="file"):
+    import savefile
+    from content import load_default_content, poll
+    from journal import JOURNAL_FILE, Journal
+
+    pack = load_default_content()
+    metrics_file = os.environ.get(METRICS_ENV)
+    if os.environ.get(ADVISOR_ENV):
+        from agent import Agent
+        advisor.set(Agent())
+    if metrics_file:
+        metrics.enable()
+    metrics_written = time.monotonic()
+    log = Journal(JOURNAL_FILE, fsync)
+    saver = AutoSaver(SAVE_FILE, savefile.dumps, fsync=fsync)
+    world = None
+    finished = False
+
+    def save(character):
+        nonlocal metrics_written
+        with metrics.timer("save_seconds"):
+            saver.save(character)
+            world.flush()
+            log.commit()
+        poll(pack)
+        if metrics_file and time.monotonic() - metrics_written >= METRICS_INTERVAL:
+            metrics.write(metrics_file)
+            metrics_written = time.monotonic()
+
+    try:
+        # A leftover journal means the last session crashed; it is newer than the save
+        character = log.recover()
+        if character is not None:
+            say(f"Recovered {character['name']} from an interrupted session.")
+            saver.save(character)
+        else:
+            character = load_character()
+            if character is None:
+                say("No character found. Let's create a new one.")
+                character = create_character()
+                saver.save(character)
+            else:
+                say(f"Welcome back, {character['name']}!")
+
+        ensure_world(character)
+        world = World(character["world"]["seed"], ChunkStore(WORLD_FILE, fsync))
+        log.begin(character)
+        token = journal.set(log)
+        try:
+            play(game_loop_flow(character, save=save, world=world))
+        finally:
+            journal.reset(token)
+        saver.save(character)
+        finished = True
+    finally:
+        try:
+            saver.close()
+            if world is not None:
+                world.close()
+            # After a clean exit the save file holds everything; otherwise the
+            # journal is kept for the next start to recover() from
+            log.close(remove=finished)
+        finally:
+            log.close()
+            output.get().flush()
+            if metrics_file:
+                metrics.write(metrics_file)
+    return character
+
+def game_loop_flow(character, rng=random, save=None, world=None):
+    ensure_world(character, rng)
+    if world is None:
+        world = World(character["world"]["seed"])   # cleared rooms only last for this session
 
     while True:
         print_character_info(character)
-        choice = input("Do you want to (E)xplore, (I)nventory, or (Q)uit? ").lower()
+        say(describe_location(character, world))
+        choice = yield "Do you want to (E)xplore, (T)ravel, (I)nventory, or (Q)uit? "
+        choice = choice.lower()
 
         if choice == "e":
-            explore_area(character)
+            yield from explore_area_flow(character, rng, world)
+        elif choice == "t":
+            yield from travel_flow(character, world, rng)
         elif choice == "i":
-            select_item_from_inventory(character)
+            yield from select_item_from_inventory_flow(character)
         elif choice == "q":
-            print("Saving progress and exiting the game. Goodbye!")
-            save_character(character)
+            say("Saving progress and exiting the game. Goodbye!")
             break
 
+        if save:
+            save(character)
+
 if __name__ == "__main__":
-    main()
+    # Run the importable copy of this module, so modules that import main
+    # (content packs, the store, ...) share its state and classes
+    import main as game
+    game.main()
@@ -0,0 +1,259 @@
+"""
+Counters and latency histograms for the game's hot paths.
+
+Instrumentation is off by default and costs a flag check per call while it
+is off. Once enable()d, timed() functions, timer() blocks and observe()
+calls record into log-linear histograms in the style of HdrHistogram:
+every power of two of nanoseconds is split into SUB_BUCKETS buckets, so
+any latency from a nanosecond to minutes is kept to within about 3% in a
+fixed array of counts, and recording is one index calculation. count()
+bumps a counter.
+
+snapshot() renders everything in the Prometheus text format; write() saves
+it to a file (atomically, for the node exporter's textfile collector) and
+serve() exposes it over HTTP.
+
+    metrics.enable()
+    with metrics.timer("save_seconds"):
+        save_character(character)
+    metrics.count("level_ups_total")
+    metrics.write("adventure.prom")
+"""
+import functools
+import math
+import time
+from array import array
+
+PREFIX = "adventure_"
+SUB_BITS = 5
+SUB_BUCKETS = 1 << SUB_BITS
+MAX_BITS = 42               # about 73 minutes; longer values are clamped
+# Prometheus bucket bounds: powers of two from about 1us to about 69s
+EXPORT_BITS = range(10, 37)
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+clock = time.perf_counter_ns
+enabled = False
+counters = {}
+histograms = {}
+
+
+def bucket_index(value):
+    """The histogram bucket holding `value` nanoseconds."""
+    if value < SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - SUB_BITS - 1
+    return ((shift + 1) << SUB_BITS) + (value >> shift) - SUB_BUCKETS
+
+
+def bucket_bounds(index):
+    """(lowest, highest + 1) value of a bucket."""
+    if index < SUB_BUCKETS:
+        return index, index + 1
+    shift = (index >> SUB_BITS) - 1
+    mantissa = SUB_BUCKETS + (index & (SUB_BUCKETS - 1))
+    return mantissa << shift, (mantissa + 1) << shift
+
+
+MAX_VALUE = (1 << MAX_BITS) - 1
+BUCKET_COUNT = bucket_index(MAX_VALUE) + 1
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        self.counts = array("Q", bytes(8 * BUCKET_COUNT))
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def record(self, value):
+        """Records a latency in nanoseconds."""
+        if value > MAX_VALUE:
+            value = MAX_VALUE
+        elif value < 0:
+            value = 0
+        self.counts[bucket_index(value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """The value (in nanoseconds) below which a fraction `q` of the recorded values fall."""
+        if not self.count:
+            return 0
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bucket_bounds(index)[1] - 1, self.max)
+        return self.max
+
+    def cumulative(self, bounds):
+        """Counts of values below each bound (bounds ascending, powers of two)."""
+        counts = self.counts
+        result = []
+        seen = 0
+        start = 0
+        for bound in bounds:
+            end = bucket_index(bound)
+            seen += sum(counts[start:end])
+            start = end
+            result.append(seen)
+        return result
+
+
+# Recording
+def enable():
+    global enabled
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def reset():
+    counters.clear()
+    histograms.clear()
+
+
+def count(name, amount=1):
+    if enabled:
+        counters[name] = counters.get(name, 0) + amount
+
+
+def histogram(name):
+    found = histograms.get(name)
+    if found is None:
+        found = histograms.setdefault(name, Histogram())
+    return found
+
+
+def observe(name, nanoseconds):
+    if enabled:
+        histogram(name).record(nanoseconds)
+
+
+def observe_since(name, started):
+    """Records the time since `started` (a clock() reading); does nothing if started is None."""
+    if enabled and started is not None:
+        histogram(name).record(clock() - started)
+
+
+def start():
+    """clock() if instrumentation is on, else None; pair with observe_since()."""
+    return clock() if enabled else None
+
+
+class Timer:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = start()
+        return self
+
+    def __exit__(self, *exc_info):
+        observe_since(self.name, self.started)
+
+
+def timer(name):
+    """Context manager recording how long its block took."""
+    return Timer(name)
+
+
+def timed(name):
+    """Decorator recording how long each call of a (non-generator) function takes."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            started = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                histogram(name).record(clock() - started)
+        return wrapper
+    return decorator
+
+
+# Export
+def format_seconds(nanoseconds):
+    return repr(nanoseconds / 1e9)
+
+
+def snapshot():
+    """Every counter and histogram in the Prometheus text exposition format."""
+    lines = []
+    for name, value in sorted(counters.items()):
+        lines.append(f"# TYPE {PREFIX}{name} counter")
+        lines.append(f"{PREFIX}{name} {value}")
+
+    bounds = [1 << bits for bits in EXPORT_BITS]
+    for name, found in sorted(histograms.items()):
+        metric = PREFIX + name
+        lines.append(f"# TYPE {metric} histogram")
+        for bound, below in zip(bounds, found.cumulative(bounds)):
+            lines.append(f'{metric}_bucket{{le="{format_seconds(bound)}"}} {below}')
+        lines.append(f'{metric}_bucket{{le="+Inf"}} {found.count}')
+        lines.append(f"{metric}_sum {format_seconds(found.sum)}")
+        lines.append(f"{metric}_count {found.count}")
+        # Outliers the buckets are too coarse to show
+        lines.append(f"# TYPE {metric}_max gauge")
+        lines.append(f"{metric}_max {format_seconds(found.max)}")
+        lines.append(f"# TYPE {metric}_quantile gauge")
+        for q in QUANTILES:
+            lines.append(f'{metric}_quantile{{quantile="{q}"}} {format_seconds(found.quantile(q))}')
+    return "\n".join(lines) + "\n"
+
+
+def report():
+    """A plain-text summary of the histograms, for people rather than Prometheus."""
+    lines = []
+    for name, found in sorted(histograms.items()):
+        quantiles = "  ".join(f"p{q * 100:g} {found.quantile(q) / 1000:.1f}us" for q in QUANTILES)
+        lines.append(f"{name}: {found.count} calls  mean {found.sum / max(found.count, 1) / 1000:.1f}us  "
+                     f"{quantiles}  max {found.max / 1000:.1f}us")
+    for name, value in sorted(counters.items()):
+        lines.append(f"{name}: {value}")
+    return "\n".join(lines)
+
+
+def write(path):
+    """Replaces `path` with a snapshot(), atomically."""
+    from autosave import write_atomic   # autosave imports this module
+    write_atomic(path, snapshot().encode(), fsync="none")
+
+
+def serve(port, host="127.0.0.1"):
+    """Serves snapshot() at http://host:port/metrics from a background thread; returns the server."""
+    # Imported here rather than at the top: http.server alone would double the game's startup time
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = snapshot().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
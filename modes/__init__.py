@@ -0,0 +1,40 @@
+"""
+Game modes.
+
+A mode is a plugin module with a run() that plays the game on the console.
+Modes are registered by module path and imported only when one is chosen,
+so starting one mode never imports another (or its content tables, world
+map and serializers):
+
+    import modes
+    modes.load("school").run()
+
+Other packages can add their own with register().
+"""
+import importlib
+
+DEFAULT_MODE = "classic"
+
+# name -> (module path, one-line description)
+MODES = {
+    "classic": ("modes.classic", "Turn-based battles, loot tables, status effects and a world map (main.py)"),
+    "school": ("modes.school", "The original school project: strength checks and the Shadow Serpent (school_project.py)"),
+}
+
+
+def register(name, module, description=""):
+    """Adds a mode played by `module`.run(); `module` is imported when the mode is loaded."""
+    MODES[name] = (module, description)
+
+
+def names():
+    return list(MODES)
+
+
+def load(name):
+    """Imports and returns the module of mode `name`."""
+    try:
+        module, _ = MODES[name]
+    except KeyError:
+        raise ValueError(f"unknown game mode {name!r}, choose from {', '.join(MODES)}") from None
+    return importlib.import_module(module)
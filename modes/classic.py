@@ -0,0 +1,7 @@
+"""The full game: main.py's turn-based battles, loot, status effects and world map."""
+
+
+def run():
+    from main import main
+
+    return main()
@@ -0,0 +1,220 @@
+"""
+The original school project (school_project.py) as a game mode.
+
+Battles are a strength check: a character at least as strong as the enemy
+wins, gains experience, levels up at LEVEL_UP_EXP and finds Gold, a Health
+Potion or a plain weapon. Half of all explorations meet an enemy, the rest
+a boss and then the Shadow Serpent, a miniboss. The game ends once the
+character passes MAX_LEVEL.
+
+Characters, weapons, level-ups and saves are the shared ones from
+engine.py, so school characters are saved in the binary format like any
+other, but in their own SAVE_FILE. This mode never imports main.py.
+"""
+import json
+import random
+
+from autosave import write_atomic
+from engine import (
+    Weapon,
+    allocate_bonus_points_flow,
+    create_character_flow,
+    level_up,
+    play,
+    print_character_info,
+    record,
+    run_away,
+    say,
+)
+
+# Save Data
+SAVE_FILE = "school_data.sav"
+# school_project.py's own save, migrated when there is no SAVE_FILE yet
+LEGACY_SAVE_FILE = "character_data.txt"
+
+# Rules
+EXPLORE_STRENGTH = (5, 15)
+BOSS_STRENGTH = 20
+MINIBOSS_STRENGTH = (15, 25)
+EXP_GAIN = (10, 20)
+LEVEL_UP_EXP = 50
+MAX_LEVEL = 5
+LOOT = ("Gold", "Health Potion", "Sword", "Axe", "Bow")
+WEAPONS = ("Sword", "Axe", "Bow")
+WEAPON_DAMAGE = (5, 15)
+
+
+def save_character(character, path=SAVE_FILE):
+    from savefile import dumps
+    write_atomic(path, dumps(character))
+
+
+def load_character():
+    from savefile import load
+    for path in (SAVE_FILE, LEGACY_SAVE_FILE):
+        try:
+            return load(path)
+        except FileNotFoundError:
+            continue
+        except json.JSONDecodeError as e:
+            say(f"Error decoding JSON: {e}")
+            return None
+        except Exception as e:
+            say(f"An unexpected error occurred: {e}")
+            return None
+    return None
+
+
+# Battles
+def battle_flow(character, enemy_strength, rng=random):
+    """Returns True if the character was strong enough to win."""
+    if character["strength"] < enemy_strength:
+        say("You were defeated. Game Over.")
+        return False
+
+    say("You defeated the enemy!")
+    character["exp"] += rng.randint(*EXP_GAIN)
+    record("stats", "exp")
+    if character["exp"] >= LEVEL_UP_EXP:
+        level_up(character, rng)
+        yield from allocate_bonus_points_flow(character)
+
+    add_to_inventory(character, generate_loot(rng))
+    return True
+
+
+def confront_flow(character, enemy_strength, rng=random, escaped="You successfully ran away!", invalid=None):
+    """
+    Lets the player fight or try to run. Returns the battle's result, or
+    None if there was no battle.
+    """
+    choice = yield "Do you want to (F)ight or (R)un? "
+    choice = choice.lower()
+
+    if choice == "f":
+        return (yield from battle_flow(character, enemy_strength, rng))
+    if choice == "r":
+        if run_away(character, rng):
+            say(escaped)
+            return None
+        say("You couldn't escape! Prepare for battle.")
+        return (yield from battle_flow(character, enemy_strength, rng))
+    if invalid:
+        say(invalid)
+    return None
+
+
+def encounter_boss_flow(character, rng=random):
+    say("You encounter a fearsome boss!")
+    yield from confront_flow(character, BOSS_STRENGTH, rng, invalid="Invalid choice. The boss eyes you menacingly.")
+
+    say("The evil force's influence intensifies, manifesting into a fearsome creature known as the Shadow Serpent.")
+    say("It lurks in the shadows, terrorizing the village. It's up to you to confront this menace and protect your home.")
+
+    enemy_strength = rng.randint(*MINIBOSS_STRENGTH)
+    say("\nMiniboss Encounter:")
+    say(f"You encounter the Shadow Serpent with strength {enemy_strength}!")
+
+    won = yield from confront_flow(
+        character, enemy_strength, rng,
+        escaped="You successfully retreat, but the Shadow Serpent's presence lingers over the village.",
+        invalid="Invalid choice. The Shadow Serpent hisses in anticipation.",
+    )
+    if won is None:
+        return
+
+    say("\n----- Conclusion -----")
+    if won:
+        say(f"Congratulations, {character['name']}! You have defeated the Shadow Serpent and become the village's new hero.")
+        say("The village is saved, and your courage is celebrated by all.")
+    else:
+        say(f"Despite the challenges, {character['name']} couldn't defeat the Shadow Serpent.")
+        say("The village struggles under the influence of the evil force.")
+    say("\nThank you for playing the Text-based RPG. Goodbye!")
+
+
+def explore_area_flow(character, rng=random):
+    if rng.choice((True, False)):
+        enemy_strength = rng.randint(*EXPLORE_STRENGTH)
+        say(f"\nYou encounter an enemy with strength {enemy_strength}!")
+        yield from confront_flow(character, enemy_strength, rng)
+    else:
+        yield from encounter_boss_flow(character, rng)
+
+
+# Loot
+def generate_loot(rng=random):
+    return rng.choice(LOOT)
+
+
+def loot_weapon(name):
+    """A weapon found as loot, with the stats savefile gives weapons from school_project.py saves."""
+    from savefile import school_weapon
+    return Weapon.from_dict(school_weapon({"name": name, "damage_range": WEAPON_DAMAGE}))
+
+
+def add_to_inventory(character, loot):
+    if loot in WEAPONS:
+        loot = loot_weapon(loot)
+        say(f"You found a {loot.name}! It has been added to your inventory.")
+    elif loot == "Health Potion":
+        say(f"You found a {loot}! It has been added to your inventory.")
+    else:
+        say(f"You found {loot}!")
+    character["inventory"].add(loot)
+    record("added", loot, None)
+
+
+# Inventory
+def equip_flow(character):
+    say("Inventory:")
+    for item in character["inventory"]:
+        if isinstance(item, Weapon):
+            say(f"- {item.name} ({item.damage_range[0]} - {item.damage_range[1]} damage)")
+        else:
+            say(f"- {item}")
+
+    choice = yield "Type the name of the weapon you want to equip (or type 'Q' to go back): "
+    if choice.capitalize() == "Q":
+        return
+
+    for position, item in enumerate(character["inventory"]):
+        if isinstance(item, Weapon) and item.name.lower() == choice.lower():
+            character["current_weapon"] = item
+            record("equipped", position)
+            say(f"You have equipped {item.name}.")
+            return
+    say("Invalid choice. No such weapon in your inventory.")
+
+
+# Game Loop
+def game_loop_flow(character, rng=random, save=None):
+    while character["level"] <= MAX_LEVEL:
+        print_character_info(character)
+        choice = yield "Do you want to (E)xplore, (I)nv, or (Q)uit? "
+        choice = choice.lower()
+
+        if choice == "e":
+            yield from explore_area_flow(character, rng)
+        elif choice == "i":
+            yield from equip_flow(character)
+        elif choice == "q":
+            say("Exiting the game. Goodbye!")
+            break
+
+        if save:
+            save(character)
+
+
+def run():
+    character = load_character()
+    if character is None:
+        say("No character found. Let's create a new one.")
+        character = play(create_character_flow())
+        save_character(character)
+    else:
+        say(f"Welcome back, {character['name']}!")
+
+    play(game_loop_flow(character, save=save_character))
+    save_character(character)
+    return character
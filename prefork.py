@@ -0,0 +1,526 @@
+"""
+Prefork game host: a router and N worker processes.
+
+One Python process only ever uses one core, however its game loop is
+written, so this host runs N workers, each with its own event loop and its
+own shard of the players. The router accepts every connection and asks
+for the character's name, pins the name to a worker and hands the
+connection itself (its socket, passed over a Unix socket) to that worker.
+From then on the player and the worker talk directly; the router is out
+of the way and throughput grows with the number of workers.
+
+The router and the workers share a Directory in shared memory: a few
+router counters, a row of live counters per worker and an open-addressing
+table from character name (hashed) to worker. Every cell has a single
+writer at a time: the router assigns names and marks a name live when it
+hands its session over, and each worker counts its own sessions and steps
+and clears a name's live mark when its session ends. So nobody locks, and
+the router picking the least loaded worker, or `prefork.py --status` from
+another shell, reads it without asking anyone.
+
+A name has at most one live session. A second connection under a name
+that is still playing waits in the router until the first one ends, so
+two sessions never save over each other; it gives up after WAIT_TIMEOUT
+seconds or as soon as its player hangs up. A new name is turned away when
+the directory has no free slot left, rather than played unpinned.
+
+Between connections a character's state is its save (save_character() and
+load_character(), one file per character under --sessions). When a
+player comes back and their worker has died, or has MOVE_SLACK more live
+sessions than the least loaded one, the router moves the name to the least
+loaded worker, which picks the character up from the save.
+
+Each worker loads the content pack and watches it for edits itself, as
+server.py does.
+
+Unix only: sockets are handed over with socket.send_fds().
+
+    python prefork.py --workers 8 --port 4000
+    python prefork.py --status --port 4000
+"""
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import re
+import signal
+import socket
+import sys
+from multiprocessing import resource_tracker, shared_memory
+
+from agent import Agent
+from characters import Character
+from content import load_default_content
+from main import create_character_flow, game_loop_flow, load_character, output, save_character, say
+from renderer import NullRenderer
+from server import Session, converse, reload_content
+from streams import StreamFactory
+
+DIRECTORY_SIZE = 1 << 16    # names remembered; a power of two
+MOVE_SLACK = 8              # live sessions a worker may have over the least loaded before names move off it
+NAME_LIMIT = 256            # bytes of a name line the router reads
+HANDOFF_SIZE = 4096
+CHECK_INTERVAL = 1.0        # seconds between worker health checks
+WAIT_INTERVAL = 0.05        # seconds between checks whether a waiting name's other session has ended
+WAIT_TIMEOUT = 60.0         # seconds a second login waits for its name's other session before giving up
+STOP_TIMEOUT = 10.0         # seconds workers get to save their players on shutdown
+SESSIONS_DIR = "sessions"
+
+# Directory layout, in int64 cells: HEADER, then a WORKER row per worker, then an ENTRY per name slot
+HEADER = ("workers", "capacity", "names", "routed", "moves", "respawns")
+WORKER = ("pid", "live", "sessions", "steps", "moved_in")
+ENTRY = ("key", "worker", "live")   # key 0: a free slot
+
+
+class DirectoryFull(Exception):
+    """Raised by Router.assign when a new name finds no free directory slot."""
+CELL = 8
+
+
+def name_key(name):
+    """A name's directory key: a stable, non-zero 63-bit hash."""
+    digest = hashlib.blake2b(name.encode(errors="replace"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") >> 1 or 1
+
+
+def directory_name(port=None, unix_path=None):
+    """The shared memory name for the host listening on a port or Unix socket."""
+    if unix_path:
+        return "adventure-" + hashlib.blake2b(os.path.abspath(unix_path).encode(), digest_size=6).hexdigest()
+    return f"adventure-{port}"
+
+
+def save_path(sessions, name):
+    slug = re.sub(r"[^A-Za-z0-9_-]", "_", name)[:32]
+    return os.path.join(sessions, f"{slug}-{name_key(name):016x}.sav")
+
+
+class Directory:
+    """Session directory and live counters in shared memory."""
+
+    def __init__(self, memory, create=False, workers=0, capacity=DIRECTORY_SIZE):
+        self.memory = memory
+        self.cells = memory.buf.cast("q")
+        if create:
+            self.cells[HEADER.index("workers")] = workers
+            self.cells[HEADER.index("capacity")] = capacity
+        self.workers = self.cells[HEADER.index("workers")]
+        self.capacity = self.cells[HEADER.index("capacity")]
+        self.entries = len(HEADER) + self.workers * len(WORKER)
+
+    @classmethod
+    def create(cls, name, workers, capacity=DIRECTORY_SIZE):
+        if capacity & (capacity - 1):
+            raise ValueError("the directory size must be a power of two")
+        size = (len(HEADER) + workers * len(WORKER) + capacity * len(ENTRY)) * CELL
+        try:
+            stale = shared_memory.SharedMemory(name)
+        except FileNotFoundError:
+            pass
+        else:
+            stale.close()
+            stale.unlink()  # left behind by a host that was killed
+        return cls(shared_memory.SharedMemory(name, create=True, size=size), True, workers, capacity)
+
+    @classmethod
+    def attach(cls, name, untrack=False):
+        """
+        Opens a Directory created elsewhere. Outside the host's own process
+        tree pass untrack=True: attaching registers the segment to be unlinked
+        when this process exits, and it is not ours to unlink.
+        """
+        memory = shared_memory.SharedMemory(name)
+        if untrack:
+            resource_tracker.unregister(memory._name, "shared_memory")
+        return cls(memory)
+
+    def close(self, unlink=False):
+        self.cells.release()
+        self.memory.close()
+        if unlink:
+            self.memory.unlink()
+
+    # Counters
+    def counter(self, field):
+        return self.cells[HEADER.index(field)]
+
+    def bump(self, field, amount=1):
+        self.cells[HEADER.index(field)] += amount
+
+    def cell(self, worker, field):
+        return len(HEADER) + worker * len(WORKER) + WORKER.index(field)
+
+    def worker_counter(self, worker, field):
+        return self.cells[self.cell(worker, field)]
+
+    def bump_worker(self, worker, field, amount=1):
+        self.cells[self.cell(worker, field)] += amount
+
+    def load(self):
+        """Live sessions on each worker."""
+        return [self.worker_counter(worker, "live") for worker in range(self.workers)]
+
+    # Names
+    def entry(self, slot, field):
+        return self.entries + slot * len(ENTRY) + ENTRY.index(field)
+
+    def find(self, key, insert=False):
+        """The slot for a name key (linear probing), claiming a free one if `insert`; None if absent or full."""
+        cells = self.cells
+        mask = self.capacity - 1
+        slot = key & mask
+        for _ in range(self.capacity):
+            found = cells[self.entry(slot, "key")]
+            if found == key:
+                return slot
+            if not found:
+                if not insert:
+                    return None
+                cells[self.entry(slot, "worker")] = -1
+                cells[self.entry(slot, "live")] = 0
+                cells[self.entry(slot, "key")] = key
+                self.bump("names")
+                return slot
+            slot = (slot + 1) & mask
+        return None
+
+    def worker_of(self, name):
+        slot = self.find(name_key(name))
+        return None if slot is None else self.cells[self.entry(slot, "worker")]
+
+    def status(self):
+        lines = [", ".join(f"{field} {self.counter(field)}" for field in HEADER)]
+        lines.append(f"{'Worker':>6}" + "".join(f"{field:>12}" for field in WORKER))
+        for worker in range(self.workers):
+            lines.append(f"{worker:>6}" + "".join(f"{self.worker_counter(worker, field):>12}" for field in WORKER))
+        return "\n".join(lines)
+
+
+# Workers
+def answered(flow, answer):
+    """Runs a flow that asks one question, which the router already asked, with `answer`."""
+    token = output.set(NullRenderer())
+    try:
+        next(flow)
+        flow.send(answer)
+    except StopIteration as stop:
+        return stop.value
+    finally:
+        output.reset(token)
+    raise ValueError("the flow asked more than one question")
+
+
+class HostedSession(Session):
+    """A session whose name the router already asked for; the character is kept in its save between connections."""
+
+    def __init__(self, name, path, rng=None, diff=True, agent=None, count_step=None):
+        super().__init__(rng, diff, agent)
+        self.name = name
+        self.path = path
+        self.count_step = count_step
+
+    def run(self):
+        character = load_character(self.path) if os.path.exists(self.path) else None
+        if character is None:
+            character = answered(create_character_flow(), self.name)
+        else:
+            say(f"Welcome back, {character['name']}!")
+        self.character = Character.from_dict(character)
+        yield from game_loop_flow(self.character, self.rng)
+
+    def step(self, answer=None):
+        if self.count_step:
+            self.count_step()
+        return super().step(answer)
+
+    def save(self):
+        if self.character is not None:
+            save_character(self.character, self.path)
+
+
+async def host(request, client, index, directory, sessions, rng, diff, idle_timeout, agent):
+    slot = request["slot"]
+    reader, writer = await asyncio.open_connection(sock=client)
+    if request["pending"]:
+        reader.feed_data(request["pending"].encode("latin-1"))
+    session = HostedSession(request["name"], save_path(sessions, request["name"]), rng, diff, agent,
+                            lambda: directory.bump_worker(index, "steps"))
+    directory.bump_worker(index, "live")
+    directory.bump_worker(index, "sessions")
+    if request["moved"]:
+        directory.bump_worker(index, "moved_in")
+    try:
+        await converse(session, reader, writer, idle_timeout)
+    finally:
+        try:
+            session.save()
+        finally:
+            directory.cells[directory.entry(slot, "live")] = 0   # marked live by the router
+            directory.bump_worker(index, "live", -1)
+
+
+async def work(index, control, directory, sessions, seed, diff, idle_timeout, agent, pack=None):
+    loop = asyncio.get_running_loop()
+    handoffs = asyncio.Queue()
+    # Each worker checks the pack itself: an edit reaches every worker's sessions
+    reloader = asyncio.create_task(reload_content(pack)) if pack else None
+
+    def receive():
+        try:
+            message, fds, _, _ = socket.recv_fds(control, HANDOFF_SIZE, 1)
+        except BlockingIOError:
+            return
+        handoffs.put_nowait((message, fds))
+
+    control.setblocking(False)
+    loop.add_reader(control.fileno(), receive)
+    streams = StreamFactory(seed)
+    session_ids = itertools.count()
+    running = set()
+    while True:
+        message, fds = await handoffs.get()
+        for fd in fds[1:]:
+            os.close(fd)
+        if not fds:
+            continue
+        client = socket.socket(fileno=fds[0])
+        rng = streams.stream("worker", index, next(session_ids))
+        task = asyncio.create_task(
+            host(json.loads(message), client, index, directory, sessions, rng, diff, idle_timeout, agent)
+        )
+        running.add(task)
+        task.add_done_callback(running.discard)
+
+
+def worker_main(index, control, memory_name, sessions, seed, diff, idle_timeout, advisor_ms):
+    directory = Directory.attach(memory_name)
+    directory.cells[directory.cell(index, "pid")] = os.getpid()
+    agent = Agent(advisor_ms / 1000) if advisor_ms is not None else None
+    pack = load_default_content()
+    try:
+        asyncio.run(work(index, control, directory, sessions, seed, diff, idle_timeout, agent, pack))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        directory.close()
+
+
+# Router
+class Router:
+    def __init__(self, directory, sessions, seed=None, diff=True, idle_timeout=None, advisor_ms=None,
+                 move_slack=MOVE_SLACK):
+        self.directory = directory
+        self.sessions = sessions
+        self.worker_args = (directory.memory.name, sessions, seed, diff, idle_timeout, advisor_ms)
+        self.idle_timeout = idle_timeout
+        self.move_slack = move_slack
+        self.processes = [None] * directory.workers
+        self.controls = [None] * directory.workers
+        self.greeting = Session().step().encode()
+        self.context = multiprocessing.get_context("spawn")   # workers start clean, without the router's event loop
+
+    def spawn(self, index):
+        control, child = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        process = self.context.Process(
+            target=worker_main, args=(index, child) + self.worker_args, name=f"worker-{index}", daemon=True
+        )
+        process.start()
+        child.close()
+        self.processes[index] = process
+        self.controls[index] = control
+
+    def start(self):
+        for index in range(self.directory.workers):
+            self.spawn(index)
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        """Interrupts the workers, which save their players' characters, and waits for them."""
+        for process, control in zip(self.processes, self.controls):
+            if process is not None and process.is_alive():
+                os.kill(process.pid, signal.SIGINT)
+            if control is not None:
+                control.close()
+        for process in self.processes:
+            if process is not None:
+                process.join(timeout)
+                if process.is_alive():
+                    process.kill()
+
+    def alive(self, worker):
+        return self.processes[worker] is not None and self.processes[worker].is_alive()
+
+    def assign(self, name):
+        """
+        (worker, directory slot, whether the name moved) for a player
+        connecting as `name`, who is marked live; None while `name` is live.
+        Raises DirectoryFull when `name` is new and there is no room for it.
+        """
+        directory = self.directory
+        key = name_key(name)
+        slot = directory.find(key, insert=True)
+        if slot is None:
+            raise DirectoryFull(name)
+        live = directory.entry(slot, "live")
+        if directory.cells[live]:
+            return None
+        current = directory.cells[directory.entry(slot, "worker")]
+        load = directory.load()
+        if current < 0:
+            worker = key % directory.workers
+        elif not self.alive(current) or load[current] > min(load) + self.move_slack:
+            worker = min(range(directory.workers), key=load.__getitem__)
+        else:
+            worker = current
+        moved = 0 <= current != worker
+        directory.cells[directory.entry(slot, "worker")] = worker
+        directory.cells[live] = 1
+        if moved:
+            directory.bump("moves")
+        return worker, slot, moved
+
+    async def route(self, client):
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.sock_sendall(client, self.greeting)
+            data = b""
+            while b"\n" not in data and len(data) < NAME_LIMIT:
+                chunk = await asyncio.wait_for(loop.sock_recv(client, NAME_LIMIT), self.idle_timeout)
+                if not chunk:
+                    return
+                data += chunk
+            line, _, pending = data.partition(b"\n")
+            name = line.decode(errors="replace").rstrip("\r")
+            try:
+                assigned = self.assign(name)
+            except DirectoryFull:
+                await loop.sock_sendall(client, b"The server has no room for new players. Try again later.\n")
+                return
+            if assigned is None:
+                await loop.sock_sendall(client, f"{name} is already playing. Waiting for that game to end...\n".encode())
+                deadline = loop.time() + WAIT_TIMEOUT
+                while assigned is None:
+                    if loop.time() >= deadline:
+                        await loop.sock_sendall(client, f"{name} is still playing. Try again later.\n".encode())
+                        return
+                    try:
+                        # Wakes on a hangup; anything typed meanwhile goes to the session
+                        chunk = await asyncio.wait_for(loop.sock_recv(client, NAME_LIMIT), WAIT_INTERVAL)
+                    except asyncio.TimeoutError:
+                        chunk = None
+                    if chunk == b"" or len(pending) > NAME_LIMIT:
+                        return
+                    pending += chunk or b""
+                    assigned = self.assign(name)
+            worker, slot, moved = assigned
+            request = {"name": name, "slot": slot, "moved": moved, "pending": pending.decode("latin-1")}
+            try:
+                socket.send_fds(self.controls[worker], [json.dumps(request).encode()], [client.fileno()])
+            except OSError:
+                self.directory.cells[self.directory.entry(slot, "live")] = 0   # no worker got it
+                raise
+            self.directory.bump("routed")
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            client.close()
+
+    async def watch(self):
+        """Respawns workers that died; their sessions are picked up from their saves."""
+        while True:
+            await asyncio.sleep(CHECK_INTERVAL)
+            for worker in range(self.directory.workers):
+                if self.alive(worker):
+                    continue
+                self.processes[worker].join()
+                self.controls[worker].close()
+                self.clear(worker)
+                self.spawn(worker)
+                self.directory.bump("respawns")
+                print(f"Worker {worker} died and was restarted", file=sys.stderr)
+
+    def clear(self, worker):
+        """Takes over a dead worker's live marks, which it can no longer clear itself."""
+        directory = self.directory
+        cells = directory.cells
+        cells[directory.cell(worker, "live")] = 0
+        for slot in range(directory.capacity):
+            if cells[directory.entry(slot, "key")] and cells[directory.entry(slot, "worker")] == worker:
+                cells[directory.entry(slot, "live")] = 0
+
+    async def serve(self, listener):
+        loop = asyncio.get_running_loop()
+        listener.setblocking(False)
+        watcher = asyncio.create_task(self.watch())
+        routing = set()
+        try:
+            while True:
+                client, _ = await loop.sock_accept(listener)
+                client.setblocking(False)
+                task = asyncio.create_task(self.route(client))
+                routing.add(task)
+                task.add_done_callback(routing.discard)
+        finally:
+            watcher.cancel()
+
+
+def listen(host="127.0.0.1", port=4000, unix_path=None):
+    if unix_path:
+        if os.path.exists(unix_path):
+            os.unlink(unix_path)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(unix_path)
+    else:
+        listener = socket.create_server((host, port), reuse_port=False)
+    listener.listen(1024)
+    return listener
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Host game sessions on several worker processes.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4000)
+    parser.add_argument("--unix", help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--sessions", default=SESSIONS_DIR, help="directory for the characters' saves")
+    parser.add_argument("--directory-size", type=int, default=DIRECTORY_SIZE, help="names remembered (a power of two)")
+    parser.add_argument("--move-slack", type=int, default=MOVE_SLACK)
+    parser.add_argument("--idle-timeout", type=float, default=None, help="disconnect players idle this many seconds")
+    parser.add_argument("--seed", type=int, default=None, help="root seed for the per-session random streams")
+    parser.add_argument("--full-frames", action="store_true", help="resend the whole character sheet every turn")
+    parser.add_argument("--advisor", type=float, default=None, metavar="MS",
+                        help="show every player the advisor's suggestions, searching this many milliseconds each")
+    parser.add_argument("--status", action="store_true", help="print the running host's counters and exit")
+    args = parser.parse_args()
+
+    name = directory_name(args.port, args.unix)
+    if args.status:
+        try:
+            directory = Directory.attach(name, untrack=True)
+        except FileNotFoundError:
+            parser.error("no host is running there")
+        print(directory.status())
+        directory.close()
+        return
+
+    os.makedirs(args.sessions, exist_ok=True)
+    directory = Directory.create(name, args.workers or os.cpu_count() or 1, args.directory_size)
+    router = Router(directory, args.sessions, args.seed, not args.full_frames, args.idle_timeout, args.advisor,
+                    args.move_slack)
+    listener = listen(args.host, args.port, args.unix)
+    print(f"Serving on {listener.getsockname()} with {directory.workers} workers")
+    router.start()
+    try:
+        asyncio.run(router.serve(listener))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        router.stop()
+        listener.close()
+        directory.close(unlink=True)
+
+
+if __name__ == "__main__":
+    main()
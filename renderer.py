@@ -0,0 +1,90 @@
+"""
+Output renderers.
+
+Everything the game says goes to the current renderer (main.output) instead
+of straight to print(). A Renderer buffers a whole turn and writes it, the
+next prompt included, with a single write() call. Screens that are shown
+again and again, like the character sheet, are sent as frames: lists of
+(key, line) pairs. With diff=True only the lines whose text changed since
+the previous frame of the same name are sent.
+
+NullRenderer drops everything without formatting it, for headless runs.
+Its `enabled` is False, so hot paths can skip building messages nobody
+will see (see engine.speaking()).
+"""
+import sys
+
+
+class Renderer:
+    enabled = True
+
+    def __init__(self, write=None, diff=False):
+        # None writes to whatever sys.stdout is at the time
+        self.write = write
+        self.diff = diff
+        self.buffer = []
+        self.frames = {}    # frame name -> {key: line} as last sent
+
+    def say(self, *args, sep=" ", end="\n", **kwargs):
+        self.buffer.append(sep.join(map(str, args)) + end)
+
+    def frame(self, name, build, *args):
+        """
+        Shows the lines `build(*args)` returns, a list of (key, line) pairs.
+        Lines keyed None frame the others (headers, labels, footers) and
+        are only sent along with at least one changed line.
+        """
+        lines = build(*args)
+        if not self.diff:
+            self.buffer.extend(f"{line}\n" for _, line in lines)
+            return
+
+        previous = self.frames.get(name)
+        current = {key: line for key, line in lines if key is not None}
+        self.frames[name] = current
+        if previous is None:
+            self.buffer.extend(f"{line}\n" for _, line in lines)
+            return
+
+        if current == previous:
+            return
+        send = [line for key, line in lines if key is None or previous.get(key) != line]
+        removed = [f"- {line}" for key, line in previous.items() if key not in current]
+        if lines[-1][0] is None:
+            send[-1:-1] = removed   # before the footer
+        else:
+            send.extend(removed)
+        self.buffer.extend(f"{line}\n" for line in send)
+
+    def reset(self):
+        """Forgets sent frames, so the next ones are shown in full."""
+        self.frames.clear()
+
+    def flush(self, prompt=""):
+        """Writes the buffered turn and `prompt` in one call."""
+        self.buffer.append(prompt)
+        text = "".join(self.buffer)
+        self.buffer.clear()
+        if text:
+            if self.write is None:
+                sys.stdout.write(text)
+                sys.stdout.flush()
+            else:
+                self.write(text)
+
+
+class NullRenderer:
+    """Discards all output without formatting it."""
+    enabled = False
+
+    def say(self, *args, **kwargs):
+        pass
+
+    def frame(self, name, build, *args):
+        pass
+
+    def reset(self):
+        pass
+
+    def flush(self, prompt=""):
+        pass
@@ -0,0 +1,274 @@
+"""
+Record and replay game sessions.
+
+Recording runs main() as usual but logs every answer typed at a prompt,
+the seed the global random module was given, the save and world files the
+session started from and a digest of the save file it left behind (main() flushes
+its autosave on every exit, including errors). Replaying re-runs main()
+from that log in a scratch directory with no terminal I/O and checks that
+it leaves exactly the same save, so bug reports and load tests can be
+reproduced at full speed.
+
+    python replay.py record session.rec
+    python replay.py replay sessions/*.rec --jobs 8
+"""
+import argparse
+import builtins
+import hashlib
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import main
+from renderer import NullRenderer
+
+MAGIC = b"ADVREC"
+VERSION = 4
+# Every version still reads. Version 2 added the starting world file and version
+# 4 the starting crash journal; older recordings start without them.
+VERSIONS = (1, 2, 3, 4)
+# Saves became binary in version 3: older final digests are of JSON saves, which
+# are no longer written, so only how those sessions ended is checked
+BINARY_SAVES = 3
+
+HEADER = struct.Struct("<6sB")
+LENGTH = struct.Struct("<I")
+NO_SAVE = 0xFFFFFFFF
+# A session that ended because its input ran out reproduces as EOFError
+INPUT_ENDED = ("EOFError", "KeyboardInterrupt")
+
+
+class Recording:
+    def __init__(self, seed, answers, initial_save=None, content_digest=b"", final_digest=b"", error="",
+                 initial_world=None, initial_journal=None, version=VERSION):
+        self.version = version
+        self.seed = seed
+        self.answers = answers
+        self.initial_save = initial_save
+        self.initial_world = initial_world
+        self.initial_journal = initial_journal
+        self.content_digest = content_digest
+        self.final_digest = final_digest
+        self.error = error
+
+
+class ReplayError(Exception):
+    """Raised when a replayed session does not end the way it was recorded."""
+
+
+def save_digest():
+    try:
+        with open(main.SAVE_FILE, "rb") as file:
+            return hashlib.sha256(file.read()).digest()
+    except FileNotFoundError:
+        return b""
+
+
+def content_digest():
+    from content import DEFAULT_CONTENT
+    try:
+        with open(DEFAULT_CONTENT, "rb") as file:
+            return hashlib.sha256(file.read()).digest()
+    except FileNotFoundError:
+        return b""
+
+
+def read_file(path):
+    try:
+        with open(path, "rb") as file:
+            return file.read()
+    except FileNotFoundError:
+        return None
+
+
+# File format
+def pack_bytes(data):
+    return LENGTH.pack(len(data)) + data
+
+
+def pack_optional(data):
+    return LENGTH.pack(NO_SAVE) if data is None else pack_bytes(data)
+
+
+def write_recording(path, recording):
+    body = [struct.pack("<Q", recording.seed)]
+    body.append(pack_bytes(recording.content_digest))
+    body.append(pack_optional(recording.initial_save))
+    body.append(pack_optional(recording.initial_world))
+    body.append(pack_optional(recording.initial_journal))
+    body.append(LENGTH.pack(len(recording.answers)))
+    body.extend(pack_bytes(answer.encode()) for answer in recording.answers)
+    body.append(pack_bytes(recording.final_digest))
+    body.append(pack_bytes(recording.error.encode()))
+
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION))
+        file.write(zlib.compress(b"".join(body), 9))
+
+
+def read_recording(path):
+    with open(path, "rb") as file:
+        data = file.read()
+    magic, version = HEADER.unpack_from(data)
+    if magic != MAGIC or version not in VERSIONS:
+        raise ValueError(f"{path} is not a session recording (versions {VERSIONS[0]}-{VERSIONS[-1]})")
+    body = zlib.decompress(data[HEADER.size:])
+    offset = 0
+
+    def take(size):
+        nonlocal offset
+        chunk = body[offset:offset + size]
+        offset += size
+        return chunk
+
+    def take_bytes():
+        (length,) = LENGTH.unpack(take(LENGTH.size))
+        return None if length == NO_SAVE else take(length)
+
+    (seed,) = struct.unpack("<Q", take(8))
+    digest = take_bytes()
+    initial_save = take_bytes()
+    initial_world = take_bytes() if version >= 2 else None
+    initial_journal = take_bytes() if version >= 4 else None
+    (count,) = LENGTH.unpack(take(LENGTH.size))
+    answers = [take_bytes().decode() for _ in range(count)]
+    final_digest = take_bytes()
+    error = take_bytes().decode()
+    return Recording(seed, answers, initial_save, digest, final_digest, error, initial_world, initial_journal, version)
+
+
+# Recording and replaying
+def record(path, fsync="file"):
+    """Plays a normal console session and records it to `path`."""
+    from journal import JOURNAL_FILE
+    # A journal left by a crashed session is recovered from at startup, so it is part of the starting state
+    recording = Recording(random.SystemRandom().getrandbits(64), [], read_file(main.SAVE_FILE), content_digest(),
+                          initial_world=read_file(main.WORLD_FILE), initial_journal=read_file(JOURNAL_FILE))
+    original_input = builtins.input
+
+    def recording_input(prompt=""):
+        answer = original_input(prompt)
+        recording.answers.append(answer)
+        return answer
+
+    builtins.input = recording_input
+    random.seed(recording.seed)
+    try:
+        main.main(fsync)
+    except BaseException as e:
+        recording.error = type(e).__name__
+        raise
+    finally:
+        builtins.input = original_input
+        recording.final_digest = save_digest()
+        write_recording(path, recording)
+    return recording
+
+
+def replay(recording):
+    """
+    Re-runs a recorded session without terminal I/O. Raises ReplayError if
+    it does not leave the recorded save behind (or end with the recorded error).
+    Recordings from before BINARY_SAVES only check how the session ended.
+    """
+    from journal import JOURNAL_FILE
+    answers = iter(recording.answers)
+
+    def replay_input(prompt=""):
+        try:
+            return next(answers)
+        except StopIteration:
+            raise EOFError("recorded input ended") from None
+
+    cwd = os.getcwd()
+    original_input = builtins.input
+    token = main.output.set(NullRenderer())
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        for path, data in ((main.SAVE_FILE, recording.initial_save), (main.WORLD_FILE, recording.initial_world),
+                           (JOURNAL_FILE, recording.initial_journal)):
+            if data is not None:
+                with open(path, "wb") as file:
+                    file.write(data)
+        builtins.input = replay_input
+        random.seed(recording.seed)
+        error = None
+        try:
+            main.main(fsync="none")
+        except Exception as e:
+            error = type(e).__name__
+        finally:
+            builtins.input = original_input
+            main.output.reset(token)
+            digest = save_digest()
+            os.chdir(cwd)
+
+    if recording.error:
+        expected = "EOFError" if recording.error in INPUT_ENDED else recording.error
+        if error != expected:
+            raise ReplayError(f"expected the session to end with {expected}, got {error or 'a normal exit'}")
+    elif error:
+        raise ReplayError(f"replay raised {error}, the recorded session exited normally")
+    if recording.version >= BINARY_SAVES and digest != recording.final_digest:
+        raise ReplayError("final character state differs from the recording")
+
+
+def check_file(path):
+    """Replays one file; returns (path, error message or None, content changed)."""
+    recording = read_recording(path)
+    content_changed = bool(recording.content_digest) and recording.content_digest != content_digest()
+    try:
+        replay(recording)
+    except ReplayError as e:
+        return path, str(e), content_changed
+    return path, None, content_changed
+
+
+def replay_files(paths, jobs=1):
+    if jobs > 1:
+        with ProcessPoolExecutor(jobs) as pool:
+            yield from pool.map(check_file, paths, chunksize=max(1, len(paths) // (jobs * 8)))
+    else:
+        yield from map(check_file, paths)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Record game sessions and replay them deterministically.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    record_parser = commands.add_parser("record", help="play a session and record it")
+    record_parser.add_argument("path")
+    replay_parser = commands.add_parser("replay", help="replay recordings and check their final state")
+    replay_parser.add_argument("paths", nargs="+")
+    replay_parser.add_argument("--jobs", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.command == "record":
+        try:
+            record(args.path)
+        except (EOFError, KeyboardInterrupt):
+            print()
+        print(f"Session recorded to {args.path}")
+        return
+
+    start = time.perf_counter()
+    failures = 0
+    for path, error, content_changed in replay_files(args.paths, args.jobs):
+        note = " (content pack changed since recording)" if content_changed else ""
+        if error:
+            failures += 1
+            print(f"FAIL {path}: {error}{note}")
+        elif note:
+            print(f"ok   {path}{note}")
+    elapsed = time.perf_counter() - start
+    print(f"{len(args.paths) - failures}/{len(args.paths)} sessions matched in {elapsed:.2f}s")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,272 @@
+"""
+Binary character saves.
+
+A save is a fixed-size header followed by two sections:
+
+    header      "ADVSAV", format version (uint16), the seven stats (int32),
+                the meta section's length, the inventory's entry count,
+                length and CRC-32 (uint32 each), and a CRC-32 of the
+                header and meta section
+    meta        compact JSON of every other field: name, current weapon,
+                status effects, world, ...
+    inventory   one tagged entry per inventory slot (see encode_item())
+
+load() reads only the header and the meta section. The inventory comes
+back as an inventory.LazyInventory: its section is read, checked and
+decoded the first time the inventory is used, and a character whose
+inventory was never touched is saved again by copying the section as is.
+Loading a character with a huge inventory costs the same as a small one
+until the inventory is needed.
+
+Saves from before this format are JSON in one of two shapes, which are
+migrated one schema at a time: school_project.py's (schema 0, weapons
+without durability, potions as {"name": ...}) to main.py's JSON (schema
+1) to a character.
+"""
+import json
+import struct
+import zlib
+
+from engine import Weapon, character_from_json, equipped_position, item_from_json, item_to_json, weapon_specs
+from inventory import LazyInventory, Stack
+
+MAGIC = b"ADVSAV"
+VERSION = 1
+
+# Legacy JSON schemas
+SCHOOL_SCHEMA = 0
+JSON_SCHEMA = 1
+# Durability given to school_project.py weapons, which never wore down
+LEGACY_DURABILITY = 15
+
+STATS = ("health", "strength", "intelligence", "dexterity", "level", "exp", "bonus_points")
+HEAD = struct.Struct("<6sH7iIIII")
+CRC = struct.Struct("<I")
+HEADER_SIZE = HEAD.size + CRC.size
+
+# Inventory entry tags
+STACK = 1       # uint16 length + stack type, int64 count
+WEAPON = 2      # uint16 length + registered spec id, int32 durability
+ITEM = 3        # uint32 length + item_to_json() of anything else, as JSON
+SHORT = struct.Struct("<BH")
+LONG = struct.Struct("<BI")
+COUNT = struct.Struct("<q")
+DURABILITY = struct.Struct("<i")
+
+
+# Inventory section
+def encode_item(item):
+    if isinstance(item, Stack):
+        kind = item.type.encode()
+        return SHORT.pack(STACK, len(kind)) + kind + COUNT.pack(item.count)
+    if isinstance(item, Weapon) and weapon_specs.get(item.spec.id) is item.spec:
+        spec_id = item.spec.id.encode()
+        return SHORT.pack(WEAPON, len(spec_id)) + spec_id + DURABILITY.pack(item.durability)
+    data = json.dumps(item_to_json(item), separators=(",", ":")).encode()
+    return LONG.pack(ITEM, len(data)) + data
+
+
+def decode_items(data):
+    """Yields the items of an inventory section."""
+    offset = 0
+    end = len(data)
+    while offset < end:
+        tag = data[offset]
+        if tag == ITEM:
+            _, length = LONG.unpack_from(data, offset)
+            offset += LONG.size
+            yield item_from_json(json.loads(data[offset:offset + length]))
+            offset += length
+            continue
+
+        _, length = SHORT.unpack_from(data, offset)
+        offset += SHORT.size
+        text = bytes(data[offset:offset + length]).decode()
+        offset += length
+        if tag == STACK:
+            (count,) = COUNT.unpack_from(data, offset)
+            offset += COUNT.size
+            yield Stack(text, count)
+        elif tag == WEAPON:
+            (durability,) = DURABILITY.unpack_from(data, offset)
+            offset += DURABILITY.size
+            yield Weapon.from_spec(weapon_specs[text], durability)
+        else:
+            raise ValueError(f"unknown inventory entry tag {tag}")
+
+
+class Section:
+    """
+    A save's inventory section, read (from `path` at `offset`) and checked
+    only when needed. The entry at position `equipped`, if any, is decoded
+    as `weapon`, the character's current weapon, so the two stay one object.
+    """
+    __slots__ = ("path", "offset", "length", "crc", "data", "equipped", "weapon")
+
+    def __init__(self, length, crc, data=None, path=None, offset=0):
+        self.length = length
+        self.crc = crc
+        self.data = data
+        self.path = path
+        self.offset = offset
+        self.equipped = None
+        self.weapon = None
+
+    def read(self):
+        if self.data is None:
+            with open(self.path, "rb") as file:
+                file.seek(self.offset)
+                data = file.read(self.length)
+            if len(data) != self.length or zlib.crc32(data) != self.crc:
+                raise ValueError(f"the inventory in {self.path} is damaged")
+            self.data = data
+        return self.data
+
+
+def read_section(section):
+    items = decode_items(section.read())
+    if section.equipped is None:
+        return items
+    return (section.weapon if position == section.equipped else item for position, item in enumerate(items))
+
+
+# Saving
+def dumps(character):
+    """The character as a binary save."""
+    inventory = character["inventory"]
+    weapon = character["current_weapon"]
+    if isinstance(inventory, LazyInventory) and not inventory.loaded:
+        section = inventory.source
+        entries = inventory.length
+        body = section.read()
+        body_crc = section.crc
+        equipped = section.equipped if weapon is not None and weapon is section.weapon else None
+    else:
+        entries = len(inventory)
+        body = b"".join(map(encode_item, inventory))
+        body_crc = zlib.crc32(body)
+        equipped = equipped_position(character)
+
+    meta = {field: value for field, value in character.items() if field not in STATS and field != "inventory"}
+    # The weapon is kept whole for readers that skip the inventory (analytics.py);
+    # its position makes it load as the inventory's own object
+    meta["current_weapon"] = item_to_json(weapon) if weapon else None
+    if equipped is not None:
+        meta["equipped"] = equipped
+    meta = json.dumps(meta, separators=(",", ":")).encode()
+
+    head = HEAD.pack(MAGIC, VERSION, *(character[stat] for stat in STATS), len(meta), entries, len(body), body_crc)
+    return head + CRC.pack(zlib.crc32(meta, zlib.crc32(head))) + meta + body
+
+
+# Loading
+def parse_header(header, meta, where):
+    _, version, *values = HEAD.unpack_from(header)
+    if version > VERSION:
+        raise ValueError(f"{where} was saved by a newer version of the game (format {version})")
+    meta_length, entries, length, body_crc = values[len(STATS):]
+    (crc,) = CRC.unpack_from(header, HEAD.size)
+    if len(meta) != meta_length or zlib.crc32(meta, zlib.crc32(header[:HEAD.size])) != crc:
+        raise ValueError(f"{where} is damaged")
+    return dict(zip(STATS, values)), json.loads(meta), entries, length, body_crc
+
+
+def build(stats, meta, entries, section):
+    character = {"name": meta.pop("name")}
+    character.update(stats)
+    weapon = meta.pop("current_weapon", None)
+    character["current_weapon"] = section.weapon = item_from_json(weapon) if weapon else None
+    # Saves from before "equipped" only have a copy of the equipped weapon
+    section.equipped = meta.pop("equipped", None)
+    character["inventory"] = LazyInventory(section, entries, read_section)
+    character.update(meta)
+    character.setdefault("effects", [])
+    character.setdefault("world", None)
+    return character
+
+
+def loads(data):
+    """A character from save bytes: binary, or JSON in either legacy shape."""
+    data = bytes(data)
+    if not data.startswith(MAGIC):
+        return migrate(json.loads(data))
+    if len(data) < HEADER_SIZE:
+        raise ValueError("the save is damaged")
+    meta_length = HEAD.unpack_from(data)[-4]
+    meta = data[HEADER_SIZE:HEADER_SIZE + meta_length]
+    stats, meta, entries, length, body_crc = parse_header(data[:HEADER_SIZE], meta, "the save")
+    body = data[HEADER_SIZE + meta_length:HEADER_SIZE + meta_length + length]
+    if len(body) != length or zlib.crc32(body) != body_crc:
+        raise ValueError("the save's inventory is damaged")
+    return build(stats, meta, entries, Section(length, body_crc, body))
+
+
+def load(path):
+    """
+    Reads a character saved at `path`, binary or legacy JSON. For a binary
+    save only the header and meta section are read here.
+    """
+    with open(path, "rb") as file:
+        header = file.read(HEADER_SIZE)
+        if not header.startswith(MAGIC):
+            return migrate(json.loads(header + file.read()))
+        if len(header) < HEADER_SIZE:
+            raise ValueError(f"{path} is damaged")
+        meta_length = HEAD.unpack_from(header)[-4]
+        meta = file.read(meta_length)
+    stats, meta, entries, length, body_crc = parse_header(header, meta, path)
+    return build(stats, meta, entries, Section(length, body_crc, path=path, offset=HEADER_SIZE + meta_length))
+
+
+# Migrating legacy JSON saves
+def schema(data):
+    """The schema of a legacy JSON save: SCHOOL_SCHEMA or JSON_SCHEMA."""
+    items = list(data.get("inventory") or ())
+    if data.get("current_weapon"):
+        items.append(data["current_weapon"])
+    for item in items:
+        if isinstance(item, dict):
+            if "damage_range" in item and "durability" not in item:
+                return SCHOOL_SCHEMA    # a school_project.py weapon
+            if "name" in item and "damage_range" not in item and "type" not in item:
+                return SCHOOL_SCHEMA    # a school_project.py potion
+    return JSON_SCHEMA
+
+
+def school_weapon(item):
+    return {
+        "name": item["name"],
+        "damage_range": list(item["damage_range"]),
+        "durability": LEGACY_DURABILITY,
+        "critical_hit_chance": 0.1,
+        "special_effects": [],
+    }
+
+
+def migrate_school(data):
+    """school_project.py save (schema 0) -> main.py JSON save (schema 1)."""
+    data = dict(data)
+    inventory = []
+    for item in data.get("inventory") or ():
+        if isinstance(item, dict) and "damage_range" in item:
+            inventory.append(school_weapon(item))
+        elif isinstance(item, dict):
+            inventory.append(item["name"])
+        else:
+            inventory.append(item)
+    data["inventory"] = inventory
+    if data.get("current_weapon"):
+        data["current_weapon"] = school_weapon(data["current_weapon"])
+    return data
+
+
+MIGRATIONS = {SCHOOL_SCHEMA: migrate_school}
+
+
+def migrate(data):
+    """A character from a legacy JSON save of any schema."""
+    version = schema(data)
+    while version < JSON_SCHEMA:
+        data = MIGRATIONS[version](data)
+        version += 1
+    return character_from_json(data)
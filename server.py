@@ -0,0 +1,211 @@
+"""
+Asyncio game server: many players share one process and one event loop.
+
+Every connection gets its own character and random.Random (an independent
+stream derived from the server's seed) and drives the same game flows as
+main.py, one answer at a time. Output for a turn is collected and sent as
+a single write together with the next prompt, and the character sheet only
+sends the lines that changed since the last turn.
+
+With --store, characters are kept in a CharacterStore by name: a player
+who comes back under the same name continues that character, and it is
+saved when their connection ends. A name plays one session at a time; a
+second login under a name that is still playing is turned away, so two
+sessions never save over each other.
+
+The content pack (content/default.json) is loaded at startup and checked
+for edits every few seconds; an edit applies from each session's next turn.
+
+    python server.py --port 4000
+    python server.py --store characters.db
+    python server.py --unix /tmp/adventure.sock
+    python server.py --metrics-port 9400 --metrics-file adventure.prom
+"""
+import argparse
+import asyncio
+import itertools
+import random
+
+import metrics
+from agent import Agent
+from characters import Character
+from content import RELOAD_INTERVAL, load_default_content, poll
+from main import METRICS_INTERVAL, advisor, create_character_flow, game_loop_flow, output, say
+from renderer import Renderer
+from streams import StreamFactory
+
+
+class Session:
+    """One player's game, advanced by step() with each line they send."""
+
+    def __init__(self, rng=None, diff=True, agent=None, store=None, playing=None):
+        self.rng = rng or random.Random()
+        self.agent = agent
+        self.store = store
+        # Names with a live session, shared by every session using `store`
+        self.playing = set() if playing is None else playing
+        self.name = None    # the name this session holds in `playing`
+        self.character = None
+        self.done = False
+        self.sent = []
+        self.renderer = Renderer(self.sent.append, diff=diff)
+        self.flow = self.run()
+
+    def run(self):
+        character = yield from create_character_flow()
+        if self.store is not None:
+            if character["name"] in self.playing:
+                say(f"{character['name']} is already playing. Log in again once that game has ended.")
+                return
+            self.name = character["name"]
+            self.playing.add(self.name)
+            saved = self.store.load(character["name"])
+            if saved is not None:
+                say(f"Welcome back, {saved['name']}!")
+                character = saved
+        self.character = Character.from_dict(character)
+        yield from game_loop_flow(self.character, self.rng)
+
+    def step(self, answer=None):
+        """
+        Resumes the game with the player's answer (None to start it) and
+        returns all output up to and including the next prompt.
+        """
+        token = output.set(self.renderer)
+        advised = advisor.set(self.agent)
+        prompt = ""
+        started = metrics.start()
+        try:
+            prompt = next(self.flow) if answer is None else self.flow.send(answer)
+        except StopIteration:
+            self.done = True
+        finally:
+            advisor.reset(advised)
+            output.reset(token)
+            self.renderer.flush(prompt)
+            metrics.observe_since("session_step_seconds", started)
+
+        text = "".join(self.sent)
+        self.sent.clear()
+        return text
+
+    def save(self):
+        if self.store is not None and self.character is not None:
+            self.store.save(self.character)
+
+    def leave(self):
+        """Saves the character and lets its name log in again."""
+        try:
+            self.save()
+        finally:
+            self.playing.discard(self.name)
+
+
+async def handle_client(reader, writer, idle_timeout=None, rng=None, diff=True, agent=None, store=None,
+                        playing=None):
+    session = Session(rng, diff, agent, store, playing)
+    metrics.count("sessions_total")
+    try:
+        await converse(session, reader, writer, idle_timeout)
+    finally:
+        session.leave()
+
+
+async def converse(session, reader, writer, idle_timeout=None):
+    """Plays a session over a connection until the game ends or the player leaves."""
+    try:
+        writer.write(session.step().encode())
+        while not session.done:
+            await writer.drain()
+            line = await asyncio.wait_for(reader.readline(), idle_timeout)
+            if not line:
+                break
+            answer = line.decode(errors="replace").rstrip("\r\n")
+            writer.write(session.step(answer).encode())
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def write_metrics(path, interval=METRICS_INTERVAL):
+    while True:
+        await asyncio.sleep(interval)
+        metrics.write(path)
+
+
+async def reload_content(pack, interval=RELOAD_INTERVAL):
+    # Sessions read the tables on every call, so an edited pack applies from their next turn
+    while True:
+        await asyncio.sleep(interval)
+        poll(pack)
+
+
+async def serve(host="127.0.0.1", port=4000, unix_path=None, idle_timeout=None, seed=None, diff=True,
+                metrics_file=None, agent=None, store=None, pack=None):
+    streams = StreamFactory(seed)
+    session_ids = itertools.count()
+    playing = set()
+
+    def client_connected(reader, writer):
+        return handle_client(reader, writer, idle_timeout, streams.stream("session", next(session_ids)), diff, agent,
+                             store, playing)
+
+    if unix_path:
+        server = await asyncio.start_unix_server(client_connected, unix_path, backlog=1024)
+    else:
+        server = await asyncio.start_server(client_connected, host, port, backlog=1024)
+
+    for sock in server.sockets:
+        print(f"Serving on {sock.getsockname()}")
+    writer = asyncio.create_task(write_metrics(metrics_file)) if metrics_file else None
+    reloader = asyncio.create_task(reload_content(pack)) if pack else None
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if reloader:
+            reloader.cancel()
+        if writer:
+            writer.cancel()
+            metrics.write(metrics_file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Host many game sessions in one process.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4000)
+    parser.add_argument("--unix", help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--idle-timeout", type=float, default=None, help="disconnect players idle this many seconds")
+    parser.add_argument("--seed", type=int, default=None, help="root seed for the per-session random streams")
+    parser.add_argument("--full-frames", action="store_true", help="resend the whole character sheet every turn")
+    parser.add_argument("--metrics-port", type=int, default=None, help="serve Prometheus metrics on this port")
+    parser.add_argument("--metrics-file", help="write Prometheus metrics to this file every few seconds")
+    parser.add_argument("--advisor", type=float, default=None, metavar="MS",
+                        help="show every player the advisor's suggestions, searching this many milliseconds each")
+    parser.add_argument("--store", help="keep characters by name in this SQLite file between connections")
+    args = parser.parse_args()
+
+    if args.metrics_port is not None or args.metrics_file:
+        metrics.enable()
+    if args.metrics_port is not None:
+        metrics.serve(args.metrics_port, args.host)
+    agent = Agent(args.advisor / 1000) if args.advisor is not None else None
+    pack = load_default_content()
+    store = None
+    if args.store:
+        from store import CharacterStore
+        store = CharacterStore(args.store)
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.idle_timeout, args.seed, not args.full_frames,
+                          args.metrics_file, agent, store, pack))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if store is not None:
+            store.close()
+
+
+if __name__ == "__main__":
+    main()
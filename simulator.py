@@ -0,0 +1,172 @@
+"""
+Headless battle simulator used for balancing weapons and enemies.
+
+Fights are resolved with the same rolls main.battle() uses, but without
+input() or print(), so millions of them can be run in a batch. The player
+follows a fixed policy: attack every turn, and drink a Health Potion
+instead whenever health is at or below `heal_below` and potions are left.
+"""
+import argparse
+import random
+from collections import Counter
+
+import main as game
+from effects import EffectEngine
+from main import (
+    MAX_HEALTH,
+    enemy_max_health,
+    roll_enemy_damage,
+    roll_potion_heal,
+    roll_unarmed_damage,
+    unique_weapons,
+)
+from streams import StreamFactory
+
+
+def explore_strengths():
+    """The enemy strengths explore_area() rolls, read per call as a content pack can change them."""
+    low, high = game.EXPLORE_STRENGTH
+    return range(low, high + 1)
+
+
+def simulate_fight(health, weapon, enemy_strength, rng, potions=0, heal_below=0):
+    """
+    Plays one fight and returns (won, turns, health_left, durability_used).
+    The weapon itself is never modified; its durability is tracked locally.
+    Status effects are applied as in battle(), but only fights where they
+    can occur pay for an EffectEngine.
+    """
+    enemy_health = enemy_max_health(enemy_strength)
+    durability = weapon.durability if weapon else 0
+    durability_used = 0
+    turns = 0
+    weapon_effects = weapon.special_effects if weapon else ()
+    effects = EffectEngine() if weapon_effects else None
+
+    while enemy_health > 0 and health > 0:
+        turns += 1
+        if potions and health <= heal_below:
+            potions -= 1
+            health = min(health + roll_potion_heal(rng), MAX_HEALTH)
+        else:
+            # Mirrors use_weapon(): a weapon at 0 durability stays equipped but deals nothing
+            if weapon is None:
+                damage = roll_unarmed_damage(rng)
+            elif durability > 0:
+                durability -= 1
+                durability_used += 1
+                damage = weapon.roll_damage(rng)[0]
+                if effects:
+                    damage = effects.damage_taken("enemy", damage)
+                    effects.roll("enemy", weapon_effects, rng)
+            else:
+                damage = 0
+
+            enemy_health -= damage
+            if enemy_health <= 0:
+                break
+
+        health -= roll_enemy_damage(enemy_strength, rng)
+        if effects and health > 0:
+            for _, _, damage in effects.tick()[0]:
+                enemy_health -= damage
+
+    return enemy_health <= 0 and health > 0, turns, max(0, health), durability_used
+
+
+def simulate_battles(character, weapon, enemy_strength, fights=10000, potions=0, heal_below=0, seed=None, rng=None):
+    """
+    Runs a batch of fights for one character, weapon and enemy strength.
+
+    Returns a dict with the win rate and histograms (Counters) of turn count
+    and health remaining at the end of each fight.
+    """
+    if rng is None:
+        rng = random.Random(seed)
+
+    health = character["health"]
+    wins = 0
+    durability_used = 0
+    turns = Counter()
+    hp_remaining = Counter()
+
+    for _ in range(fights):
+        won, fight_turns, health_left, used = simulate_fight(
+            health, weapon, enemy_strength, rng, potions, heal_below
+        )
+        wins += won
+        durability_used += used
+        turns[fight_turns] += 1
+        hp_remaining[health_left] += 1
+
+    return {
+        "weapon": weapon.name if weapon else None,
+        "enemy_strength": enemy_strength,
+        "fights": fights,
+        "wins": wins,
+        "win_rate": wins / fights if fights else 0.0,
+        "mean_turns": mean(turns),
+        "mean_hp_remaining": mean(hp_remaining),
+        "mean_durability_used": durability_used / fights if fights else 0.0,
+        "turns": turns,
+        "hp_remaining": hp_remaining,
+    }
+
+
+def sweep(character, weapons=None, strengths=None, fights=10000, potions=0, heal_below=0, seed=None):
+    """
+    Simulates every weapon (plus bare hands) against every enemy strength
+    (by default, every strength explore_area() rolls). Each pair draws from
+    its own stream, so results for a pair do not depend on which other
+    pairs are simulated or in what order.
+    """
+    if weapons is None:
+        weapons = [None] + unique_weapons
+    if strengths is None:
+        strengths = explore_strengths()
+    streams = StreamFactory(seed)
+    return [
+        simulate_battles(
+            character, weapon, strength, fights, potions, heal_below,
+            rng=streams.stream("fights", weapon.name if weapon else None, strength),
+        )
+        for weapon in weapons
+        for strength in strengths
+    ]
+
+
+def mean(histogram):
+    total = sum(histogram.values())
+    if not total:
+        return 0.0
+    return sum(value * count for value, count in histogram.items()) / total
+
+
+def print_report(results):
+    print(f"{'Weapon':<20}{'Enemy':>6}{'Win %':>8}{'Turns':>8}{'HP left':>9}{'Dur used':>10}")
+    for result in results:
+        print(
+            f"{result['weapon'] or 'Fists':<20}{result['enemy_strength']:>6}"
+            f"{result['win_rate'] * 100:>8.1f}{result['mean_turns']:>8.2f}"
+            f"{result['mean_hp_remaining']:>9.1f}{result['mean_durability_used']:>10.2f}"
+        )
+
+
+def main():
+    from content import load_default_content
+
+    load_default_content()
+    parser = argparse.ArgumentParser(description="Simulate battles for every weapon and enemy strength.")
+    parser.add_argument("--fights", type=int, default=10000, help="fights per weapon/enemy pair")
+    parser.add_argument("--health", type=int, default=MAX_HEALTH, help="starting player health")
+    parser.add_argument("--potions", type=int, default=0, help="Health Potions carried into each fight")
+    parser.add_argument("--heal-below", type=int, default=30, help="drink a potion at or below this health")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    character = {"health": args.health}
+    print_report(sweep(character, fights=args.fights, potions=args.potions, heal_below=args.heal_below, seed=args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Exact battle odds for main.battle().
+
+A fight is a small Markov chain over (player health, enemy health, weapon
+durability, potions left, the enemy's status effects). The player follows
+the same policy as simulator.py: attack every turn, or drink a Health Potion
+when health is at or below `heal_below`. Every state is evaluated once and
+memoized in a bounded LRU cache, so repeated queries (such as an in-game
+odds hint) are answered from the cache.
+
+The enemy's status effects are one (stacks, turns left) pair per special
+effect of the weapon, so hits landing them, Armor Pierce scaling hits and
+damage ticking after the enemy's turn are all part of the chain. Enemies
+inflict no effects, so the player never has any.
+"""
+import sys
+from functools import lru_cache
+
+from effects import EFFECTS
+from main import (
+    MAX_HEALTH,
+    POTION_HEAL,
+    UNARMED_DAMAGE,
+    enemy_damage_cap,
+    enemy_max_health,
+)
+
+CACHE_SIZE = 1 << 18
+
+WIN = (1.0, 0.0, 0.0)
+LOSS = (0.0, 0.0, 0.0)
+
+
+def uniform(low, high):
+    p = 1.0 / (high - low + 1)
+    return tuple((value, p) for value in range(low, high + 1))
+
+
+@lru_cache(maxsize=None)
+def damage_distribution(weapon_key):
+    """Returns ((damage, probability), ...) for one attack with a weapon (or fists if None)."""
+    if weapon_key is None:
+        return uniform(*UNARMED_DAMAGE)
+    low, high, critical_hit_chance, _ = weapon_key
+    outcomes = {}
+    for damage, p in uniform(low, high):
+        outcomes[damage] = outcomes.get(damage, 0.0) + p * (1 - critical_hit_chance)
+        outcomes[damage * 2] = outcomes.get(damage * 2, 0.0) + p * critical_hit_chance
+    return tuple(outcomes.items())
+
+
+# Status effects on the enemy
+def weapon_effects(weapon_key):
+    return () if weapon_key is None else weapon_key[3]
+
+
+def no_statuses(weapon_key):
+    """The enemy's statuses at the start of a fight: none of the weapon's effects active."""
+    return ((0, 0),) * len(weapon_effects(weapon_key))
+
+
+def enemy_statuses(weapon_key, statuses):
+    """The enemy's statuses from EffectEngine.statuses() data, one (stacks, turns left) per weapon effect."""
+    active = {status["name"]: (status["stacks"], status["turns"]) for status in statuses}
+    return tuple(active.get(name, (0, 0)) for name in weapon_effects(weapon_key))
+
+
+@lru_cache(maxsize=None)
+def hit_distribution(weapon_key, statuses):
+    """damage_distribution() with hits scaled by the enemy's active effects, as EffectEngine.damage_taken() does."""
+    outcomes = damage_distribution(weapon_key)
+    for name, (_, turns) in zip(weapon_effects(weapon_key), statuses):
+        scale = EFFECTS[name].damage_taken
+        if turns and scale != 1.0:
+            scaled = {}
+            for damage, p in outcomes:
+                scaled[int(damage * scale)] = scaled.get(int(damage * scale), 0.0) + p
+            outcomes = tuple(scaled.items())
+    return outcomes
+
+
+@lru_cache(maxsize=None)
+def landed_distribution(effects, statuses):
+    """Returns ((statuses, probability), ...) after a hit rolls each effect's chance to land."""
+    outcomes = {(): 1.0}
+    for name, (stacks, turns) in zip(effects, statuses):
+        spec = EFFECTS[name]
+        landed = (min(stacks + 1, spec.max_stacks) if turns else 1, spec.duration)
+        rolled = {}
+        for before, p in outcomes.items():
+            for status, q in ((landed, spec.chance), ((stacks, turns), 1 - spec.chance)):
+                if q:
+                    rolled[before + (status,)] = rolled.get(before + (status,), 0.0) + p * q
+        outcomes = rolled
+    return tuple(outcomes.items())
+
+
+@lru_cache(maxsize=None)
+def tick_statuses(effects, statuses):
+    """Returns (damage dealt to the enemy, statuses after) for the tick at the end of a turn."""
+    damage = 0
+    after = []
+    for name, (stacks, turns) in zip(effects, statuses):
+        if turns:
+            damage += EFFECTS[name].damage * stacks
+            turns -= 1
+            if not turns:
+                stacks = 0
+        after.append((stacks, turns))
+    return damage, tuple(after)
+
+
+# The chain
+@lru_cache(maxsize=CACHE_SIZE)
+def player_turn(health, enemy_health, durability, potions, statuses, weapon_key, enemy_strength, heal_below):
+    """Returns (win probability, expected turns, expected durability used) from the start of a turn."""
+    if enemy_health <= 0:
+        return WIN
+    if health <= 0:
+        return LOSS
+
+    if potions and health <= heal_below:
+        win = turns = used = 0.0
+        for heal, p in uniform(*POTION_HEAL):
+            w, t, u = enemy_turn(
+                min(health + heal, MAX_HEALTH), enemy_health, durability, potions - 1, statuses,
+                weapon_key, enemy_strength, heal_below,
+            )
+            win += p * w
+            turns += p * t
+            used += p * u
+        return win, 1.0 + turns, used
+
+    rolls = ((statuses, 1.0),)
+    if weapon_key is None:
+        outcomes, cost = damage_distribution(None), 0
+    elif durability > 0:
+        outcomes, cost = hit_distribution(weapon_key, statuses), 1
+        rolls = landed_distribution(weapon_effects(weapon_key), statuses)
+        durability -= 1
+    else:
+        # A broken weapon stays equipped and deals no damage
+        outcomes, cost = ((0, 1.0),), 0
+
+    win = turns = used = 0.0
+    for damage, p in outcomes:
+        if enemy_health - damage <= 0:
+            win += p
+            continue
+        for after, q in rolls:
+            w, t, u = enemy_turn(
+                health, enemy_health - damage, durability, potions, after,
+                weapon_key, enemy_strength, heal_below,
+            )
+            win += p * q * w
+            turns += p * q * t
+            used += p * q * u
+    return win, 1.0 + turns, cost + used
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def enemy_turn(health, enemy_health, durability, potions, statuses, weapon_key, enemy_strength, heal_below):
+    # The enemy attacks, then the effects on it tick
+    tick, after = tick_statuses(weapon_effects(weapon_key), statuses)
+    win = turns = used = 0.0
+    for damage, p in uniform(1, enemy_damage_cap(enemy_strength)):
+        if health - damage <= 0:
+            continue
+        if enemy_health - tick <= 0:
+            win += p
+            continue
+        w, t, u = player_turn(
+            health - damage, enemy_health - tick, durability, potions, after,
+            weapon_key, enemy_strength, heal_below,
+        )
+        win += p * w
+        turns += p * t
+        used += p * u
+    return win, turns, used
+
+
+def weapon_key(weapon):
+    if weapon is None:
+        return None
+    effects = tuple(name for name in weapon.special_effects if name in EFFECTS)
+    return (weapon.damage_range[0], weapon.damage_range[1], weapon.critical_hit_chance, effects)
+
+
+def solve_battle(character, weapon, enemy_strength, potions=0, heal_below=0):
+    """
+    Computes the exact outcome of a fight with the attack/potion policy.
+
+    Returns a dict with the win probability, expected number of turns and
+    expected weapon durability consumed.
+    """
+    health = character["health"]
+    durability = weapon.durability if weapon else 0
+
+    # Every turn costs the player at least 1 health, so the chain is at most this deep
+    depth = 2 * (health + potions * POTION_HEAL[1]) + 100
+    if sys.getrecursionlimit() < depth:
+        sys.setrecursionlimit(depth)
+
+    key = weapon_key(weapon)
+    win, turns, used = player_turn(
+        health, enemy_max_health(enemy_strength), durability, potions, no_statuses(key),
+        key, enemy_strength, heal_below,
+    )
+    return {
+        "win_probability": win,
+        "expected_turns": turns,
+        "expected_durability_used": used,
+    }
+
+
+def battle_odds(character, enemy_strength):
+    """Chance that `character` wins by attacking every turn with the equipped weapon."""
+    return solve_battle(character, character["current_weapon"], enemy_strength)["win_probability"]
+
+
+def clear_cache():
+    player_turn.cache_clear()
+    enemy_turn.cache_clear()
+    hit_distribution.cache_clear()
+    landed_distribution.cache_clear()
+    tick_statuses.cache_clear()
+
+
+def cache_info():
+    return player_turn.cache_info(), enemy_turn.cache_info()
@@ -0,0 +1,195 @@
+"""
+SQLite character store holding many characters keyed by name.
+
+Each character field is a row in `fields` and each inventory slot a row in
+`inventory`, keyed by the Inventory's stable slot id. The store remembers
+what it last wrote for every character, so save() only writes the fields
+and inventory slots that changed since then. Once it has saved or loaded
+an Inventory object it only looks at the slots the Inventory reports as
+changed (plus the equipped weapon's, which wears down in place), so the
+cost of a save depends on what changed, not on the size of the inventory.
+
+    store = CharacterStore("characters.db")
+    store.save(character)
+    character = store.load("Bob")
+"""
+import json
+import sqlite3
+
+from inventory import Inventory, Stack
+from main import Weapon, character_from_json, item_from_json, item_to_json
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS characters (
+    name TEXT PRIMARY KEY
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS fields (
+    name TEXT NOT NULL,
+    field TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (name, field)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS inventory (
+    name TEXT NOT NULL,
+    slot INTEGER NOT NULL,
+    item TEXT NOT NULL,
+    PRIMARY KEY (name, slot)
+) WITHOUT ROWID;
+"""
+
+
+def dumps(value):
+    return json.dumps(value, separators=(",", ":"))
+
+
+def item_state(item):
+    # Weapons and stacks are the only entries that change after being added
+    if isinstance(item, Weapon):
+        return item.durability
+    if isinstance(item, Stack):
+        return item.count
+    return None
+
+
+class CharacterStore:
+    def __init__(self, path="characters.db", timeout=5.0):
+        # timeout: seconds a save waits for another connection's lock before failing
+        self.connection = sqlite3.connect(path, timeout=timeout)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        # name -> ({field: json}, {slot: (item, state, json)}, sync) as last written or read, where
+        # sync is [inventory object, its version then, equipped weapon, its slot] or None
+        self.saved = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def names(self):
+        return [name for (name,) in self.connection.execute("SELECT name FROM characters ORDER BY name")]
+
+    def save(self, character):
+        name = character["name"]
+        if name not in self.saved:
+            self.load_saved_state(name)
+        saved_fields, saved_inventory, sync = self.saved[name]
+        inventory = character["inventory"]
+        weapon = character["current_weapon"]
+        weapon_slot = self.weapon_slot(sync, inventory, weapon)
+
+        # Nothing is remembered as written until the transaction commits, so a failed save is retried in full
+        fields = {}
+        for field, value in character.items():
+            if field == "inventory":
+                continue
+            if field == "current_weapon" and value is not None:
+                # Its inventory slot, if any, makes it load as the inventory's own object
+                value = item_to_json(value) if weapon_slot is None else {**item_to_json(value), "slot": weapon_slot}
+            encoded = dumps(value)
+            if saved_fields.get(field) != encoded:
+                fields[field] = encoded
+
+        if sync is not None and sync[0] is inventory:
+            slots = set(inventory.changed_since(sync[1]))
+        else:
+            slots = saved_inventory.keys() | inventory.slots.keys()
+        if weapon_slot is not None:
+            slots.add(weapon_slot)
+        entries = {}    # slot -> (item, state, json) to remember
+        changed_slots = []
+        removed_slots = []
+        for slot in slots:
+            item = inventory.slots.get(slot)
+            saved = saved_inventory.get(slot)
+            if item is None:
+                if saved is not None:
+                    removed_slots.append((name, slot))
+                continue
+            state = item_state(item)
+            if saved is not None and saved[0] is item and saved[1] == state:
+                continue
+            encoded = dumps(item_to_json(item))
+            entries[slot] = (item, state, encoded)
+            if saved is None or encoded != saved[2]:
+                changed_slots.append((name, slot, encoded))
+
+        if fields or changed_slots or removed_slots:
+            with self.connection:
+                self.connection.execute("INSERT OR IGNORE INTO characters (name) VALUES (?)", (name,))
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO fields VALUES (?, ?, ?)",
+                    [(name, field, encoded) for field, encoded in fields.items()],
+                )
+                self.connection.executemany("INSERT OR REPLACE INTO inventory VALUES (?, ?, ?)", changed_slots)
+                self.connection.executemany("DELETE FROM inventory WHERE name = ? AND slot = ?", removed_slots)
+        saved_fields.update(fields)
+        saved_inventory.update(entries)
+        for _, slot in removed_slots:
+            del saved_inventory[slot]
+        self.remember(name, inventory, weapon, weapon_slot)
+
+    def load(self, name):
+        """Returns the character saved under `name`, or None if there is none."""
+        saved_fields, saved_inventory, _ = self.load_saved_state(name)
+        if not saved_fields:
+            return None
+        character_data = {field: json.loads(value) for field, value in saved_fields.items()}
+        character_data["inventory"] = []
+        weapon = character_data.get("current_weapon")
+        equipped = weapon.pop("slot", None) if isinstance(weapon, dict) else None
+        character = character_from_json(character_data)
+        character["inventory"] = inventory = Inventory.restore(
+            (slot, item_from_json(json.loads(encoded))) for slot, (_, _, encoded) in saved_inventory.items()
+        )
+        if equipped is not None:
+            character["current_weapon"] = inventory.slots[equipped]
+        # Remember the loaded objects so an unchanged inventory costs nothing to save
+        self.remember(name, inventory, character["current_weapon"], equipped)
+        for slot in list(saved_inventory):
+            item = inventory.slots.get(slot)
+            encoded = saved_inventory[slot][2]
+            if item is None or isinstance(item, Stack) and dumps(item.to_json()) != encoded:
+                inventory.touch(slot)   # rows merged into one stack on load, rewrite them on the next save
+                continue
+            saved_inventory[slot] = (item, item_state(item), encoded)
+        return character
+
+    def remember(self, name, inventory, weapon, weapon_slot):
+        fields, slots, _ = self.saved[name]
+        self.saved[name] = (fields, slots, [inventory, inventory.version, weapon, weapon_slot])
+
+    @staticmethod
+    def weapon_slot(sync, inventory, weapon):
+        """The equipped weapon's inventory slot, or None; only searched for after it changes."""
+        if weapon is None:
+            return None
+        if sync is not None and sync[0] is inventory and sync[2] is weapon:
+            if sync[3] is not None and inventory.slots.get(sync[3]) is weapon:
+                return sync[3]
+            if sync[3] is None:
+                return next((slot for slot in inventory.changed_since(sync[1])
+                             if inventory.slots.get(slot) is weapon), None)
+        return next((slot for slot, item in inventory.items() if item is weapon), None)
+
+    def load_saved_state(self, name):
+        fields = dict(self.connection.execute("SELECT field, value FROM fields WHERE name = ?", (name,)))
+        inventory = {
+            slot: (None, None, encoded)
+            for slot, encoded in self.connection.execute(
+                "SELECT slot, item FROM inventory WHERE name = ? ORDER BY slot", (name,)
+            )
+        }
+        self.saved[name] = (fields, inventory, None)
+        return self.saved[name]
+
+    def delete(self, name):
+        self.saved.pop(name, None)
+        with self.connection:
+            for table in ("characters", "fields", "inventory"):
+                self.connection.execute(f"DELETE FROM {table} WHERE name = ?", (name,))
@@ -0,0 +1,60 @@
+"""The autoplay agent's choices on battles whose best move is clear."""
+import random
+
+import pytest
+
+import main
+from agent import ATTACK, KEEP, RUN, USE_TOOL, Agent, auto_battle
+from inventory import Inventory
+from renderer import NullRenderer
+
+
+def bot(health, weapon, potions=0, dexterity=10, items=()):
+    inventory = Inventory(["Health Potion"] * potions)
+    for item in items:
+        inventory.add(item)
+    return {
+        "name": "Bot", "health": health, "strength": 10, "intelligence": 10, "dexterity": dexterity,
+        "level": 1, "exp": 0, "bonus_points": 0, "current_weapon": weapon,
+        "inventory": inventory, "effects": [], "world": None,
+    }
+
+
+def weapon(spec_id):
+    return main.Weapon.from_spec(main.weapon_specs[spec_id])
+
+
+@pytest.fixture
+def agent():
+    return Agent(budget=0.05)
+
+
+def test_finishes_a_nearly_dead_enemy(agent):
+    assert agent.battle_action(bot(100, weapon("iron_sword")), enemy_health=1, enemy_strength=10) == ATTACK
+
+
+def test_drinks_a_potion_when_the_next_hit_could_kill(agent):
+    character = bot(4, weapon("iron_sword"), potions=2)
+    assert agent.battle_action(character, main.enemy_max_health(15), 15) == USE_TOOL
+
+
+def test_runs_from_a_fight_it_cannot_win(agent):
+    character = bot(4, None, dexterity=45)
+    assert agent.battle_action(character, main.enemy_max_health(15), 15) == RUN
+
+
+def test_equips_the_strongest_weapon(agent):
+    stick = main.Weapon("Stick", (1, 2), 5)
+    blade = weapon("legendary_blade")
+    assert agent.weapon_choice(bot(100, stick, potions=1, items=[stick, blade])) == "3"
+    assert agent.weapon_choice(bot(100, blade, potions=1, items=[stick, blade])) == KEEP
+
+
+def test_autoplay_wins_easy_battles():
+    token = main.output.set(NullRenderer())
+    try:
+        agent = Agent(budget=0.001)
+        won = [auto_battle(bot(100, weapon("iron_sword"), potions=2), 5, agent, random.Random(seed)) for seed in range(20)]
+    finally:
+        main.output.reset(token)
+    assert all(won)
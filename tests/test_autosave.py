@@ -0,0 +1,37 @@
+"""Atomic writes and the background autosaver."""
+import os
+import stat
+
+from autosave import UMASK, AutoSaver, write_atomic
+
+
+def mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+def test_new_file_gets_the_default_mode(tmp_path):
+    path = tmp_path / "save.sav"
+    write_atomic(str(path), b"one")
+    assert path.read_bytes() == b"one"
+    assert mode(path) == 0o666 & ~UMASK
+
+
+def test_replacing_keeps_the_file_mode(tmp_path):
+    path = tmp_path / "save.sav"
+    path.write_bytes(b"one")
+    os.chmod(path, 0o640)
+    write_atomic(str(path), b"two", fsync="full")
+    assert path.read_bytes() == b"two"
+    assert mode(path) == 0o640
+    assert os.listdir(tmp_path) == ["save.sav"]
+
+
+def test_autosaver_writes_the_latest_snapshot(tmp_path):
+    path = tmp_path / "save.json"
+    saver = AutoSaver(str(path), lambda character: dict(character), fsync="none")
+    character = {"exp": 0}
+    for exp in range(50):
+        character["exp"] = exp
+        saver.save(character)
+    saver.close()
+    assert path.read_text() == '{"exp": 49}'
@@ -0,0 +1,18 @@
+"""bench.py imports and every benchmark runs."""
+import pytest
+
+import bench
+
+
+@pytest.mark.parametrize("name", [name for name in bench.BENCHMARKS if "[100000]" not in name])
+def test_benchmark_runs(name, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with bench.scripted(["1"]):
+        bench.BENCHMARKS[name]()()
+
+
+def test_run_reports_speed_and_allocations():
+    results = bench.run(["generate_loot", "save_character[10]"], min_time=0.001, repeat=1)
+    for result in results.values():
+        assert result["ops_per_sec"] > 0
+        assert result["alloc_bytes"] >= 0
@@ -0,0 +1,56 @@
+"""Content pack validation and hot reloading."""
+import copy
+import json
+
+import pytest
+
+import main
+from content import DEFAULT_CONTENT, ContentError, ContentPack, poll
+from simulator import explore_strengths
+
+with open(DEFAULT_CONTENT) as file:
+    DEFAULT = json.load(file)
+
+
+@pytest.fixture
+def pack_file(tmp_path):
+    path = tmp_path / "pack.json"
+    path.write_text(json.dumps(DEFAULT))
+    yield path
+    ContentPack(DEFAULT_CONTENT, str(tmp_path / "cache")).apply()
+
+
+def edited(change):
+    data = copy.deepcopy(DEFAULT)
+    change(data)
+    return json.dumps(data)
+
+
+@pytest.mark.parametrize("change, message", [
+    (lambda data: data["weapons"][0].update(damage_range=[12, 8]), r"weapons\[0\]\.damage_range"),
+    (lambda data: data["loot"]["items"]["Rare"].append("weapon:nope"), "nope"),
+    (lambda data: data["enemies"].update(boss="strong"), "boss"),
+    (lambda data: data.update(spells=[]), "unknown sections"),
+])
+def test_invalid_packs_are_rejected(tmp_path, pack_file, change, message):
+    pack_file.write_text(edited(change))
+    with pytest.raises(ContentError, match=message):
+        ContentPack(str(pack_file), str(tmp_path / "cache")).load()
+
+
+def test_an_edited_pack_is_applied_on_the_next_check(tmp_path, pack_file, capsys):
+    pack = ContentPack(str(pack_file), str(tmp_path / "cache"))
+    pack.apply()
+    assert poll(pack) is False
+
+    pack_file.write_text(edited(lambda data: data["enemies"].update(explore=[7, 9])))
+    assert poll(pack) is True
+    assert main.EXPLORE_STRENGTH == (7, 9)
+    assert list(explore_strengths()) == [7, 8, 9]
+
+    # A broken edit is reported once and the running content stays
+    pack_file.write_text("{ not json")
+    assert poll(pack) is False
+    assert poll(pack) is False
+    assert capsys.readouterr().err.count("Content pack not reloaded") == 1
+    assert list(explore_strengths()) == [7, 8, 9]
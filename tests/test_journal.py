@@ -0,0 +1,91 @@
+"""Crash recovery from the journal main() keeps while a game runs."""
+import builtins
+import os
+import random
+
+import pytest
+
+import main
+import savefile
+from journal import JOURNAL_FILE, Journal
+from renderer import Renderer
+
+
+def run_main(monkeypatch, answers):
+    """Runs main() with these answers, then EOF; returns (its error or None, what it printed)."""
+    answers = iter(answers)
+
+    def answer(prompt=""):
+        try:
+            return next(answers)
+        except StopIteration:
+            raise EOFError from None
+
+    monkeypatch.setattr(builtins, "input", answer)
+    sent = []
+    token = main.output.set(Renderer(sent.append))
+    try:
+        main.main(fsync="none")
+        error = None
+    except EOFError as e:
+        error = e
+    finally:
+        main.output.reset(token)
+    return error, "".join(sent)
+
+
+@pytest.fixture
+def game_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv(main.ADVISOR_ENV, raising=False)
+    monkeypatch.delenv(main.METRICS_ENV, raising=False)
+    random.seed(3)
+    return tmp_path
+
+
+def test_crashed_session_is_recovered(game_dir, monkeypatch):
+    error, _ = run_main(monkeypatch, ["Ann"] + ["e", "1", "1", "1", "1", "1"] * 4)
+    assert error is not None
+    assert os.path.exists(JOURNAL_FILE)
+    crashed = Journal(JOURNAL_FILE).recover()
+    assert crashed["name"] == "Ann"
+
+    error, text = run_main(monkeypatch, ["q"])
+    assert error is None
+    assert "Recovered Ann from an interrupted session." in text
+    assert not os.path.exists(JOURNAL_FILE)
+    saved = savefile.load(main.SAVE_FILE)
+    for field in ("health", "exp", "level", "strength"):
+        assert saved[field] == crashed[field]
+    assert [main.item_to_json(item) for item in saved["inventory"]] == [
+        main.item_to_json(item) for item in crashed["inventory"]
+    ]
+
+
+def test_clean_exit_removes_the_journal(game_dir, monkeypatch):
+    error, text = run_main(monkeypatch, ["Ann", "q"])
+    assert error is None
+    assert not os.path.exists(JOURNAL_FILE)
+
+    _, text = run_main(monkeypatch, ["q"])
+    assert "Welcome back, Ann!" in text
+
+
+def test_journal_replays_events_after_the_snapshot(tmp_path):
+    path = str(tmp_path / JOURNAL_FILE)
+    character = main.character_from_json({
+        "name": "Bo", "health": 100, "strength": 10, "intelligence": 10, "dexterity": 10,
+        "level": 1, "exp": 0, "bonus_points": 0,
+    })
+    log = Journal(path, "none")
+    log.begin(character)
+    character["exp"] = 30
+    log.record("stats", "exp")
+    character["inventory"].add("Gold", 25)
+    log.record("added", "Gold", 25)
+    log.commit()
+    log.close()
+
+    recovered = Journal(path).recover()
+    assert recovered["exp"] == 30
+    assert recovered["inventory"].count("Gold") == 25
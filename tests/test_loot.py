@@ -0,0 +1,54 @@
+"""Alias-method loot tables."""
+import random
+from collections import Counter
+
+import pytest
+
+from loot import AliasSampler, LootTable
+
+ITEMS = {"Common": ["Gold", "Health Potion"], "Rare": ["Steel Helmet"], "Legendary": ["Crown"]}
+WEIGHTS = {"Common": 60, "Rare": 30, "Legendary": 10}
+
+
+def exact_probabilities(sampler):
+    """What sample() returns with, worked out from the sampler's columns."""
+    probabilities = [0.0] * sampler.size
+    for column in range(sampler.size):
+        kept = sampler.cutoffs[column] - column
+        probabilities[column] += kept / sampler.size
+        probabilities[sampler.aliases[column]] += (1 - kept) / sampler.size
+    return probabilities
+
+
+@pytest.mark.parametrize("weights", [[1], [1, 1, 1, 1], [0.2, 0.48, 0.24, 0.08], [5, 0, 1, 94], [1e-6, 1]])
+def test_the_alias_table_matches_the_weights(weights):
+    total = sum(weights)
+    assert exact_probabilities(AliasSampler(weights)) == pytest.approx([weight / total for weight in weights])
+
+
+def test_the_table_keeps_the_nested_rolls_chances():
+    table = LootTable(ITEMS, WEIGHTS, no_loot_chance=0.2)
+    chances = dict(zip(table.outcomes, exact_probabilities(table.sampler)))
+    assert chances[None, None] == pytest.approx(0.2)
+    assert chances["Common", "Gold"] == pytest.approx(0.8 * 0.6 / 2)
+    assert chances["Rare", "Steel Helmet"] == pytest.approx(0.8 * 0.3)
+    assert chances["Legendary", "Crown"] == pytest.approx(0.8 * 0.1)
+
+
+def test_rolls_follow_the_table():
+    table = LootTable(ITEMS, WEIGHTS, no_loot_chance=0.2)
+    rolls = 200000
+    counts = Counter(table.roll_many(rolls, random.Random(1)))
+    assert counts[None] / rolls == pytest.approx(0.2, abs=0.005)
+    assert counts["Crown"] / rolls == pytest.approx(0.08, abs=0.005)
+    assert counts["Gold"] / rolls == pytest.approx(0.24, abs=0.005)
+    assert table.roll(random.Random(1)) == table.outcomes[table.sampler.sample(random.Random(1))]
+
+
+def test_bad_weights_are_rejected():
+    with pytest.raises(ValueError):
+        AliasSampler([])
+    with pytest.raises(ValueError):
+        AliasSampler([0, 0])
+    with pytest.raises(ValueError):
+        AliasSampler([1, -1])
@@ -0,0 +1,78 @@
+"""Latency histograms and their Prometheus export."""
+import random
+
+import pytest
+
+import metrics
+from metrics import BUCKET_COUNT, MAX_VALUE, SUB_BUCKETS, Histogram, bucket_bounds, bucket_index
+
+
+@pytest.fixture
+def recording():
+    metrics.reset()
+    metrics.enable()
+    yield
+    metrics.disable()
+    metrics.reset()
+
+
+def test_buckets_tile_the_range_within_their_precision():
+    previous_high = 0
+    for index in range(BUCKET_COUNT):
+        low, high = bucket_bounds(index)
+        assert low == previous_high
+        assert bucket_index(low) == bucket_index(high - 1) == index
+        if low >= SUB_BUCKETS:
+            assert (high - low) / low <= 1 / SUB_BUCKETS
+        previous_high = high
+    assert bucket_index(MAX_VALUE) == BUCKET_COUNT - 1
+
+
+def test_quantiles_are_close_to_the_exact_ones():
+    rng = random.Random(2)
+    values = sorted(int(rng.lognormvariate(12, 2)) for _ in range(10000))
+    histogram = Histogram()
+    for value in values:
+        histogram.record(value)
+    assert histogram.count == len(values) and histogram.sum == sum(values) and histogram.max == values[-1]
+    for q in (0.5, 0.9, 0.99):
+        exact = values[int(q * len(values)) - 1]
+        assert histogram.quantile(q) == pytest.approx(exact, rel=1 / SUB_BUCKETS)
+    assert histogram.quantile(1.0) == values[-1]
+
+
+def test_out_of_range_values_are_clamped():
+    histogram = Histogram()
+    histogram.record(-5)
+    histogram.record(MAX_VALUE * 4)
+    assert histogram.counts[0] == 1 and histogram.counts[BUCKET_COUNT - 1] == 1
+    assert histogram.max == MAX_VALUE
+
+
+def test_the_export_is_prometheus_text(recording):
+    metrics.count("battles_total", 3)
+    for microseconds in (5, 5, 50, 5000):
+        metrics.observe("turn_seconds", microseconds * 1000)
+    text = metrics.snapshot()
+    lines = text.splitlines()
+
+    assert "# TYPE adventure_battles_total counter" in lines
+    assert "adventure_battles_total 3" in lines
+    assert "# TYPE adventure_turn_seconds histogram" in lines
+    buckets = [line for line in lines if line.startswith("adventure_turn_seconds_bucket")]
+    counts = [int(line.rsplit(" ", 1)[1]) for line in buckets]
+    assert counts == sorted(counts)
+    assert buckets[-1] == 'adventure_turn_seconds_bucket{le="+Inf"} 4'
+    assert 'adventure_turn_seconds_bucket{le="8.192e-06"} 2' in lines
+    assert "adventure_turn_seconds_count 4" in lines
+    assert "adventure_turn_seconds_sum 0.00506" in lines
+    assert "adventure_turn_seconds_max 0.005" in lines
+    assert text.endswith("\n")
+
+
+def test_nothing_is_recorded_while_disabled():
+    metrics.disable()
+    metrics.reset()
+    metrics.count("battles_total")
+    metrics.observe("turn_seconds", 1000)
+    assert metrics.snapshot() == "\n"
@@ -0,0 +1,89 @@
+"""Routing names to prefork workers."""
+import asyncio
+import os
+import socket
+
+import pytest
+
+import prefork
+from prefork import Directory, DirectoryFull, HostedSession, Router, save_path
+
+
+@pytest.fixture
+def router(tmp_path):
+    directory = Directory.create(f"adventure-test-{os.getpid()}", workers=2, capacity=16)
+    try:
+        yield Router(directory, str(tmp_path))
+    finally:
+        directory.close(unlink=True)
+
+
+def end_session(router, slot):
+    router.directory.cells[router.directory.entry(slot, "live")] = 0
+
+
+def test_a_live_name_waits_for_its_session_to_end(router):
+    worker, slot, moved = router.assign("Ann")
+    assert not moved
+    assert router.assign("Ann") is None
+
+    other = router.assign("Bo")
+    assert other is not None and other[1] != slot
+
+    end_session(router, slot)
+    assert router.assign("Ann")[1] == slot
+
+
+def test_a_name_stays_on_its_worker(router, monkeypatch):
+    monkeypatch.setattr(router, "alive", lambda worker: True)
+    worker, slot, _ = router.assign("Ann")
+    end_session(router, slot)
+    assert router.assign("Ann") == (worker, slot, False)
+
+
+def test_new_names_are_refused_once_the_directory_is_full(router):
+    for number in range(router.directory.capacity):
+        router.assign(f"Player {number}")
+    with pytest.raises(DirectoryFull):
+        router.assign("Latecomer")
+    assert router.assign("Player 3") is None     # known names still find their slot
+
+
+def routed(router, lines, close=False):
+    """Runs route() for a client that sends `lines`; returns what the client was told."""
+    client, player = socket.socketpair()
+    client.setblocking(False)
+    player.sendall(lines)
+    if close:
+        player.shutdown(socket.SHUT_WR)
+    asyncio.run(asyncio.wait_for(router.route(client), 5))
+    player.settimeout(1)
+    told = b""
+    while chunk := player.recv(4096):
+        told += chunk
+    player.close()
+    return told.decode()
+
+
+def test_a_waiting_login_gives_up_when_its_player_hangs_up(router):
+    router.assign("Ann")
+    assert "Waiting for that game to end" in routed(router, b"Ann\n", close=True)
+
+
+def test_a_waiting_login_gives_up_after_the_timeout(router, monkeypatch):
+    monkeypatch.setattr(prefork, "WAIT_TIMEOUT", 0.2)
+    router.assign("Ann")
+    assert "Ann is still playing" in routed(router, b"Ann\n")
+
+
+def test_a_hosted_session_continues_its_character(tmp_path):
+    path = save_path(str(tmp_path), "Ann")
+    first = HostedSession("Ann", path)
+    first.step()
+    assert first.character["name"] == "Ann"
+    first.character["exp"] = 25
+    first.save()
+
+    second = HostedSession("Ann", path)
+    assert "Welcome back, Ann!" in second.step()
+    assert second.character["exp"] == 25
@@ -0,0 +1,36 @@
+"""Renderers, and headless runs that skip building output."""
+import random
+
+import main
+from renderer import NullRenderer, Renderer
+from tests.test_savefile import new_character
+
+
+def fight(renderer, seed):
+    character = new_character()
+    character["current_weapon"] = character["inventory"][4]    # Dagger of Shadows: Bleed
+    token = main.output.set(renderer)
+    try:
+        flow = main.battle_flow(character, 18, random.Random(seed))
+        answers = iter(["1", "1", "2"] * 100)
+        prompt = next(flow)
+        while True:
+            prompt = flow.send(next(answers) if "1-3" in prompt else "2")     # a level-up's point goes to Strength
+    except StopIteration as stop:
+        return stop.value, main.character_to_json(character)
+    finally:
+        main.output.reset(token)
+
+
+def test_speaking_follows_the_renderer():
+    assert main.speaking()
+    token = main.output.set(NullRenderer())
+    try:
+        assert not main.speaking()
+    finally:
+        main.output.reset(token)
+
+
+def test_headless_battles_play_out_the_same():
+    for seed in range(20):
+        assert fight(NullRenderer(), seed) == fight(Renderer(lambda text: None), seed)
@@ -0,0 +1,65 @@
+"""Recording sessions and replaying them."""
+import builtins
+import struct
+import zlib
+
+import pytest
+
+import replay
+from replay import MAGIC, Recording, ReplayError, read_recording, write_recording
+from tests.test_journal import game_dir  # noqa: F401 (fixture)
+
+ANSWERS = ["Ann"] + ["e", "1", "1", "1", "1"] * 5
+
+
+def recorded(monkeypatch, path):
+    answers = iter(ANSWERS)
+
+    def answer(prompt=""):
+        try:
+            return next(answers)
+        except StopIteration:
+            raise EOFError from None
+
+    monkeypatch.setattr(builtins, "input", answer)
+    with pytest.raises(EOFError):
+        replay.record(path, fsync="none")
+    return read_recording(path)
+
+
+def test_a_recorded_session_replays_to_the_same_save(game_dir, monkeypatch):
+    recording = recorded(monkeypatch, str(game_dir / "session.rec"))
+    assert recording.answers == ANSWERS
+    assert recording.error == "EOFError"
+    assert recording.final_digest
+
+    replay.replay(recording)
+    recording.final_digest = bytes(32)
+    with pytest.raises(ReplayError, match="differs"):
+        replay.replay(recording)
+
+
+def test_recordings_round_trip(tmp_path):
+    path = str(tmp_path / "session.rec")
+    recording = Recording(7, ["Ann", "q"], b"save", b"content", b"final", "", b"world", b"journal")
+    write_recording(path, recording)
+    loaded = read_recording(path)
+    for field in ("version", "seed", "answers", "initial_save", "content_digest", "final_digest", "error",
+                  "initial_world", "initial_journal"):
+        assert getattr(loaded, field) == getattr(recording, field)
+
+
+def test_version_1_recordings_still_read(tmp_path):
+    path = str(tmp_path / "old.rec")
+    body = struct.pack("<Q", 7) + replay.pack_bytes(b"") + replay.pack_optional(None)
+    body += replay.LENGTH.pack(1) + replay.pack_bytes(b"q")
+    body += replay.pack_bytes(b"digest of a JSON save") + replay.pack_bytes(b"")
+    with open(path, "wb") as file:
+        file.write(replay.HEADER.pack(MAGIC, 1) + zlib.compress(body))
+
+    loaded = read_recording(path)
+    assert loaded.version == 1
+    assert loaded.answers == ["q"]
+    assert loaded.initial_world is None and loaded.initial_journal is None
+    with pytest.raises(ReplayError, match="EOFError"):
+        replay.replay(loaded)   # no save to start from: it asks for a name, then input runs out
@@ -0,0 +1,127 @@
+"""Save and load round trips, including which weapon is equipped."""
+import json
+
+import main
+import savefile
+from inventory import Inventory, LazyInventory
+
+
+def new_character():
+    inventory = Inventory()
+    for spec in main.unique_weapons:
+        inventory.add(spec.create())
+    inventory.add("Gold", 40)
+    inventory.add("Health Potion", 2)
+    inventory.add(main.Weapon("Stick", (1, 2), 5))
+    weapon = inventory[2]
+    weapon.durability -= 3
+    return {
+        "name": "Ann",
+        "health": 73,
+        "strength": 12,
+        "intelligence": 10,
+        "dexterity": 11,
+        "level": 2,
+        "exp": 14,
+        "bonus_points": 1,
+        "current_weapon": weapon,
+        "inventory": inventory,
+        "effects": [],
+        "world": None,
+    }
+
+
+def items(character):
+    return [main.item_to_json(item) for item in character["inventory"]]
+
+
+def assert_equipped_from_inventory(character, position, durability):
+    weapon = character["current_weapon"]
+    assert weapon is character["inventory"][position]
+    assert weapon.durability == durability
+
+
+def test_binary_round_trip(tmp_path):
+    character = new_character()
+    path = tmp_path / "character_data.sav"
+    path.write_bytes(savefile.dumps(character))
+
+    loaded = savefile.load(str(path))
+    assert isinstance(loaded["inventory"], LazyInventory)
+    assert items(loaded) == items(character)
+    assert {k: v for k, v in loaded.items() if k not in ("inventory", "current_weapon")} == {
+        k: v for k, v in character.items() if k not in ("inventory", "current_weapon")
+    }
+    assert_equipped_from_inventory(loaded, 2, character["current_weapon"].durability)
+
+
+def test_lazy_inventory_is_saved_again_with_its_equipped_weapon(tmp_path):
+    path = tmp_path / "character_data.sav"
+    path.write_bytes(savefile.dumps(new_character()))
+    loaded = savefile.load(str(path))
+    loaded["current_weapon"].durability -= 1
+    assert not loaded["inventory"].loaded
+
+    resaved = tmp_path / "again.sav"
+    resaved.write_bytes(savefile.dumps(loaded))
+    assert_equipped_from_inventory(savefile.load(str(resaved)), 2, loaded["current_weapon"].durability)
+
+
+def test_json_round_trip():
+    character = new_character()
+    loaded = main.character_from_json(json.loads(json.dumps(main.character_to_json(character))))
+    assert items(loaded) == items(character)
+    assert_equipped_from_inventory(loaded, 2, character["current_weapon"].durability)
+
+
+def test_json_save_without_equipped_position_copies_the_weapon():
+    character = new_character()
+    data = json.loads(json.dumps(main.character_to_json(character)))
+    del data["equipped"]
+    loaded = main.character_from_json(data)
+    assert isinstance(loaded["current_weapon"], main.Weapon)
+    assert main.item_to_json(loaded["current_weapon"]) == main.item_to_json(character["current_weapon"])
+    assert all(item is not loaded["current_weapon"] for item in loaded["inventory"])
+
+
+def test_save_and_load_character(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    character = new_character()
+    main.save_character(character)
+    loaded = main.load_character()
+    assert items(loaded) == items(character)
+    assert_equipped_from_inventory(loaded, 2, character["current_weapon"].durability)
+
+
+def test_legacy_json_save_loads_and_saves_as_binary(tmp_path):
+    character = new_character()
+    path = tmp_path / "character_data.json"
+    path.write_text(json.dumps(main.character_to_json(character)))
+
+    loaded = savefile.load(str(path))
+    assert items(loaded) == items(character)
+    assert_equipped_from_inventory(loaded, 2, character["current_weapon"].durability)
+    data = savefile.dumps(loaded)
+    assert data.startswith(savefile.MAGIC)
+    assert items(savefile.loads(data)) == items(character)
+
+
+def test_school_project_save_is_migrated(tmp_path):
+    path = tmp_path / "character_data.json"
+    path.write_text(json.dumps({
+        "name": "Old", "health": 80, "strength": 11, "intelligence": 10, "dexterity": 9,
+        "level": 3, "exp": 5, "bonus_points": 2,
+        "current_weapon": {"name": "Sword", "damage_range": [5, 15]},
+        "inventory": ["Gold", {"name": "Health Potion"}, {"name": "Axe", "damage_range": [5, 15]}],
+    }))
+
+    loaded = savefile.load(str(path))
+    assert (loaded["name"], loaded["level"], loaded["bonus_points"]) == ("Old", 3, 2)
+    assert loaded["inventory"].count("Gold") == 1
+    assert loaded["inventory"].count("Health Potion") == 1
+    axe = [item for item in loaded["inventory"] if isinstance(item, main.Weapon)]
+    assert [(weapon.name, weapon.damage_range, weapon.durability) for weapon in axe] == [
+        ("Axe", (5, 15), savefile.LEGACY_DURABILITY)
+    ]
+    assert loaded["current_weapon"].name == "Sword"
+    assert loaded["current_weapon"].durability == savefile.LEGACY_DURABILITY
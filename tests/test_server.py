@@ -0,0 +1,28 @@
+"""Server sessions kept in a CharacterStore."""
+from server import Session
+from store import CharacterStore
+
+
+def test_a_name_plays_one_session_at_a_time(tmp_path):
+    playing = set()
+    with CharacterStore(str(tmp_path / "characters.db")) as store:
+        first = Session(store=store, playing=playing)
+        first.step()
+        first.step("Ann")
+        first.character["exp"] = 25
+        first.character["inventory"].add("Gold", 3)
+
+        second = Session(store=store, playing=playing)
+        second.step()
+        assert "already playing" in second.step("Ann")
+        assert second.done
+        second.leave()
+
+        first.leave()
+        third = Session(store=store, playing=playing)
+        third.step()
+        assert "Welcome back, Ann!" in third.step("Ann")
+        assert third.character["exp"] == 25
+        assert third.character["inventory"].count("Gold") == 3
+        third.leave()
+    assert not playing
@@ -0,0 +1,43 @@
+"""The solver's exact odds agree with simulated fights."""
+import math
+
+import pytest
+
+import main
+import solver
+from simulator import simulate_battles
+
+FIGHTS = 20000
+
+
+def weapon(name):
+    if name is None:
+        return None
+    return next(spec for spec in main.unique_weapons if spec.name == name).create()
+
+
+@pytest.mark.parametrize("name, health, strength, potions, heal_below", [
+    (None, 30, 20, 0, 0),
+    ("Iron Sword", 30, 25, 0, 0),
+    ("Iron Sword", 30, 25, 2, 12),
+    ("Battle Axe", 30, 35, 0, 0),         # Armor Pierce
+    ("Legendary Blade", 20, 40, 0, 0),    # Burn
+    ("Enchanted Bow", 30, 25, 0, 0),      # Poison, stacking
+])
+def test_solver_matches_simulator(name, health, strength, potions, heal_below):
+    character = {"health": health}
+    fight_weapon = weapon(name)
+    solver.clear_cache()
+    exact = solver.solve_battle(character, fight_weapon, strength, potions, heal_below)
+    simulated = simulate_battles(character, fight_weapon, strength, FIGHTS, potions, heal_below, seed=7)
+
+    p = exact["win_probability"]
+    error = math.sqrt(max(p * (1 - p), 1e-12) / FIGHTS)
+    assert abs(simulated["win_rate"] - p) <= 4.5 * error + 1e-9
+    assert simulated["mean_durability_used"] == pytest.approx(exact["expected_durability_used"], rel=0.03, abs=0.05)
+
+
+def test_battle_odds_uses_the_equipped_weapon():
+    sword = weapon("Iron Sword")
+    character = {"health": 30, "current_weapon": sword}
+    assert solver.battle_odds(character, 25) == solver.solve_battle(character, sword, 25)["win_probability"]
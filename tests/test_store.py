@@ -0,0 +1,104 @@
+"""CharacterStore round trips and incremental saves."""
+import sqlite3
+
+import pytest
+
+import main
+from store import CharacterStore
+from tests.test_savefile import items, new_character
+
+
+def test_round_trip_keeps_the_equipped_weapon(tmp_path):
+    path = str(tmp_path / "characters.db")
+    character = new_character()
+    with CharacterStore(path) as store:
+        store.save(character)
+    with CharacterStore(path) as store:
+        loaded = store.load("Ann")
+        assert store.names() == ["Ann"]
+        assert store.load("Nobody") is None
+
+    assert items(loaded) == items(character)
+    assert loaded["current_weapon"] is loaded["inventory"][2]
+    assert loaded["current_weapon"].durability == character["current_weapon"].durability
+
+
+def test_save_writes_only_changed_rows(tmp_path):
+    path = str(tmp_path / "characters.db")
+    character = new_character()
+    for _ in range(1000):
+        character["inventory"].add(main.unique_weapons[0].create())
+    with CharacterStore(path) as store:
+        store.save(character)
+        before = store.connection.total_changes
+        store.save(character)
+        assert store.connection.total_changes == before
+
+        character["inventory"].add(main.unique_weapons[1].create())
+        character["inventory"].consume("Health Potion", 2)
+        character["current_weapon"].durability -= 1
+        character["exp"] += 5
+        store.save(character)
+        # The new weapon, the emptied potion slot, the worn weapon, exp and the characters row
+        assert store.connection.total_changes - before <= 5
+
+    with CharacterStore(path) as store:
+        loaded = store.load("Ann")
+    assert items(loaded) == items(character)
+    assert loaded["exp"] == character["exp"]
+    assert loaded["current_weapon"].durability == character["current_weapon"].durability
+
+
+def test_changes_after_load_are_saved(tmp_path):
+    path = str(tmp_path / "characters.db")
+    with CharacterStore(path) as store:
+        store.save(new_character())
+    with CharacterStore(path) as store:
+        character = store.load("Ann")
+        character["inventory"].add("Gold", 10)
+        character["current_weapon"] = character["inventory"][0]
+        store.save(character)
+    with CharacterStore(path) as store:
+        loaded = store.load("Ann")
+    assert loaded["inventory"].count("Gold") == 50
+    assert loaded["current_weapon"] is loaded["inventory"][0]
+
+
+def test_inventory_reports_changed_slots():
+    inventory = main.Inventory(["Gold", "Health Potion"])
+    version = inventory.version
+    assert list(inventory.changed_since(version)) == []
+
+    sword = main.unique_weapons[0].create()
+    inventory.add(sword)
+    inventory.add("Gold", 5)
+    assert set(inventory.changed_since(version)) == {0, 2}
+
+    version = inventory.version
+    inventory.consume("Health Potion")
+    inventory.remove(sword)
+    assert set(inventory.changed_since(version)) == {1, 2}
+
+
+def test_a_failed_save_is_retried_in_full(tmp_path):
+    path = str(tmp_path / "characters.db")
+    character = new_character()
+    with CharacterStore(path, timeout=0.01) as store:
+        store.save(character)
+        character["exp"] = 42
+        character["inventory"].add("Gold", 5)
+        character["current_weapon"].durability -= 1
+
+        locker = sqlite3.connect(path)
+        locker.execute("BEGIN EXCLUSIVE")
+        with pytest.raises(sqlite3.OperationalError):
+            store.save(character)
+        locker.rollback()
+        locker.close()
+        store.save(character)
+
+    with CharacterStore(path) as store:
+        loaded = store.load("Ann")
+    assert loaded["exp"] == 42
+    assert loaded["inventory"].count("Gold") == 45
+    assert loaded["current_weapon"].durability == character["current_weapon"].durability
@@ -0,0 +1,30 @@
+"""Seeded random streams give the same results however work is split."""
+import balance
+import simulator
+from main import unique_weapons
+from streams import StreamFactory
+
+CONFIGS = balance.grid([6, 9], [12], [10, 20], [0.1], [5], [5, 7])
+
+
+def test_streams_depend_only_on_the_seed_and_key():
+    first, second = StreamFactory(5), StreamFactory(5)
+    second.stream("session", 2)
+    assert first.stream("session", 1).random() == second.stream("session", 1).random()
+    assert first.stream("session", 1).random() != first.stream("session", 2).random()
+    assert [child.root_seed for child in first.spawn(3)] == [child.root_seed for child in second.spawn(3)]
+
+
+def test_balance_sweeps_match_for_any_worker_count():
+    serial = balance.sweep(CONFIGS, fights=50, seed=3, jobs=1)
+    assert balance.sweep(CONFIGS, fights=50, seed=3, jobs=3, chunk_size=1) == serial
+    assert balance.sweep(CONFIGS, fights=50, seed=3, jobs=2, chunk_size=3) == serial
+    assert balance.sweep(CONFIGS, fights=50, seed=4, jobs=1) != serial
+
+
+def test_a_simulated_pair_does_not_depend_on_the_others():
+    character = {"health": 100}
+    everything = simulator.sweep(character, strengths=[5, 10], fights=200, seed=9)
+    one = simulator.sweep(character, weapons=[unique_weapons[1]], strengths=[10], fights=200, seed=9)
+    assert one == [result for result in everything
+                   if result["weapon"] == unique_weapons[1].name and result["enemy_strength"] == 10]
@@ -0,0 +1,48 @@
+"""Seeded world chunks and the cleared rooms kept for them."""
+from world import CHUNK_SIZE, DIRECTIONS, ChunkStore, World
+
+
+def first_feature(world, cx=1, cy=1):
+    """World coordinates of some room with a feature in chunk (cx, cy)."""
+    index = min(world.chunk(cx, cy).features)
+    ly, lx = divmod(index, CHUNK_SIZE)
+    return cx * CHUNK_SIZE + lx, cy * CHUNK_SIZE + ly
+
+
+def test_the_same_seed_grows_the_same_world():
+    first, second = World(11), World(11)
+    for x, y in [(0, 0), (5, -3), (40, 17), (-100, 250)]:
+        assert first.terrain(x, y) == second.terrain(x, y)
+        assert first.feature(x, y) == second.feature(x, y)
+        assert first.exits(x, y) == second.exits(x, y)
+    assert first.nearby(3, 3, 20) == second.nearby(3, 3, 20)
+    assert first.feature(0, 0) is None
+    assert first.exits(0, 0) == list(DIRECTIONS)     # where two roads cross
+
+
+def test_evicted_chunks_keep_their_cleared_rooms():
+    world = World(11, max_chunks=2)
+    x, y = first_feature(world)
+    world.clear(x, y)
+    assert world.feature(x, y) is None
+    for cx in range(2, 6):
+        world.chunk(cx, 0)
+    assert (1, 1) not in world.chunks
+    assert world.feature(x, y) is None
+
+
+def test_cleared_rooms_are_saved_in_the_store(tmp_path):
+    path = str(tmp_path / "world.db")
+    world = World(11, ChunkStore(path, "none"))
+    x, y = first_feature(world)
+    kind = world.feature(x, y)
+    world.clear(x, y)
+    world.close()
+
+    assert World(11).feature(x, y) == kind      # without the store it is back
+    reopened = World(11, ChunkStore(path, "none"))
+    assert reopened.feature(x, y) is None
+    reopened.close()
+    other = World(12, ChunkStore(path, "none"))
+    assert other.chunk(1, 1).cleared == set()   # kept per world seed
+    other.close()
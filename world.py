@@ -0,0 +1,232 @@
+"""
+The world map.
+
+The world is an unbounded grid of rooms split into CHUNK_SIZE x CHUNK_SIZE
+chunks. A chunk is generated from its own seeded stream (streams.derive_seed
+of the world seed and the chunk's coordinates) the first time anything in
+it is looked at, so only the regions a player has been near exist in
+memory and the same seed always grows the same world. Whether two
+neighbouring rooms are connected is a hash of the world seed and the edge,
+so it needs neither chunk to be loaded; roads along the chunk borders are
+always open, which keeps every chunk reachable.
+
+Rooms may hold an encounter or a loot cache. Loaded chunks form the
+spatial index: "what's here" is a dict lookup on the chunk and then on the
+room, and nearby() only looks at the chunks a radius overlaps. The only
+state a chunk has beyond its seed is which of its rooms were cleared.
+Chunks that have not been used for a while are evicted, and their cleared
+rooms are kept in a ChunkStore (or in memory as a few bytes per chunk).
+
+    world = World(seed, ChunkStore("world_data.db"))
+    world.feature(3, -2)
+    world.nearby(3, -2, radius=4)
+"""
+import random
+import sqlite3
+from collections import OrderedDict
+
+from streams import derive_seed
+
+CHUNK_SIZE = 16
+CHUNK_AREA = CHUNK_SIZE * CHUNK_SIZE
+# Loaded chunks kept before the least recently used are evicted
+MAX_CHUNKS = 64
+WORLD_SEED_BITS = 63    # fits an SQLite integer
+
+TERRAINS = ("Road", "Plains", "Forest", "Hills", "Swamp", "Ruins", "Cave")
+ROAD = 0
+SAME_TERRAIN = 0.75     # chance a room shares its chunk's terrain
+# Chance of each feature per room, rolled in this order
+FEATURES = (("boss", 0.002), ("group", 0.01), ("enemy", 0.05), ("cache", 0.03))
+OPEN_CHANCE = 0.55      # chance an edge off the roads is passable
+
+DIRECTIONS = {"north": (0, -1), "east": (1, 0), "south": (0, 1), "west": (-1, 0)}
+
+MASK = (1 << 64) - 1
+
+
+class Chunk:
+    __slots__ = ("terrain", "features", "cleared", "dirty")
+
+    def __init__(self, terrain, features, cleared=()):
+        self.terrain = terrain          # bytes, one TERRAINS index per room
+        self.features = features        # room index -> feature, for rooms not cleared
+        self.cleared = set(cleared)     # room indices whose feature is gone
+        self.dirty = False
+        for index in self.cleared:
+            self.features.pop(index, None)
+
+
+def generate_chunk(seed, cx, cy, cleared=()):
+    """Builds the chunk at chunk coordinates (cx, cy) from the world seed, minus its cleared rooms."""
+    rng = random.Random(derive_seed(seed, ("chunk", cx, cy)))
+    base = rng.randrange(1, len(TERRAINS))
+    terrain = bytearray(CHUNK_AREA)
+    features = {}
+    for index in range(CHUNK_AREA):
+        ly, lx = divmod(index, CHUNK_SIZE)
+        if lx == 0 or ly == 0:
+            terrain[index] = ROAD
+        elif rng.random() < SAME_TERRAIN:
+            terrain[index] = base
+        else:
+            terrain[index] = rng.randrange(1, len(TERRAINS))
+
+        roll = rng.random()
+        for kind, chance in FEATURES:
+            if roll < chance:
+                features[index] = kind
+                break
+            roll -= chance
+    if (cx, cy) == (0, 0):
+        features.pop(0, None)   # the starting room is always safe
+    return Chunk(bytes(terrain), features, cleared)
+
+
+class ChunkStore:
+    """Cleared rooms of evicted or saved chunks, in SQLite, keyed by world seed and chunk."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS chunks (
+        world INTEGER NOT NULL,
+        cx INTEGER NOT NULL,
+        cy INTEGER NOT NULL,
+        cleared BLOB NOT NULL,
+        PRIMARY KEY (world, cx, cy)
+    ) WITHOUT ROWID;
+    """
+    SYNCHRONOUS = {"none": "OFF", "file": "NORMAL", "full": "FULL"}
+
+    def __init__(self, path="world_data.db", fsync="file"):
+        if fsync not in self.SYNCHRONOUS:
+            raise ValueError(f"fsync must be one of {tuple(self.SYNCHRONOUS)}, not {fsync!r}")
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(f"PRAGMA synchronous={self.SYNCHRONOUS[fsync]}")
+        self.connection.executescript(self.SCHEMA)
+
+    def get(self, world, cx, cy):
+        row = self.connection.execute(
+            "SELECT cleared FROM chunks WHERE world = ? AND cx = ? AND cy = ?", (world, cx, cy)
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def put(self, world, cx, cy, cleared):
+        """Stages a chunk's cleared rooms; they are written by the next commit()."""
+        self.connection.execute("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?)", (world, cx, cy, cleared))
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+
+class World:
+    def __init__(self, seed, store=None, max_chunks=MAX_CHUNKS):
+        self.seed = seed
+        self.store = store
+        self.max_chunks = max_chunks
+        self.chunks = OrderedDict()     # (cx, cy) -> Chunk, least recently used first
+        self.cold = {}                  # (cx, cy) -> cleared rooms of evicted chunks, without a store
+        self.edge_seed = derive_seed(seed, ("edges",)) & MASK
+
+    # Chunks
+    def chunk(self, cx, cy):
+        key = (cx, cy)
+        chunk = self.chunks.get(key)
+        if chunk is not None:
+            self.chunks.move_to_end(key)
+            return chunk
+
+        cleared = self.store.get(self.seed, cx, cy) if self.store else self.cold.get(key)
+        chunk = generate_chunk(self.seed, cx, cy, cleared or ())
+        self.chunks[key] = chunk
+        while len(self.chunks) > self.max_chunks:
+            self.evict(*self.chunks.popitem(last=False))
+        return chunk
+
+    def evict(self, key, chunk):
+        if chunk.dirty:
+            if self.store:
+                self.store.put(self.seed, *key, bytes(sorted(chunk.cleared)))
+            else:
+                self.cold[key] = bytes(sorted(chunk.cleared))
+
+    def locate(self, x, y):
+        """Returns (chunk, room index) for world coordinates."""
+        cx, lx = divmod(x, CHUNK_SIZE)
+        cy, ly = divmod(y, CHUNK_SIZE)
+        return self.chunk(cx, cy), ly * CHUNK_SIZE + lx
+
+    def flush(self):
+        """Writes the cleared rooms of every changed chunk to the store."""
+        if not self.store:
+            return
+        for (cx, cy), chunk in self.chunks.items():
+            if chunk.dirty:
+                self.store.put(self.seed, cx, cy, bytes(sorted(chunk.cleared)))
+                chunk.dirty = False
+        self.store.commit()
+
+    def close(self):
+        if self.store:
+            self.flush()
+            self.store.close()
+            self.store = None
+
+    # Rooms
+    def terrain(self, x, y):
+        chunk, index = self.locate(x, y)
+        return TERRAINS[chunk.terrain[index]]
+
+    def feature(self, x, y):
+        """What's here: "enemy", "group", "boss", "cache" or None."""
+        chunk, index = self.locate(x, y)
+        return chunk.features.get(index)
+
+    def clear(self, x, y):
+        """Removes the room's feature for good."""
+        chunk, index = self.locate(x, y)
+        if chunk.features.pop(index, None) is not None:
+            chunk.cleared.add(index)
+            chunk.dirty = True
+
+    def edge_open(self, x, y, axis):
+        """Whether (x, y) connects to (x + 1, y) (axis 0) or to (x, y + 1) (axis 1)."""
+        if (y if axis == 0 else x) % CHUNK_SIZE == 0:
+            return True     # a road
+        h = (self.edge_seed ^ (x * 0x9E3779B97F4A7C15) ^ (y * 0xC2B2AE3D27D4EB4F) ^ axis) & MASK
+        h = ((h ^ (h >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+        h = ((h ^ (h >> 27)) * 0x94D049BB133111EB) & MASK
+        return (h ^ (h >> 31)) < OPEN_CHANCE * (1 << 64)
+
+    def exits(self, x, y):
+        """Directions the player can travel in from (x, y)."""
+        open_edges = {
+            "north": self.edge_open(x, y - 1, 1),
+            "east": self.edge_open(x, y, 0),
+            "south": self.edge_open(x, y, 1),
+            "west": self.edge_open(x - 1, y, 0),
+        }
+        return [direction for direction in DIRECTIONS if open_edges[direction]]
+
+    def nearby(self, x, y, radius):
+        """Features within `radius` steps (Manhattan distance), nearest first: (distance, x, y, feature)."""
+        found = []
+        for cy in range((y - radius) // CHUNK_SIZE, (y + radius) // CHUNK_SIZE + 1):
+            for cx in range((x - radius) // CHUNK_SIZE, (x + radius) // CHUNK_SIZE + 1):
+                for index, kind in self.chunk(cx, cy).features.items():
+                    ly, lx = divmod(index, CHUNK_SIZE)
+                    fx, fy = cx * CHUNK_SIZE + lx, cy * CHUNK_SIZE + ly
+                    distance = abs(fx - x) + abs(fy - y)
+                    if distance <= radius:
+                        found.append((distance, fx, fy, kind))
+        found.sort()
+        return found
+
+
+def step(x, y, direction):
+    dx, dy = DIRECTIONS[direction]
+    return x + dx, y + dy